@@ -0,0 +1,50 @@
+import random
+import time
+
+import click
+from compgraph import columnar
+from compgraph import operations as ops
+from compgraph.graph import Graph
+
+
+def _edges(count: int) -> list[ops.TRow]:
+    rnd = random.Random(0)
+    return [{'edge_id': i,
+             'start': [37.5 + rnd.random(), 55.5 + rnd.random()],
+             'end': [37.5 + rnd.random(), 55.5 + rnd.random()],
+             'weight': rnd.random()} for i in range(count)]
+
+
+def _rows_per_second(graph: Graph, rows: list[ops.TRow]) -> float:
+    start = time.perf_counter()
+    for _ in graph.run(edges=lambda: iter([dict(row) for row in rows])):
+        pass
+    return len(rows) / (time.perf_counter() - start)
+
+
+@click.command()
+@click.option('--rows', type=int, default=500000, help='number of edges')
+def main(rows: int) -> None:
+    """Compare row and batch execution of numeric part of maps graph: edge length, weighted length, sum"""
+    edges = _edges(rows)
+    row_graph = Graph.graph_from_iter('edges') \
+        .map(ops.CalculateLength('start', 'end', 'length')) \
+        .map(ops.Product(['length', 'weight'], 'weighted')) \
+        .map(ops.Calculate(lambda row: row['edge_id'] % 10, 'bucket')) \
+        .reduce(ops.Sum('weighted'), keys=['bucket'], mode='hash')
+    batch_graph = Graph.graph_from_iter('edges') \
+        .map_batch(columnar.BatchCalculateLength('start', 'end', 'length')) \
+        .map_batch(columnar.BatchProduct(['length', 'weight'], 'weighted')) \
+        .map_batch(columnar.BatchCalculate(lambda batch: batch['edge_id'] % 10 if columnar.np is not None
+                                           else [edge_id % 10 for edge_id in batch['edge_id']], 'bucket')) \
+        .reduce_batch(columnar.BatchSum('weighted'), keys=['bucket'])
+
+    row_speed = _rows_per_second(row_graph, edges)
+    batch_speed = _rows_per_second(batch_graph, edges)
+    print(f'numpy: {"yes" if columnar.np is not None else "no"}')
+    print(f'row execution:   {row_speed:,.0f} rows/sec')
+    print(f'batch execution: {batch_speed:,.0f} rows/sec ({batch_speed / row_speed:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+import time
+import typing as tp
+from itertools import chain
+
+import click
+from compgraph import operations as ops
+
+
+def _rows(count: int, width: int, side: str, repeat: int) -> ops.TRowsGenerator:
+    for i in range(count):
+        row: ops.TRow = {'key': i // repeat}
+        # A quarter of columns is in both tables and gets suffixes in joined rows
+        row.update((f'common{column}', i) for column in range(width // 4))
+        row.update((f'{side}{column}', i) for column in range(width - width // 4))
+        yield row
+
+
+class _FieldByFieldJoiner(ops.InnerJoiner):
+    """Joined row is built column by column with checks of column sets, as without join output builder"""
+
+    def general_join(self, keys: tp.Sequence[str], rows_a: ops.TRowsIterable,
+                     rows_b: ops.TRowsIterable) -> ops.TRowsGenerator:
+        rows_b_list = list(rows_b)
+        common_keys: set[str] | None = None
+        for row_a in rows_a:
+            for row_b in rows_b_list:
+                if common_keys is None:
+                    common_keys = set(row_a.keys()) & set(row_b.keys()) - set(keys)
+                merged: ops.TRow = {}
+                for key, value in chain(row_a.items(), row_b.items()):
+                    if key in common_keys:
+                        if key in row_a.keys() and key + self._a_suffix not in merged.keys():
+                            merged[key + self._a_suffix] = value
+                        elif key in row_b.keys():
+                            merged[key + self._b_suffix] = value
+                    else:
+                        merged[key] = value
+                yield merged
+
+
+def _seconds(joiner: ops.Joiner, rows_a: list[ops.TRow], rows_b: list[ops.TRow]) -> float:
+    start = time.perf_counter()
+    for _ in ops.Join(joiner, ['key'])(rows_a, rows_b):
+        pass
+    return time.perf_counter() - start
+
+
+@click.command()
+@click.option('--rows', type=int, default=300000, help='number of joined rows')
+@click.option('--width', type=int, default=20, help='number of columns of every table')
+@click.option('--repeat', type=int, default=10, help='number of left rows of every key')
+@click.option('--runs', type=int, default=5, help='number of runs of every join, the fastest one is reported')
+def main(rows: int, width: int, repeat: int, runs: int) -> None:
+    """Compare building joined rows column by column with join output builder"""
+    rows_a = list(_rows(rows, width, 'a', repeat))
+    rows_b = list(_rows(rows // repeat, width, 'b', 1))
+    field_by_field = builder = float('inf')
+    # Runs of both joins alternate and the fastest ones are compared, so drift of machine load affects both
+    for _ in range(runs):
+        field_by_field = min(field_by_field, _seconds(_FieldByFieldJoiner(), rows_a, rows_b))
+        builder = min(builder, _seconds(ops.InnerJoiner(), rows_a, rows_b))
+    print(f'column by column: {rows / field_by_field:,.0f} joined rows/sec')
+    print(f'output builder:   {rows / builder:,.0f} joined rows/sec ({field_by_field / builder:.2f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+import time
+
+import click
+from compgraph import algorithms
+from compgraph import operations as ops
+from compgraph.graph import Graph
+
+
+def _rows(count: int) -> ops.TRowsGenerator:
+    for i in range(count):
+        yield {'doc_id': i, 'text': f'Hello, little World! Document number {i}.'}
+
+
+def _unfused(rows: ops.TRowsIterable, mappers: list[ops.Mapper]) -> ops.TRowsIterable:
+    """One generator layer per mapper and one generator per mapper and row, as without fusion"""
+    def layer(rows: ops.TRowsIterable, mapper: ops.Mapper) -> ops.TRowsGenerator:
+        for row in rows:
+            yield from mapper(row)
+
+    for mapper in mappers:
+        rows = layer(rows, mapper)
+    return rows
+
+
+def _rows_per_second(rows: ops.TRowsIterable, count: int) -> float:
+    start = time.perf_counter()
+    for _ in rows:
+        pass
+    return count / (time.perf_counter() - start)
+
+
+@click.command()
+@click.option('--rows', type=int, default=300000, help='number of input rows')
+def main(rows: int) -> None:
+    """Compare per-row overhead of unfused and fused chain of mappers of word splitting graph"""
+    graph = algorithms._split_graph(Graph.graph_from_iter('docs'), 'text') \
+        .map(ops.Filter(lambda row: len(row['text']) > 2)) \
+        .map(ops.Project(['doc_id', 'text']))
+    mappers: list[ops.Mapper] = []
+    node: Graph | None = graph
+    while node is not None and isinstance(node._op, ops.Map):
+        mappers = node._op.mappers + mappers
+        node = node._prev_node
+
+    unfused = _rows_per_second(_unfused(_rows(rows), mappers), rows)
+    fused = _rows_per_second(graph.run(docs=lambda: _rows(rows)), rows)
+    print(f'unfused mappers: {unfused:,.0f} input rows/sec')
+    print(f'fused mappers:   {fused:,.0f} input rows/sec ({fused / unfused:.2f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+import json
+import os
+import random
+import tempfile
+import time
+import typing as tp
+
+import click
+from compgraph import operations as ops
+from compgraph import parallel
+from compgraph import readers
+
+
+def _write_file(path: str, rows: int) -> None:
+    rnd = random.Random(0)
+    with open(path, 'w') as file:
+        for i in range(rows):
+            row = {'doc_id': i, 'text': ' '.join(f'word{rnd.randrange(1000)}' for _ in range(20)),
+                   'start': [37 + rnd.random(), 55 + rnd.random()]}
+            print(json.dumps(row), file=file)
+
+
+def _megabytes_per_second(op: tp.Callable[..., ops.TRowsIterable], path: str) -> float:
+    start = time.perf_counter()
+    for _ in op():
+        pass
+    return os.path.getsize(path) / (time.perf_counter() - start) / 2 ** 20
+
+
+@click.command()
+@click.option('--rows', type=int, default=500000, help='number of lines in file')
+@click.option('--workers', type=int, default=4, help='number of worker processes of parallel reading')
+def main(rows: int, workers: int) -> None:
+    """Compare line by line reading with json.loads, block reading of ReadJsonLines and parallel reading"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'rows.jsonl')
+        _write_file(path, rows)
+        by_line = _megabytes_per_second(ops.Read(path, lambda line: json.loads(line)), path)
+        reader = readers.ReadJsonLines(path)
+        by_block = _megabytes_per_second(reader, path)
+        by_range = _megabytes_per_second(parallel.ParallelRead(path, readers.loads, workers), path)
+    print(f'parser: {readers.loads.__module__}')
+    print(f'line by line with json.loads: {by_line:,.1f} MiB/sec')
+    print(f'ReadJsonLines:                {by_block:,.1f} MiB/sec ({by_block / by_line:.1f}x)')
+    print(f'ReadJsonLines stats:          {reader.stats}')
+    print(f'ParallelRead, {workers} workers:     {by_range:,.1f} MiB/sec ({by_range / by_line:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
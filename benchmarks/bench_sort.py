@@ -0,0 +1,33 @@
+import random
+import time
+
+import click
+from compgraph import external_sort
+from compgraph import operations as ops
+
+
+def _rows(count: int) -> ops.TRowsGenerator:
+    rnd = random.Random(0)
+    for i in range(count):
+        yield {'text': f'word{rnd.randrange(100000)}', 'doc_id': i}
+
+
+def _rows_per_second(sort: external_sort.ExternalSort, count: int) -> float:
+    start = time.perf_counter()
+    for _ in sort(_rows(count)):
+        pass
+    return count / (time.perf_counter() - start)
+
+
+@click.command()
+@click.option('--rows', type=int, default=1000000, help='number of rows to sort')
+def main(rows: int) -> None:
+    """Compare per-row transport (one frame per row) with batched transport of ExternalSort"""
+    per_row = _rows_per_second(external_sort.ExternalSort(keys=['text'], batch_rows=1), rows)
+    batched = _rows_per_second(external_sort.ExternalSort(keys=['text']), rows)
+    print(f'per-row transport: {per_row:,.0f} rows/sec')
+    print(f'batched transport: {batched:,.0f} rows/sec ({batched / per_row:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
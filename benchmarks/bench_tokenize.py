@@ -0,0 +1,40 @@
+import random
+import time
+
+import click
+from compgraph import operations as ops
+
+_WORDS = ['Hello', 'world', 'little', 'graph', 'Map', 'reduce', 'data', 'flow', 'Python', 'token']
+_PUNCTUATION = ['', '', '', ',', '.', '!', '?', '...', ';']
+
+
+def _corpus(docs: int, words: int) -> list[ops.TRow]:
+    rnd = random.Random(0)
+    return [{'doc_id': i, 'text': ' '.join(rnd.choice(_WORDS) + rnd.choice(_PUNCTUATION) for _ in range(words))}
+            for i in range(docs)]
+
+
+def _tokens_per_second(map_op: ops.Map, corpus: list[ops.TRow]) -> float:
+    rows = [dict(row) for row in corpus]
+    start = time.perf_counter()
+    count = sum(1 for _ in map_op(rows))
+    return count / (time.perf_counter() - start)
+
+
+@click.command()
+@click.option('--docs', type=int, default=20000, help='number of documents')
+@click.option('--words', type=int, default=50, help='number of words in document')
+def main(docs: int, words: int) -> None:
+    """Compare FilterPunctuation, LowerCase and Split chain with fused Tokenize mapper"""
+    corpus = _corpus(docs, words)
+    chain = _tokens_per_second(ops.Map(ops.FilterPunctuation('text'), ops.LowerCase('text'), ops.Split('text')),
+                               corpus)
+    tokenize = _tokens_per_second(ops.Map(ops.Tokenize('text')), corpus)
+    projected = _tokens_per_second(ops.Map(ops.Tokenize('text', passthrough=['doc_id'])), corpus)
+    print(f'FilterPunctuation+LowerCase+Split: {chain:,.0f} tokens/sec')
+    print(f'Tokenize:                          {tokenize:,.0f} tokens/sec ({tokenize / chain:.1f}x)')
+    print(f'Tokenize with passthrough:         {projected:,.0f} tokens/sec ({projected / chain:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,35 +1,36 @@
-import json
 import math
 
 from . import Graph
 from . import operations as ops
 
 
-def _graph_from(input_stream_name: str, from_file: bool) -> 'Graph':
-    return Graph.graph_from_file(
-        input_stream_name,
-        lambda line: json.loads(line)) if from_file else Graph.graph_from_iter(input_stream_name)
+def _graph_from(input_stream_name: str, from_file: bool, workers: int = 1, append_only: bool = False) -> 'Graph':
+    return Graph.graph_from_jsonl(input_stream_name, workers=workers, append_only=append_only) if from_file \
+        else Graph.graph_from_iter(input_stream_name)
 
 
-def _split_graph(graph: 'Graph', text_column: str) -> 'Graph':
-    return graph.map(ops.FilterPunctuation(text_column)) \
-        .map(ops.LowerCase(text_column)) \
-        .map(ops.Split(text_column))
+def _split_graph(graph: 'Graph', text_column: str, workers: int = 1) -> 'Graph':
+    return graph.map(ops.Tokenize(text_column), workers=workers)
 
 
 def word_count_graph(input_stream_name: str, text_column: str = 'text', count_column: str = 'count',
-                     from_file: bool = False) -> Graph:
-    """Constructs graph which counts words in text_column of all rows passed"""
-    graph = _graph_from(input_stream_name, from_file)
-    return _split_graph(graph, text_column) \
-        .sort(keys=[text_column]) \
-        .reduce(ops.Count(count_column), keys=[text_column]) \
+                     from_file: bool = False, workers: int = 1, append_only: bool = False) -> Graph:
+    """Constructs graph which counts words in text_column of all rows passed
+    (file is read, split and words are counted in workers processes if workers > 1;
+    counts of append-only file are updated with appended rows only by runs with state_dir)"""
+    graph = _graph_from(input_stream_name, from_file, workers, append_only)
+    words = _split_graph(graph, text_column, workers)
+    if workers == 1:
+        words = words.sort(keys=[text_column])
+    return words \
+        .reduce(ops.Count(count_column), keys=[text_column], combine=True, workers=workers) \
         .sort(keys=[count_column, text_column])
 
 
 def inverted_index_graph(input_stream_name: str, doc_column: str = 'doc_id', text_column: str = 'text',
-                         result_column: str = 'tf_idf', from_file: bool = False) -> Graph:
-    """Constructs graph which calculates td-idf for every word/document pair"""
+                         result_column: str = 'tf_idf', from_file: bool = False, workers: int = 1) -> Graph:
+    """Constructs graph which calculates td-idf for every word/document pair
+    (frequencies are aggregated in workers processes partitioned by keys if workers > 1)"""
 
     graph = _graph_from(input_stream_name, from_file)
     split_words = _split_graph(graph, text_column)
@@ -42,16 +43,15 @@ def inverted_index_graph(input_stream_name: str, doc_column: str = 'doc_id', tex
     column_total: str = 'total'
     column_idf: str = 'idf'
     idf = split_words \
-        .sort(keys=[doc_column, text_column]) \
-        .reduce(ops.FirstReducer(), keys=[doc_column, text_column]) \
+        .reduce(ops.FirstReducer(), keys=[doc_column, text_column], mode='hash', workers=workers) \
+        .reduce(ops.Count(column_total), keys=[text_column], mode='hash', workers=workers) \
         .sort(keys=[text_column]) \
-        .reduce(ops.Count(column_total), keys=[text_column]) \
-        .join(ops.InnerJoiner(), count_docs, keys=[]) \
+        .join(ops.InnerJoiner(), count_docs, keys=[], strategy='broadcast', small='b') \
         .map(ops.Calculate(lambda row: math.log(row[column_docs_count] / row[column_total]), column_idf))
 
     column_tf: str = 'tf'
     tf = split_words \
-        .reduce(ops.TermFrequency(text_column, column_tf), keys=[doc_column]) \
+        .reduce(ops.TermFrequency(text_column, column_tf), keys=[doc_column], workers=workers) \
         .sort(keys=[text_column])
 
     result_graph = tf.join(ops.InnerJoiner(), idf, keys=[text_column]) \
@@ -102,30 +102,33 @@ def yandex_maps_graph(input_stream_name_time: str, input_stream_name_length: str
                       edge_id_column: str = 'edge_id', start_coord_column: str = 'start',
                       end_coord_column: str = 'end',
                       weekday_result_column: str = 'weekday', hour_result_column: str = 'hour',
-                      speed_result_column: str = 'speed', from_file: bool = False) -> Graph:
-    """Constructs graph which measures average speed in km/h depending on the weekday and hour"""
+                      speed_result_column: str = 'speed', from_file: bool = False, workers: int = 1,
+                      append_only: bool = False) -> Graph:
+    """Constructs graph which measures average speed in km/h depending on the weekday and hour, sorted by them
+    (files are read and rows are prepared in workers processes if workers > 1;
+    speed totals of append-only file of times are updated with appended rows only by runs with state_dir,
+    file of lengths is read whole and changing it makes run start over)"""
     time_format: str = '%Y%m%dT%H%M%S.%f'
 
-    time_graph = _graph_from(input_stream_name_time, from_file)
+    time_graph = _graph_from(input_stream_name_time, from_file, workers, append_only)
     time = time_graph \
+        .map(ops.ParseTimestamps([enter_time_column, leave_time_column], time_format), workers=workers) \
         .map(ops.CalculateTime(enter_time_column,
                                time_format,
                                weekday_result_column,
-                               hour_result_column)) \
-        .sort(keys=[edge_id_column])
+                               hour_result_column), workers=workers)
 
-    length_graph = _graph_from(input_stream_name_length, from_file)
+    length_graph = _graph_from(input_stream_name_length, from_file, workers)
     length_column: str = 'length_column'
     length = length_graph.map(ops.CalculateLength(start_coord_column,
                                                   end_coord_column,
-                                                  length_column)) \
-        .sort(keys=[edge_id_column])
+                                                  length_column), workers=workers)
 
-    return time.join(ops.InnerJoiner(), length, keys=[edge_id_column]) \
-        .sort(keys=[weekday_result_column, hour_result_column]) \
+    return time.join(ops.InnerJoiner(), length, keys=[edge_id_column], strategy='hash') \
         .reduce(ops.CalculateSpeed(length_column,
                                    enter_time_column,
                                    leave_time_column,
                                    time_format,
                                    speed_result_column),
-                keys=[weekday_result_column, hour_result_column])
+                keys=[weekday_result_column, hour_result_column], mode='hash') \
+        .sort(keys=[weekday_result_column, hour_result_column])
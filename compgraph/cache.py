@@ -0,0 +1,278 @@
+import hashlib
+import importlib.metadata
+import json
+import os
+import pickle
+import re
+import sys
+import tempfile
+import time
+import types
+import typing as tp
+
+from . import operations as ops
+from . import spill
+
+if tp.TYPE_CHECKING:
+    from .graph import Graph
+
+DEFAULT_MAX_BYTES: int = 1024 * spill.MiB
+CHUNK_ROWS: int = spill.CHUNK_ROWS
+HASH_BLOCK_SIZE: int = spill.MiB
+
+# Attributes holding counters of the last run rather than configuration, not part of fingerprint
+VOLATILE_ATTRIBUTES: frozenset[str] = frozenset({'stats'})
+
+
+def _package_version() -> str:
+    try:
+        return importlib.metadata.version('compgraph')
+    except importlib.metadata.PackageNotFoundError:
+        return 'unknown'
+
+
+# Part of every fingerprint, so upgrade of library invalidates results of its operations
+PACKAGE_VERSION: str = _package_version()
+
+_INDEX = 'index.json'
+_FILES = 'files.json'
+_SUFFIX = '.rows'
+_ADDRESS = re.compile(r' at 0x[0-9a-fA-F]+')
+
+
+class FileHashes:
+    """Content hashes of files memoized by their size and mtime in JSON file, so unchanged files are not rehashed"""
+
+    def __init__(self, path: str) -> None:
+        """
+        :param path: JSON file to keep hashes in
+        """
+        self.path = path
+        self._files: dict[str, list[tp.Any]] = _load_json(path)
+
+    def fingerprint(self, filename: str) -> str:
+        """Size, mtime and content hash of file; hash is recomputed only if size or mtime changed"""
+        status = os.stat(filename)
+        path = os.path.abspath(filename)
+        known = self._files.get(path)
+        if known is None or known[:2] != [status.st_size, status.st_mtime_ns]:
+            digest = hashlib.sha256()
+            with open(filename, 'rb') as file:
+                while block := file.read(HASH_BLOCK_SIZE):
+                    digest.update(block)
+            known = self._files[path] = [status.st_size, status.st_mtime_ns, digest.hexdigest()]
+            _save_json(self.path, self._files)
+        return f'{known[0]}:{known[1]}:{known[2]}'
+
+
+class ResultCache:
+    """
+    Directory of materialized outputs of graph nodes, stored as sequences of pickled chunks of rows.
+    Entries are addressed by fingerprint of node (see fingerprint) and evicted in least recently used order
+    when their total size exceeds the bound. Content hashes of input files are memoized by size and mtime,
+    so unchanged files are not rehashed.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        """
+        :param cache_dir: directory to keep entries in, created if missing
+        :param max_bytes: bound of total size of entries
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+        self.files = FileHashes(os.path.join(cache_dir, _FILES))
+        self._index: dict[str, dict[str, float]] = _load_json(os.path.join(cache_dir, _INDEX))
+
+    def get(self, key: str) -> ops.TRowsGenerator | None:
+        """Rows of entry, None if there is no such entry
+        :param key: fingerprint of node
+        """
+        if key not in self._index or not os.path.exists(self._path(key)):
+            return None
+        self._index[key]['used'] = time.time()
+        _save_json(os.path.join(self.cache_dir, _INDEX), self._index)
+        return self._read(key)
+
+    def store(self, key: str, rows: ops.TRowsIterable) -> ops.TRowsGenerator:
+        """Pass rows through while writing them into entry; entry appears once rows are read till the end
+        :param key: fingerprint of node
+        :param rows: output of node
+        """
+        file = tempfile.NamedTemporaryFile(dir=self.cache_dir, suffix='.tmp', delete=False)
+        try:
+            with file:
+                chunk: list[ops.TRow] = []
+                for row in rows:
+                    chunk.append(row)
+                    if len(chunk) >= CHUNK_ROWS:
+                        pickle.dump(chunk, file, protocol=pickle.HIGHEST_PROTOCOL)
+                        yield from chunk
+                        chunk = []
+                if chunk:
+                    pickle.dump(chunk, file, protocol=pickle.HIGHEST_PROTOCOL)
+                yield from chunk
+            os.replace(file.name, self._path(key))
+            self._index[key] = {'bytes': os.path.getsize(self._path(key)), 'used': time.time()}
+            self._evict()
+            _save_json(os.path.join(self.cache_dir, _INDEX), self._index)
+        finally:
+            if os.path.exists(file.name):
+                os.remove(file.name)
+
+    @property
+    def size(self) -> int:
+        """Total size of entries"""
+        return int(sum(entry['bytes'] for entry in self._index.values()))
+
+    def _evict(self) -> None:
+        for key in sorted(self._index, key=lambda key: self._index[key]['used']):
+            if self.size <= self.max_bytes:
+                break
+            del self._index[key]
+            if os.path.exists(self._path(key)):
+                os.remove(self._path(key))
+
+    def _read(self, key: str) -> ops.TRowsGenerator:
+        with open(self._path(key), 'rb') as file:
+            while True:
+                try:
+                    chunk = pickle.load(file)
+                except EOFError:
+                    break
+                yield from chunk
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + _SUFFIX)
+
+
+def _load_json(path: str) -> dict[str, tp.Any]:
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_json(path: str, content: dict[str, tp.Any]) -> None:
+    with open(path + '.tmp', 'w') as file:
+        json.dump(content, file)
+    os.replace(path + '.tmp', path)
+
+
+def _is_standard(module: str) -> bool:
+    """Module belongs to standard library, its code changes only with Python itself"""
+    return module.partition('.')[0] in sys.stdlib_module_names
+
+
+def _global_names(code: types.CodeType) -> set[str]:
+    """Names code and code nested into it (lambdas, comprehensions) may read from globals"""
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            names |= _global_names(const)
+    return names
+
+
+class _Describer:
+    """
+    Stable text description of operation configuration: classes with code of their methods (except classes
+    of standard library), attributes, code of functions with globals they read
+    """
+
+    def __init__(self, files: FileHashes, appended: bool) -> None:
+        self._files = files
+        self._appended = appended
+        self._seen: dict[int, int] = {}
+        # Described objects are kept alive, so ids of temporary ones (closures, referenced globals) are not reused
+        self._alive: list[tp.Any] = []
+        self.files: int = 0
+
+    def __call__(self, value: tp.Any) -> str:
+        if value is None or isinstance(value, (bool, int, float, str, bytes)):
+            return repr(value)
+        if id(value) in self._seen:
+            return f'<ref {self._seen[id(value)]}>'
+        self._seen[id(value)] = len(self._seen)
+        self._alive.append(value)
+        if isinstance(value, (list, tuple, set, frozenset)):
+            items = sorted(map(self, value)) if isinstance(value, (set, frozenset)) else list(map(self, value))
+            return f'{type(value).__name__}[{", ".join(items)}]'
+        if isinstance(value, dict):
+            return '{' + ', '.join(f'{self(key)}: {self(item)}' for key, item in value.items()) + '}'
+        if isinstance(value, types.CodeType):
+            return f'code {value.co_qualname} {hashlib.sha256(value.co_code).hexdigest()} ' \
+                   f'{self(value.co_consts)} {value.co_names}'
+        if isinstance(value, types.FunctionType):
+            closure = [cell.cell_contents for cell in value.__closure__ or ()]
+            names = sorted(name for name in _global_names(value.__code__) if name in value.__globals__)
+            referenced = {name: value.__globals__[name] for name in names}
+            return f'function {self(value.__code__)} {self(value.__defaults__)} {self(closure)} {self(referenced)}'
+        if isinstance(value, types.MethodType):
+            owner = value.__self__ if isinstance(value.__self__, type) else type(value.__self__)
+            if _is_standard(owner.__module__):
+                # Module level functions of standard library may be methods of singletons, like multiprocessing.Pipe
+                # of default context, whose state is set up lazily when first used
+                return f'method {value.__func__.__qualname__} of {self(owner)}'
+            return f'method {value.__func__.__qualname__} of {self(value.__self__)}'
+        if isinstance(value, type):
+            return self._describe_class(value)
+        if isinstance(value, (types.BuiltinFunctionType, types.ModuleType)):
+            return f'{getattr(value, "__module__", "")}.{getattr(value, "__qualname__", value.__name__)}'
+        if hasattr(value, '__dict__'):
+            attributes = []
+            for name, item in vars(value).items():
+                if name in VOLATILE_ATTRIBUTES:
+                    continue
+                attributes.append(f'{name}={self(item)}')
+                if name == 'filename' and isinstance(item, str) and os.path.isfile(item):
+                    if self._appended or not getattr(value, 'append_only', False):
+                        attributes.append(f'content={self._files.fingerprint(item)}')
+                    self.files += 1
+            return f'{self(type(value))}({", ".join(attributes)})'
+        # Addresses in default representation differ between runs
+        return f'{self(type(value))} {_ADDRESS.sub("", repr(value))}'
+
+    def _describe_class(self, cls: type) -> str:
+        """Name of class with code of methods of it and of its bases outside of standard library"""
+        parts = [f'{cls.__module__}.{cls.__qualname__}']
+        for base in cls.__mro__:
+            if _is_standard(base.__module__):
+                continue
+            for name, member in vars(base).items():
+                if isinstance(member, (staticmethod, classmethod)):
+                    member = member.__func__
+                functions = [member.fget, member.fset, member.fdel] if isinstance(member, property) else [member]
+                for function in functions:
+                    if isinstance(function, types.FunctionType):
+                        parts.append(f'{base.__qualname__}.{name} {self(function)}')
+        return ' '.join(parts)
+
+
+def fingerprint(node: 'Graph', files: FileHashes, memo: dict[int, str | None] | None = None,
+                appended: bool = True) -> str | None:
+    """Key of node output: hash of operations of node and all nodes it reads from, with size, mtime and
+    content hash of files they read
+    :param node: graph to fingerprint
+    :param files: memoized hashes of files
+    :param memo: fingerprints of already visited nodes by their ids
+    :param appended: fingerprint content of append-only files too; without it appends to such files
+        do not change fingerprint (which identifies state of incremental runs)
+    :return: None if output depends on data sources passed to run, which are not fingerprinted
+    """
+    memo = memo if memo is not None else {}
+    if id(node) not in memo:
+        describe = _Describer(files, appended)
+        parts = [PACKAGE_VERSION, describe(node._op)]
+        inputs = [graph for graph in (node._prev_node, node._join_graph) if graph is not None]
+        if not inputs and not describe.files:
+            memo[id(node)] = None
+            return None
+        for graph in inputs:
+            key = fingerprint(graph, files, memo, appended)
+            if key is None:
+                memo[id(node)] = None
+                return None
+            parts.append(key)
+        memo[id(node)] = hashlib.sha256('\n'.join(parts).encode()).hexdigest()[:32]
+    return memo[id(node)]
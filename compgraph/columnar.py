@@ -0,0 +1,321 @@
+import math
+import typing as tp
+from array import array
+from abc import ABC, abstractmethod
+from itertools import compress
+
+from . import operations as ops
+from . import vectorized
+from .vectorized import np
+
+BATCH_ROWS: int = 4096
+
+TKey = tuple[tp.Any, ...]
+TColumn = tp.Any  # list, or numpy array if numpy is installed
+
+
+def _to_list(column: TColumn) -> list[tp.Any]:
+    return column.tolist() if np is not None and isinstance(column, np.ndarray) else list(column)
+
+
+class Batch:
+    """
+    Rows with the same set of columns stored by columns.
+    Columns are lists when built from rows; vectorized mappers may put numpy arrays into them,
+    they are turned back into lists of python values when batch is converted to rows.
+    """
+
+    def __init__(self, columns: dict[str, TColumn], size: int) -> None:
+        """
+        :param columns: mapping from column name to column values
+        :param size: number of rows
+        """
+        self.columns = columns
+        self.size = size
+
+    @staticmethod
+    def from_rows(rows: tp.Sequence[ops.TRow]) -> 'Batch':
+        """
+        :param rows: non-empty rows with the same set of columns
+        """
+        names = list(rows[0])
+        return Batch({name: [row[name] for row in rows] for name in names}, len(rows))
+
+    def to_rows(self) -> list[ops.TRow]:
+        names = list(self.columns)
+        columns = [_to_list(column) for column in self.columns.values()]
+        if not columns:
+            return [{} for _ in range(self.size)]
+        return [dict(zip(names, values)) for values in zip(*columns)]
+
+    def __getitem__(self, name: str) -> TColumn:
+        """Column as numpy array if numpy is installed, list otherwise"""
+        column = self.columns[name]
+        if np is not None and not isinstance(column, np.ndarray):
+            column = self.columns[name] = np.asarray(column)
+        return column
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.columns
+
+    def take(self, mask: tp.Sequence[bool]) -> 'Batch':
+        """Batch of rows for which mask is true"""
+        keep = [bool(value) for value in _to_list(mask)]
+        columns: dict[str, TColumn] = {}
+        for name, column in self.columns.items():
+            if np is not None and isinstance(column, np.ndarray):
+                columns[name] = column[np.asarray(keep, dtype=bool)]
+            else:
+                columns[name] = list(compress(column, keep))
+        return Batch(columns, sum(keep))
+
+
+def batches(rows: ops.TRowsIterable, batch_rows: int = BATCH_ROWS) -> tp.Generator[Batch, None, None]:
+    """Collect rows into batches; batch is cut earlier when set of columns changes
+    :param rows: rows to collect
+    :param batch_rows: maximal number of rows in batch
+    """
+    chunk: list[ops.TRow] = []
+    names: tp.KeysView[str] | None = None
+    for row in rows:
+        if chunk and (len(chunk) >= batch_rows or row.keys() != names):
+            yield Batch.from_rows(chunk)
+            chunk = []
+        if not chunk:
+            names = row.keys()
+        chunk.append(row)
+    if chunk:
+        yield Batch.from_rows(chunk)
+
+
+class BatchMapper(ABC):
+    """Base class for mappers processing batch of rows at once"""
+
+    @abstractmethod
+    def __call__(self, batch: Batch) -> tp.Generator[Batch, None, None]:
+        """
+        :param batch: batch of rows
+        """
+        pass
+
+
+class RowAdapter(BatchMapper):
+    """Apply row mapper to every row of batch"""
+
+    def __init__(self, mapper: ops.Mapper, batch_rows: int = BATCH_ROWS) -> None:
+        """
+        :param mapper: row mapper to apply
+        :param batch_rows: maximal number of rows in resulting batch
+        """
+        self.mapper = mapper
+        self.batch_rows = batch_rows
+
+    def __call__(self, batch: Batch) -> tp.Generator[Batch, None, None]:
+        yield from batches(ops.Map(self.mapper)(batch.to_rows()), self.batch_rows)
+
+
+class BatchProduct(BatchMapper):
+    """Calculates product of multiple columns"""
+
+    def __init__(self, columns: tp.Sequence[str], result_column: str = 'product') -> None:
+        """
+        :param columns: column names to product
+        :param result_column: column name to save product in
+        """
+        self.columns = columns
+        self.result_column = result_column
+
+    def __call__(self, batch: Batch) -> tp.Generator[Batch, None, None]:
+        if np is not None:
+            # Product starts from the first column, so it keeps dtype of columns as Product of rows does
+            columns = [batch[column] for column in self.columns]
+            result = columns[0].copy() if columns else np.ones(batch.size, dtype=int)
+            for column in columns[1:]:
+                result = result * column
+            batch.columns[self.result_column] = result
+        else:
+            batch.columns[self.result_column] = [math.prod(values)
+                                                 for values in zip(*(batch[column] for column in self.columns))]
+        yield batch
+
+
+class BatchCalculate(BatchMapper):
+    """Calculate some operation for columns of batch"""
+
+    def __init__(self, operation: tp.Callable[[Batch], TColumn], result: str) -> None:
+        """
+        :param operation: gets batch, returns resulting column;
+            batch gives columns as numpy arrays if numpy is installed and as lists otherwise
+        :param result: column name to save result in
+        """
+        self.operation = operation
+        self.result = result
+
+    def __call__(self, batch: Batch) -> tp.Generator[Batch, None, None]:
+        batch.columns[self.result] = self.operation(batch)
+        yield batch
+
+
+class BatchFilter(BatchMapper):
+    """Remove records that don't satisfy some condition"""
+
+    def __init__(self, condition: tp.Callable[[Batch], tp.Sequence[bool]]) -> None:
+        """
+        :param condition: gets batch, returns mask of rows to keep
+        """
+        self.condition = condition
+
+    def __call__(self, batch: Batch) -> tp.Generator[Batch, None, None]:
+        result = batch.take(self.condition(batch))
+        if result.size:
+            yield result
+
+
+class BatchProject(BatchMapper):
+    """Leave only mentioned columns"""
+
+    def __init__(self, columns: tp.Sequence[str]) -> None:
+        """
+        :param columns: names of columns
+        """
+        self.columns = columns
+
+    def __call__(self, batch: Batch) -> tp.Generator[Batch, None, None]:
+        yield Batch({column: batch.columns[column] for column in self.columns}, batch.size)
+
+
+class BatchCalculateLength(BatchMapper):
+    """Calculate length of route with using haversine distance"""
+
+    def __init__(self, start_point: str, end_point: str, result_column: str) -> None:
+        self.start_point = start_point
+        self.end_point = end_point
+        self.result_column = result_column
+        self._r: int = 6373
+
+    def __call__(self, batch: Batch) -> tp.Generator[Batch, None, None]:
+        if self.result_column not in batch:
+            start, end = batch.columns[self.start_point], batch.columns[self.end_point]
+            batch.columns[self.result_column] = vectorized.haversine(
+                array('d', [point[0] for point in start]), array('d', [point[1] for point in start]),
+                array('d', [point[0] for point in end]), array('d', [point[1] for point in end]), self._r)
+        yield batch
+
+
+def _apply(mapper: BatchMapper, source: tp.Iterable[Batch]) -> tp.Generator[Batch, None, None]:
+    for batch in source:
+        yield from mapper(batch)
+
+
+class BatchMap(ops.Operation):
+    """
+    Apply chain of batch mappers to rows collected into batches.
+    Consecutive batch maps are fused, so rows are converted into batches and back once for the whole chain.
+    """
+
+    def __init__(self, mappers: tp.Sequence[BatchMapper], batch_rows: int = BATCH_ROWS) -> None:
+        """
+        :param mappers: chain of batch mappers to apply
+        :param batch_rows: maximal number of rows in batch
+        """
+        self.mappers = list(mappers)
+        self.batch_rows = batch_rows
+
+    def fuse(self, op: ops.Operation) -> ops.Operation | None:
+        if isinstance(op, BatchMap) and op.batch_rows == self.batch_rows:
+            return BatchMap(self.mappers + op.mappers, self.batch_rows)
+        if isinstance(op, BatchReduce) and op.batch_rows == self.batch_rows:
+            return BatchReduce(op.reducer, op.keys, self.batch_rows, self.mappers + op.mappers)
+        return None
+
+    def batches(self, rows: ops.TRowsIterable) -> tp.Generator[Batch, None, None]:
+        """Batches of rows passed through the chain"""
+        result: tp.Iterable[Batch] = batches(rows, self.batch_rows)
+        for mapper in self.mappers:
+            result = _apply(mapper, result)
+        yield from result
+
+    def __call__(self, rows: ops.TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> ops.TRowsGenerator:
+        for batch in self.batches(rows):
+            yield from batch.to_rows()
+
+
+class BatchReducer(ABC):
+    """Base class for reducers aggregating batch of rows at once; states of groups are kept in memory"""
+
+    @abstractmethod
+    def update(self, states: dict[TKey, tp.Any], keys: list[TKey] | None, batch: Batch) -> None:
+        """
+        :param states: states of groups to update, new groups are added in order of their first appearance
+        :param keys: key of group for every row of batch, None if there is a single group with empty key
+        :param batch: batch of rows
+        """
+        pass
+
+    @abstractmethod
+    def finish(self, group_key: tuple[str, ...], key_row: ops.TRow, state: tp.Any) -> ops.TRowsGenerator:
+        """
+        :param group_key: names of key columns
+        :param key_row: values of key columns of group
+        :param state: state of group
+        """
+        pass
+
+
+class BatchSum(BatchReducer):
+    """
+    Sum values aggregated by key
+    Example for key=('a',) and column='b'
+        {'a': 1, 'b': 2, 'c': 4}
+        {'a': 1, 'b': 3, 'c': 5}
+        =>
+        {'a': 1, 'b': 5}
+    """
+
+    def __init__(self, column: str) -> None:
+        """
+        :param column: name for sum column
+        """
+        self.column = column
+
+    def update(self, states: dict[TKey, tp.Any], keys: list[TKey] | None, batch: Batch) -> None:
+        if keys is None:
+            total = batch[self.column].sum() if np is not None else sum(batch[self.column])
+            states[()] = states[()] + total if () in states else total
+            return
+        for key, value in zip(keys, _to_list(batch.columns[self.column])):
+            states[key] = states[key] + value if key in states else value
+
+    def finish(self, group_key: tuple[str, ...], key_row: ops.TRow, state: tp.Any) -> ops.TRowsGenerator:
+        key_row[self.column] = state.item() if np is not None and isinstance(state, np.generic) else state
+        yield key_row
+
+
+class BatchReduce(ops.Operation):
+    """
+    Reduce of unsorted input with batch reducer: rows are collected into batches (and passed through
+    chain of batch mappers fused into this operation) and states of groups are kept in dict.
+    Groups go in order of their first appearance.
+    """
+
+    def __init__(self, reducer: BatchReducer, keys: tp.Sequence[str], batch_rows: int = BATCH_ROWS,
+                 mappers: tp.Sequence[BatchMapper] = ()) -> None:
+        """
+        :param reducer: batch reducer to use
+        :param keys: keys for grouping
+        :param batch_rows: maximal number of rows in batch
+        :param mappers: chain of batch mappers to apply before reduce
+        """
+        self.reducer = reducer
+        self.keys = keys
+        self.batch_rows = batch_rows
+        self.mappers = list(mappers)
+
+    def __call__(self, rows: ops.TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> ops.TRowsGenerator:
+        group_key = tuple(self.keys)
+        states: dict[TKey, tp.Any] = {}
+        for batch in BatchMap(self.mappers, self.batch_rows).batches(rows):
+            keys = list(zip(*(_to_list(batch.columns[key]) for key in group_key))) if group_key else None
+            self.reducer.update(states, keys, batch)
+        for key, state in states.items():
+            yield from self.reducer.finish(group_key, dict(zip(group_key, key)), state)
@@ -1,49 +1,209 @@
+import heapq
+import itertools
 import typing as tp
 
 from multiprocessing import Pipe, Process, connection
 from operator import itemgetter
 
 from . import operations as ops
+from . import spill
+from . import transport
 
+MERGE_FAN_IN: int = 64
+# Rows checked for order in the main process before sorting is delegated to a separate process
+PROBE_BYTES: int = 4 * spill.MiB
 
-def do_sort(endpoint: connection.Connection, keys: tuple[str, ...]) -> None:
-    rows = []
-    while True:
-        row = endpoint.recv()
-        if row is None:
-            break
-        rows.append(row)
-    rows.sort(key=itemgetter(*keys))
-    for row in rows:
-        endpoint.send(row)
-    endpoint.send(None)
+
+class SortStats:
+    """What sort found out about its input, updated as rows are sorted"""
+
+    def __init__(self) -> None:
+        self.rows: int = 0
+        # Number of maximal non-descending sequences of rows in input, 1 if input is sorted already
+        self.runs: int = 0
+        # Number of run files merged, natural runs longer than memory limit are spilled as one file without sorting
+        self.spilled: int = 0
+        # Input turned out sorted before sorting process was started, rows were passed as they are
+        self.passed_through: bool = False
+
+    def __str__(self) -> str:
+        if self.passed_through:
+            return f'{self.rows} rows already sorted, passed through'
+        return f'{self.rows} rows in {self.runs} natural runs, {self.spilled} runs spilled'
+
+
+def _write_run(rows: list[ops.TRow], tmp_dir: str | None) -> spill.SpillFile:
+    run: spill.SpillFile[ops.TRow] = spill.SpillFile(tmp_dir)
+    run.write_all(rows)
+    return run
+
+
+def _merge_runs(runs: list[spill.SpillFile[ops.TRow]], key: tp.Callable[[ops.TRow], tp.Any],
+                tmp_dir: str | None) -> list[spill.SpillFile[ops.TRow]]:
+    """Merge neighbour runs into bigger ones while there are too many of them to be merged at once.
+    Runs keep their relative order, so the sort stays stable"""
+    while len(runs) > MERGE_FAN_IN:
+        merged_runs: list[spill.SpillFile[ops.TRow]] = []
+        for start in range(0, len(runs), MERGE_FAN_IN):
+            group = runs[start:start + MERGE_FAN_IN]
+            if len(group) == 1:
+                merged_runs.extend(group)
+                continue
+            merged: spill.SpillFile[ops.TRow] = spill.SpillFile(tmp_dir)
+            merged.write_all(heapq.merge(*(run.read() for run in group), key=key))
+            for run in group:
+                run.close()
+            merged_runs.append(merged)
+        runs = merged_runs
+    return runs
+
+
+def sort_rows(rows: ops.TRowsIterable, keys: tp.Sequence[str], memory_limit: int = spill.DEFAULT_MEMORY_LIMIT,
+              tmp_dir: str | None = None, stats: SortStats | None = None) -> ops.TRowsGenerator:
+    """
+    External merge sort: rows are collected into runs of bounded size, each run is sorted and spilled
+    to temporary file, then runs are k-way merged back.
+    Order of input is tracked while streaming: runs already in order are not sorted, and run which continues
+    the previous spilled one is appended to its file, so sorted input ends up in a single file read back without
+    merging, and input made of a few long sorted sequences is merged from about as many files.
+    :param rows: rows to sort
+    :param keys: sorting keys
+    :param memory_limit: approximate number of bytes rows of one run may take
+    :param tmp_dir: directory for run files (system default if None)
+    :param stats: statistics to update (dropped if None)
+    """
+    key = itemgetter(*keys)
+    stats = stats if stats is not None else SortStats()
+    runs: list[spill.SpillFile[ops.TRow]] = []
+    buffer: list[ops.TRow] = []
+    buffer_size: int = 0
+    buffer_sorted: bool = True
+    last: tp.Any = None
+    run_last: tp.Any = None
+
+    def flush() -> None:
+        nonlocal buffer, buffer_size, buffer_sorted, run_last
+        if not buffer_sorted:
+            buffer.sort(key=key)
+        if runs and not key(buffer[0]) < run_last:
+            # Rows of buffer go after rows of the last run, the sort stays stable
+            runs[-1].write_all(buffer)
+        else:
+            runs.append(_write_run(buffer, tmp_dir))
+        run_last = key(buffer[-1])
+        buffer, buffer_size, buffer_sorted = [], 0, True
+
+    try:
+        for row in rows:
+            current = key(row)
+            if not stats.rows:
+                stats.runs = 1
+            elif current < last:
+                stats.runs += 1
+                buffer_sorted = False
+            last = current
+            stats.rows += 1
+            buffer.append(row)
+            buffer_size += spill.estimate_size(row)
+            if buffer_size >= memory_limit:
+                flush()
+
+        if not runs:
+            if not buffer_sorted:
+                buffer.sort(key=key)
+            yield from buffer
+            return
+
+        if buffer:
+            flush()
+        stats.spilled = len(runs)
+        if len(runs) == 1:
+            yield from runs[0].read()
+            return
+        runs = _merge_runs(runs, key, tmp_dir)
+        yield from heapq.merge(*(run.read() for run in runs), key=key)
+    finally:
+        for run in runs:
+            run.close()
+
+
+def do_sort(endpoint: connection.Connection, keys: tuple[str, ...], memory_limit: int,
+            tmp_dir: str | None, batch_rows: int) -> None:
+    stats = SortStats()
+    rows = sort_rows(transport.recv_rows(endpoint), keys, memory_limit, tmp_dir, stats)
+    transport.send_rows(endpoint, rows, batch_rows)
+    endpoint.send(stats)
 
 
 class ExternalSort(ops.Operation):
     """
     In order to not account materialization during sorting in main process memory consumption, we delegate
     sorting to a separate process.
+    The process does external merge sort, so its memory is bounded by memory_limit as well.
+    Rows travel between processes in batches to pay pickling and syscall overhead once per batch.
     This class illustrates cross-process streaming.
+    Input which is found sorted within the first probe_bytes is passed through without starting the process,
+    longer presorted input is only merged by natural runs (see sort_rows). What was detected is reported in stats.
     """
 
-    def __init__(self, keys: tp.Sequence[str]):
+    def __init__(self, keys: tp.Sequence[str], memory_limit: int = spill.DEFAULT_MEMORY_LIMIT,
+                 tmp_dir: str | None = None, batch_rows: int = transport.BATCH_ROWS,
+                 probe_bytes: int = PROBE_BYTES) -> None:
+        """
+        :param keys: sorting keys
+        :param memory_limit: approximate number of bytes sorting process keeps in memory before spilling to disk
+        :param tmp_dir: directory for temporary files (system default if None)
+        :param batch_rows: number of rows sent between processes in one pickled frame
+        :param probe_bytes: approximate number of bytes of rows kept in main process while they are in order
+            (no more than memory_limit)
+        """
         self.keys = keys
+        self.memory_limit = memory_limit
+        self.tmp_dir = tmp_dir
+        self.batch_rows = batch_rows
+        self.probe_bytes = probe_bytes
+        self.stats = SortStats()
+
+    def ordering(self, *inputs: ops.Ordering) -> ops.Ordering:
+        # Sort of rows already sorted by keys is skipped by planner, so order by further columns stays
+        if inputs[0].sorted_by(self.keys):
+            return inputs[0]
+        return ops.Ordering(self.keys, self.keys)
 
     def __call__(self, rows: ops.TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> ops.TRowsGenerator:
+        self.stats = SortStats()
+        key = itemgetter(*self.keys)
+        rows = iter(rows)
+        probe: list[ops.TRow] = []
+        probe_size: int = 0
+        # Probe is held in main process, so it is bounded by memory limit of sorting too
+        probe_limit = min(self.probe_bytes, self.memory_limit)
+        last: tp.Any = None
+        for row in rows:
+            current = key(row)
+            if probe and current < last:
+                rows = itertools.chain([row], rows)
+                break
+            probe.append(row)
+            probe_size += spill.sampled_size(row, len(probe))
+            last = current
+            if probe_size >= probe_limit:
+                break
+        else:
+            self.stats.rows, self.stats.runs, self.stats.passed_through = len(probe), min(len(probe), 1), True
+            yield from probe
+            return
+
         local_endpoint, remote_endpoint = Pipe()
-        process = Process(target=do_sort, args=(remote_endpoint, self.keys))
+        process = Process(target=do_sort,
+                          args=(remote_endpoint, self.keys, self.memory_limit, self.tmp_dir, self.batch_rows))
         process.start()
-        row_count_before = 0
-        for row in rows:
-            local_endpoint.send(row)
-            row_count_before += 1
-        local_endpoint.send(None)
+        row_count_before = transport.send_rows(local_endpoint, itertools.chain(probe, rows), self.batch_rows)
+        del probe
         row_count_after = 0
-        while True:
-            local_endpoint_row = local_endpoint.recv()
-            if local_endpoint_row is None:
-                break
-            yield local_endpoint_row
-            row_count_after += 1
+        for batch in transport.recv_batches(local_endpoint):
+            yield from batch
+            row_count_after += len(batch)
         assert row_count_before == row_count_after
+        self.stats = local_endpoint.recv()
         process.join()
@@ -1,15 +1,30 @@
 import typing as tp
+from . import cache as result_cache
+from . import columnar
 from . import external_sort
+from . import hash_join
+from . import hash_reduce
+from . import incremental
 from . import operations as ops
+from . import parallel
+from . import planner
+from . import readers
+from . import sinks
+from . import spill
+from . import table
 
 
 class Graph:
     """Computational graph implementation"""
 
-    def __init__(self, op: ops.Operation, prev_node: tp.Union['Graph', None] = None) -> None:
+    def __init__(self, op: ops.Operation, prev_node: tp.Union['Graph', None] = None,
+                 join_graph: tp.Union['Graph', None] = None) -> None:
         self._op = op
-        self._join_graph: tp.Union['Graph', None] = None
+        self._join_graph = join_graph
         self._prev_node = prev_node
+        self._cached = False
+        inputs = [graph._ordering for graph in (prev_node, join_graph) if graph is not None]
+        self._ordering: ops.Ordering = op.ordering(*inputs)
 
     @staticmethod
     def graph_from_iter(name: str) -> 'Graph':
@@ -21,50 +36,227 @@ class Graph:
         return Graph(ops.ReadIterFactory(name))
 
     @staticmethod
-    def graph_from_file(filename: str, parser: tp.Callable[[str], ops.TRow]) -> 'Graph':
+    def graph_from_file(filename: str, parser: tp.Callable[[str], ops.TRow], workers: int = 1) -> 'Graph':
         """Construct new graph extended with operation for reading rows from file
-        Use ops.Read
+        Use ops.Read, or parallel.ParallelRead if workers > 1
         :param filename: filename to read from
         :param parser: parser from string to Row
+        :param workers: number of worker processes reading byte ranges of file; if greater than 1
+            order of rows is not kept and parallel maps after reading are fused into workers
         """
+        if workers > 1:
+            return Graph(parallel.ParallelRead(filename, lambda line: parser(line.decode()), workers, keep_ends=True))
         return Graph(ops.Read(filename, parser))
 
-    def map(self, mapper: ops.Mapper) -> 'Graph':
+    @staticmethod
+    def graph_from_jsonl(filename: str, block_size: int = readers.BLOCK_SIZE, workers: int = 1,
+                         append_only: bool = False) -> 'Graph':
+        """Construct new graph extended with operation for reading rows from file with one JSON object per line
+        Use readers.ReadJsonLines (its throughput is available as graph._op.stats),
+        or parallel.ParallelRead if workers > 1
+        :param filename: filename to read from
+        :param block_size: number of bytes read at once
+        :param workers: number of worker processes reading byte ranges of file; if greater than 1
+            order of rows is not kept and parallel maps after reading are fused into workers
+        :param append_only: file only grows by appends, so runs with state_dir reduce only appended lines
+        """
+        if workers > 1:
+            return Graph(parallel.ParallelRead(filename, readers.loads, workers, block_size=block_size,
+                                               append_only=append_only))
+        return Graph(readers.ReadJsonLines(filename, block_size, append_only))
+
+    @staticmethod
+    def graph_from_table(filename: str, columns: tp.Sequence[str] | None = None,
+                         where: dict[str, table.TBounds] | None = None) -> 'Graph':
+        """Construct new graph extended with operation for reading rows from columnar table file
+        Use table.ReadTable; only requested columns are read from disk and chunks whose min/max index
+        is out of where bounds are skipped
+        :param filename: filename written by table.write_table
+        :param columns: columns to read (all if None)
+        :param where: keep only rows which values of columns are within inclusive (low, high) bounds,
+            None for open bound
+        """
+        return Graph(table.ReadTable(filename, columns, where))
+
+    def map(self, mapper: ops.Mapper, workers: int = 1, ordered: bool = True) -> 'Graph':
         """Construct new graph extended with map operation with particular mapper
+        Consecutive maps with the same workers and ordered are fused into one worker task
         :param mapper: mapper to use
+        :param workers: number of worker processes, 1 maps rows in the calling process
+        :param ordered: keep order of rows when mapping in worker processes
         """
+        if workers > 1:
+            return Graph(parallel.ParallelMap([mapper], workers=workers, ordered=ordered), self)
         return Graph(ops.Map(mapper), self)
 
-    def reduce(self, reducer: ops.Reducer, keys: tp.Sequence[str]) -> 'Graph':
+    def map_batch(self, mapper: columnar.BatchMapper | ops.Mapper,
+                  batch_rows: int = columnar.BATCH_ROWS) -> 'Graph':
+        """Construct new graph extended with map operation processing batches of rows stored by columns
+        Consecutive batch maps (and batch reduce after them) are fused, so rows are collected into batches once
+        :param mapper: batch mapper to use, row mapper is applied to every row of batch
+        :param batch_rows: maximal number of rows in batch
+        """
+        if isinstance(mapper, ops.Mapper):
+            mapper = columnar.RowAdapter(mapper, batch_rows)
+        return Graph(columnar.BatchMap([mapper], batch_rows), self)
+
+    def reduce_batch(self, reducer: columnar.BatchReducer, keys: tp.Sequence[str],
+                     batch_rows: int = columnar.BATCH_ROWS) -> 'Graph':
+        """Construct new graph extended with reduce operation aggregating batches of rows in memory
+        Input does not need to be sorted, groups go in order of their first appearance
+        :param reducer: batch reducer to use
+        :param keys: keys for grouping
+        :param batch_rows: maximal number of rows in batch
+        """
+        return Graph(columnar.BatchReduce(reducer, keys, batch_rows), self)
+
+    def reduce(self, reducer: ops.Reducer, keys: tp.Sequence[str], mode: str = 'sort', combine: bool = False,
+               workers: int = 1, ordered: bool = False, memory_limit: int = spill.DEFAULT_MEMORY_LIMIT,
+               tmp_dir: str | None = None) -> 'Graph':
         """Construct new graph extended with reduce operation with particular reducer
         :param reducer: reducer to use
         :param keys: keys for grouping
+        :param mode: 'sort' for input sorted (grouped) by keys,
+            'hash' for unsorted input aggregated in hash table (reducer must be ops.MergeableReducer)
+        :param combine: pre-aggregate rows with ops.Combine ahead of the sort this reduce follows (ahead of
+            the shuffle if workers > 1, ahead of hash aggregation in mode 'hash'), so only partial aggregates are
+            sorted, shuffled or hashed (reducer must be ops.MergeableReducer)
+        :param workers: number of worker processes; if greater than 1 rows are hash-partitioned on keys between
+            workers, which sort (mode 'sort') or hash-aggregate (mode 'hash') their partitions, so input
+            does not need to be sorted
+        :param ordered: order output of workers by keys
+        :param memory_limit: approximate number of bytes hash aggregation (or every worker) keeps in memory
+        :param tmp_dir: directory for temporary files (system default if None)
         """
-        return Graph(ops.Reduce(reducer, keys=keys), self)
+        if mode not in ('sort', 'hash'):
+            raise ValueError(f'Unknown reduce mode: {mode}')
+        if mode == 'sort' and not combine:
+            if workers > 1:
+                return Graph(parallel.PartitionedReduce(reducer, keys, workers, mode, ordered, memory_limit, tmp_dir),
+                             self)
+            self._check_grouped(keys, 'reduce')
+            return Graph(ops.Reduce(reducer, keys=keys), self)
+        if not isinstance(reducer, ops.MergeableReducer):
+            raise TypeError(f'{type(reducer).__name__} does not support partial aggregation')
+        if workers > 1:
+            graph = Graph(ops.Combine(reducer, keys=keys), self) if combine else self
+            reducer = ops.MergePartials(reducer) if combine else reducer
+            return Graph(parallel.PartitionedReduce(reducer, keys, workers, mode, ordered, memory_limit, tmp_dir),
+                         graph)
+        if combine and mode == 'sort':
+            return self._combined_reduce(reducer, keys)
+        if combine:
+            return Graph(hash_reduce.HashReduce(ops.MergePartials(reducer), keys=keys, memory_limit=memory_limit,
+                                                tmp_dir=tmp_dir), Graph(ops.Combine(reducer, keys=keys), self))
+        return Graph(hash_reduce.HashReduce(reducer, keys=keys, memory_limit=memory_limit, tmp_dir=tmp_dir), self)
 
-    # fix
-    def sort(self, keys: tp.Sequence[str]) -> 'Graph':
+    def _combined_reduce(self, reducer: ops.MergeableReducer, keys: tp.Sequence[str]) -> 'Graph':
+        """Rebuild 'sort -> reduce' as 'combine -> sort -> merge partials'.
+        The sort node itself stays untouched, it may be used by other branches"""
+        if not isinstance(self._op, external_sort.ExternalSort) or self._prev_node is None \
+                or set(self._op.keys) != set(keys):
+            raise ValueError('combine needs reduce to follow sort by the same keys')
+        combined = Graph(ops.Combine(reducer, keys=keys), self._prev_node)
+        return Graph(ops.Reduce(ops.MergePartials(reducer), keys=keys), Graph(self._op, combined))
+
+    def sort(self, keys: tp.Sequence[str], memory_limit: int = spill.DEFAULT_MEMORY_LIMIT,
+             tmp_dir: str | None = None) -> 'Graph':
         """Construct new graph extended with sort operation
+        Sort is external: rows which do not fit into memory_limit are spilled to temporary files
+        Sort of rows known to be sorted by keys already (see ordering) is skipped, rows found sorted while
+        streaming are passed through or merged by natural runs (see graph._op.stats after run)
         :param keys: sorting keys (typical is tuple of strings)
+        :param memory_limit: approximate number of bytes sorting keeps in memory
+        :param tmp_dir: directory for temporary files (system default if None)
         """
-        return Graph(external_sort.ExternalSort(keys=keys), self)
+        return Graph(external_sort.ExternalSort(keys=keys, memory_limit=memory_limit, tmp_dir=tmp_dir), self)
 
-    # fix
-    def join(self, joiner: ops.Joiner, join_graph: 'Graph', keys: tp.Sequence[str]) -> 'Graph':
+    def join(self, joiner: ops.Joiner, join_graph: 'Graph', keys: tp.Sequence[str], strategy: str = 'sort',
+             memory_limit: int = spill.DEFAULT_MEMORY_LIMIT, tmp_dir: str | None = None,
+             small: str | None = None) -> 'Graph':
         """Construct new graph extended with join operation with another graph
         :param joiner: join strategy to use
         :param join_graph: other graph to join with
         :param keys: keys for grouping
+        :param strategy: 'sort' for merge join of inputs sorted by keys,
+            'hash' for hash join of unsorted inputs (smaller side is kept in memory, grace hash join
+            if it does not fit),
+            'broadcast' for join with small table (small side is kept in memory, rows of the other one stream
+            through it in their order), e.g. cross join with no keys
+        :param memory_limit: approximate number of bytes hash join keeps in memory
+        :param tmp_dir: directory for temporary files of hash join (system default if None)
+        :param small: side known to be small for broadcast join: 'a' for this graph, 'b' for join_graph
+            (detected at run time if None)
+        """
+        op: ops.Operation
+        if strategy == 'sort':
+            self._check_sorted(keys, 'join')
+            join_graph._check_sorted(keys, 'join')
+            op = ops.Join(joiner, keys=keys)
+        elif strategy == 'hash':
+            op = hash_join.HashJoin(joiner, keys=keys, memory_limit=memory_limit, tmp_dir=tmp_dir)
+        elif strategy == 'broadcast':
+            op = hash_join.BroadcastJoin(joiner, keys=keys, small=small, memory_limit=memory_limit, tmp_dir=tmp_dir)
+        else:
+            raise ValueError(f'Unknown join strategy: {strategy}')
+        return Graph(op, self, join_graph)
+
+    @property
+    def ordering(self) -> ops.Ordering:
+        """Known order and grouping of rows of this node, derived from operations when graph is built"""
+        return self._ordering
+
+    def _check_sorted(self, keys: tp.Sequence[str], operation: str) -> None:
+        if self._ordering.known and not self._ordering.sorted_by(keys):
+            raise ValueError(f'{operation} by {list(keys)} needs rows sorted by them, '
+                             f'but they are arranged as {self._ordering}')
+
+    def _check_grouped(self, keys: tp.Sequence[str], operation: str) -> None:
+        if self._ordering.known and not self._ordering.grouped_by(keys):
+            raise ValueError(f'{operation} by {list(keys)} needs rows grouped by them, '
+                             f'but they are arranged as {self._ordering}')
+
+    def cache(self) -> 'Graph':
+        """Mark output of this node to be stored in result cache of run (see run cache_dir), so later runs
+        with the same operations and unchanged input files read it instead of evaluating the node"""
+        self._cached = True
+        return self
+
+    def run(self, cache_dir: str | result_cache.ResultCache | None = None, state_dir: str | None = None,
+            **kwargs: tp.Any) -> ops.TRowsIterable:
+        """Single method to start execution; data sources passed as kwargs
+        Nodes shared by several branches are executed only once
+        :param cache_dir: directory of result cache (or cache with custom size bound): output of graph and of nodes
+            marked by cache is stored there under fingerprint of operations and input files, and reused by later
+            runs; nodes reading data sources of kwargs are not cached
+        :param state_dir: directory of states of incremental run: reduces with mergeable reducer, which read
+            append-only file (see graph_from_jsonl) through maps, combines, sorts and inner or left joins
+            (as the left side) read by nobody else, keep position in file and states of groups there,
+            so later runs fold only appended rows into them; states of groups are kept in memory
+        """
+        cache = result_cache.ResultCache(cache_dir) if isinstance(cache_dir, str) else cache_dir
+        state = incremental.IncrementalState(state_dir) if state_dir is not None else None
+        yield from planner.Execution(self, kwargs, cache, state).run()
+
+    def write_to(self, sink: sinks.Sink, shards: int = 1, **kwargs: tp.Any) -> sinks.WriteStats:
+        """Run graph and write resulting rows with sink (sinks.sink_for chooses one by filename)
+        :param sink: sink to write with
+        :param shards: number of output files written in parallel by worker processes, rows are spread
+            between them by batches; shard files are named by sinks.shard_filename
+        :param kwargs: data sources as in run
+        :return: counters of written rows and bytes
+        """
+        if shards > 1:
+            return sinks.write_sharded(self.run(**kwargs), sink, shards)
+        return sink(self.run(**kwargs))
+
+    def write_table(self, filename: str, columns: tp.Sequence[str] | None = None,
+                    chunk_rows: int = table.CHUNK_ROWS, **kwargs: tp.Any) -> int:
+        """Run graph and write resulting rows into columnar table file, which graph_from_table reads back
+        :param filename: filename to write to
+        :param columns: names of columns (columns of the first row if None)
+        :param chunk_rows: number of rows in chunk of table
+        :param kwargs: data sources as in run
+        :return: number of written rows
         """
-        graph = Graph(ops.Join(joiner, keys=keys), self)
-        graph._join_graph = join_graph
-        return graph
-
-    def run(self, **kwargs: tp.Any) -> ops.TRowsIterable:
-        """Single method to start execution; data sources passed as kwargs"""
-        if self._join_graph is not None and self._prev_node is not None:
-            yield from self._op(self._prev_node.run(**kwargs), self._join_graph.run(**kwargs))
-        elif self._prev_node is None:
-            yield from self._op(**kwargs)
-        elif self._prev_node is not None:
-            yield from self._op(self._prev_node.run(**kwargs))
+        return self.write_to(sinks.TableSink(filename, columns, chunk_rows), **kwargs).rows
@@ -0,0 +1,176 @@
+import typing as tp
+from itertools import chain, groupby
+
+from . import operations as ops
+from . import spill
+
+PARTITIONS: int = 16
+MAX_PARTITION_DEPTH: int = 3
+
+TKey = tuple[tp.Any, ...]
+
+
+def read_smaller(rows_a: tp.Iterator[ops.TRow], rows_b: tp.Iterator[ops.TRow], memory_limit: int
+                 ) -> tuple[str | None, list[ops.TRow], list[ops.TRow]]:
+    """
+    Read both sides in turn until one of them is over: it is the smaller one.
+    :param rows_a: left table rows
+    :param rows_b: right table rows
+    :param memory_limit: approximate number of bytes both read prefixes may take
+    :return: 'a' or 'b' for the side which was read completely (None if memory_limit was reached first)
+        and rows read from both sides; rest of rows stay in the iterators
+    """
+    buffer_a: list[ops.TRow] = []
+    buffer_b: list[ops.TRow] = []
+    size: int = 0
+    while size < memory_limit:
+        row_a = next(rows_a, None)
+        if row_a is None:
+            return 'a', buffer_a, buffer_b
+        buffer_a.append(row_a)
+        row_b = next(rows_b, None)
+        if row_b is None:
+            return 'b', buffer_a, buffer_b
+        buffer_b.append(row_b)
+        size += spill.estimate_size(row_a) + spill.estimate_size(row_b)
+    return None, buffer_a, buffer_b
+
+
+class HashJoin(ops.Operation):
+    """
+    Join of unsorted inputs.
+    Smaller side is loaded into in-memory hash table and the other one streams through it, so output goes in order
+    of the streamed side. If no side fits into memory_limit, both are partitioned to disk by hash of keys
+    and partitions are joined pairwise (grace hash join).
+    """
+
+    def __init__(self, joiner: ops.Joiner, keys: tp.Sequence[str], memory_limit: int = spill.DEFAULT_MEMORY_LIMIT,
+                 tmp_dir: str | None = None) -> None:
+        """
+        :param joiner: join strategy to use
+        :param keys: keys for joining
+        :param memory_limit: approximate number of bytes hash table may take
+        :param tmp_dir: directory for partition files (system default if None)
+        """
+        self.joiner = joiner
+        self.keys = keys
+        self.memory_limit = memory_limit
+        self.tmp_dir = tmp_dir
+
+    def __call__(self, rows: ops.TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> ops.TRowsGenerator:
+        yield from self._join(iter(rows), iter(args[0]), depth=0)
+
+    def _key(self, row: ops.TRow) -> TKey:
+        return tuple(row[key] for key in self.keys)
+
+    def _join(self, rows_a: tp.Iterator[ops.TRow], rows_b: tp.Iterator[ops.TRow], depth: int) -> ops.TRowsGenerator:
+        smaller, buffer_a, buffer_b = read_smaller(rows_a, rows_b, self.memory_limit)
+        if smaller == 'a':
+            yield from self._build_and_probe(buffer_a, chain(buffer_b, rows_b), build_a=True)
+        elif smaller == 'b':
+            yield from self._build_and_probe(buffer_b, chain(buffer_a, rows_a), build_a=False)
+        elif depth >= MAX_PARTITION_DEPTH:
+            # Partitioning does not help any more (single huge key), so hash table is built regardless of limit
+            yield from self._build_and_probe(chain(buffer_b, rows_b), chain(buffer_a, rows_a), build_a=False)
+        else:
+            partitions_a = self._partition(chain(buffer_a, rows_a), depth)
+            partitions_b = self._partition(chain(buffer_b, rows_b), depth)
+            try:
+                for partition_a, partition_b in zip(partitions_a, partitions_b):
+                    yield from self._join(partition_a.read(), partition_b.read(), depth + 1)
+            finally:
+                for partition in partitions_a + partitions_b:
+                    partition.close()
+
+    def _partition(self, rows: ops.TRowsIterable, depth: int) -> list[spill.SpillFile[ops.TRow]]:
+        partitions: list[spill.SpillFile[ops.TRow]] = [spill.SpillFile(self.tmp_dir) for _ in range(PARTITIONS)]
+        chunks: list[list[ops.TRow]] = [[] for _ in range(PARTITIONS)]
+        for row in rows:
+            # Hash is salted by depth, so rows of one partition are spread on the next level
+            index = hash((depth, self._key(row))) % PARTITIONS
+            chunks[index].append(row)
+            if len(chunks[index]) >= spill.CHUNK_ROWS:
+                partitions[index].write(chunks[index])
+                chunks[index] = []
+        for partition, chunk in zip(partitions, chunks):
+            if chunk:
+                partition.write(chunk)
+        return partitions
+
+    def _build_and_probe(self, build: ops.TRowsIterable, probe: ops.TRowsIterable,
+                         build_a: bool) -> ops.TRowsGenerator:
+        table: dict[TKey, list[ops.TRow]] = {}
+        for row in build:
+            table.setdefault(self._key(row), []).append(row)
+
+        matched: set[TKey] = set()
+        for key, probe_rows in self._probe_groups(probe):
+            group = table.get(key)
+            if group is not None:
+                matched.add(key)
+            build_rows: ops.TRowsIterable = iter(group) if group is not None else []
+            if build_a:
+                yield from self.joiner(self.keys, build_rows, probe_rows)
+            else:
+                yield from self.joiner(self.keys, probe_rows, build_rows)
+
+        for key, group in table.items():
+            if key not in matched:
+                if build_a:
+                    yield from self.joiner(self.keys, iter(group), [])
+                else:
+                    yield from self.joiner(self.keys, [], iter(group))
+
+    def _probe_groups(self, probe: ops.TRowsIterable) -> tp.Iterable[tuple[TKey, ops.TRowsIterable]]:
+        """Rows of probe side by keys, each run of equal keys is looked up in hash table once"""
+        if not self.keys:
+            # Every row matches all build rows, so probe side streams through them as a whole without grouping
+            probe = iter(probe)
+            first = next(probe, None)
+            return [((), chain([first], probe))] if first is not None else []
+        return groupby(probe, key=self._key)
+
+
+class BroadcastJoin(HashJoin):
+    """
+    Join with small table, e.g. cross join (no keys) with single row of totals or join with dimension table.
+    Small side is read into memory once and rows of the other side stream through it in their order,
+    nothing is sorted and the streamed side is not grouped. If small side is not declared, it is detected
+    as by hash join (the side which ends first when both are read in turn).
+    """
+
+    def __init__(self, joiner: ops.Joiner, keys: tp.Sequence[str], small: str | None = None,
+                 memory_limit: int = spill.DEFAULT_MEMORY_LIMIT, tmp_dir: str | None = None) -> None:
+        """
+        :param joiner: join strategy to use
+        :param keys: keys for joining (empty for cross join)
+        :param small: side known to be small: 'a' for the left one, 'b' for the right one (detected if None)
+        :param memory_limit: approximate number of bytes small side may take when it is detected
+        :param tmp_dir: directory for partition files if no side turns out small (system default if None)
+        """
+        if small not in ('a', 'b', None):
+            raise ValueError(f'Unknown small side: {small}')
+        super().__init__(joiner, keys, memory_limit, tmp_dir)
+        self.small = small
+
+    def ordering(self, *inputs: ops.Ordering) -> ops.Ordering:
+        # Streamed rows keep their order, though only keys are known to keep their names in joined rows
+        keeping = ops.LeftJoiner if self.small == 'b' else ops.RightJoiner
+        if self.small is None or not isinstance(self.joiner, (ops.InnerJoiner, keeping)):
+            return ops.Ordering()
+        streamed = inputs[0] if self.small == 'b' else inputs[1]
+        return streamed.restricted(lambda columns: set(columns) <= set(self.keys))
+
+    def __call__(self, rows: ops.TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> ops.TRowsGenerator:
+        if self.small == 'a':
+            yield from self._build_and_probe(rows, args[0], build_a=True)
+        elif self.small == 'b':
+            yield from self._build_and_probe(args[0], rows, build_a=False)
+        else:
+            yield from super().__call__(rows, *args, **kwargs)
+
+    def _probe_groups(self, probe: ops.TRowsIterable) -> tp.Iterable[tuple[TKey, ops.TRowsIterable]]:
+        """Every streamed row is looked up in hash table by itself, so rows are not grouped by keys"""
+        if not self.keys:
+            return super()._probe_groups(probe)
+        return ((self._key(row), iter((row,))) for row in probe)
@@ -0,0 +1,99 @@
+import typing as tp
+
+from . import operations as ops
+from . import spill
+
+PARTITIONS: int = 16
+
+TKey = tuple[tp.Any, ...]
+TGroup = list[tp.Any]  # [key_row, state]
+
+
+class HashReduce(ops.Operation):
+    """
+    Reduce of unsorted input with mergeable reducer: state of every group is kept in dict.
+    When states take more than memory_limit, they are spilled to disk partitioned by hash of keys and dict
+    is cleared; in the end partial states of every partition are merged.
+    Groups go in order of their first appearance (within partition if there was a spill).
+    """
+
+    def __init__(self, reducer: ops.MergeableReducer, keys: tp.Sequence[str],
+                 memory_limit: int = spill.DEFAULT_MEMORY_LIMIT, tmp_dir: str | None = None) -> None:
+        """
+        :param reducer: reducer to use
+        :param keys: keys for grouping
+        :param memory_limit: approximate number of bytes states of groups may take
+        :param tmp_dir: directory for partition files (system default if None)
+        """
+        self.reducer = reducer
+        self.keys = keys
+        self.memory_limit = memory_limit
+        self.tmp_dir = tmp_dir
+
+    def ordering(self, *inputs: ops.Ordering) -> ops.Ordering:
+        return ops.Ordering(grouping=self.keys)
+
+    def __call__(self, rows: ops.TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> ops.TRowsGenerator:
+        group_key = tuple(self.keys)
+        groups: dict[TKey, TGroup] = {}
+        size: int = 0
+        # Sizes of growing states as of their last estimation
+        state_sizes: dict[TKey, int] = {}
+        partitions: list[spill.SpillFile[tuple[TKey, ops.TRow, tp.Any]]] = []
+        try:
+            for row in rows:
+                key = tuple(row[k] for k in group_key)
+                group = groups.get(key)
+                if group is not None:
+                    group[1] = self.reducer.update(group[1], row)
+                    if not self.reducer.growing:
+                        continue
+                    state_size = self.reducer.state_size(group[1])
+                    size += state_size - state_sizes[key]
+                    state_sizes[key] = state_size
+                else:
+                    key_row = {k: row[k] for k in group_key}
+                    state = self.reducer.start(row)
+                    groups[key] = [key_row, state]
+                    state_size = self.reducer.state_size(state)
+                    if self.reducer.growing:
+                        state_sizes[key] = state_size
+                    size += spill.estimate_size(key_row) + state_size
+                if size >= self.memory_limit:
+                    if not partitions:
+                        partitions = [spill.SpillFile(self.tmp_dir) for _ in range(PARTITIONS)]
+                    self._spill(groups, partitions)
+                    groups, state_sizes, size = {}, {}, 0
+
+            if not partitions:
+                yield from self._finish(groups)
+                return
+
+            self._spill(groups, partitions)
+            groups = {}
+            for partition in partitions:
+                for key, key_row, state in partition.read():
+                    group = groups.get(key)
+                    if group is None:
+                        groups[key] = [key_row, state]
+                    else:
+                        group[1] = self.reducer.merge(group[1], state)
+                yield from self._finish(groups)
+                groups = {}
+        finally:
+            for partition in partitions:
+                partition.close()
+
+    def _finish(self, groups: dict[TKey, TGroup]) -> ops.TRowsGenerator:
+        group_key = tuple(self.keys)
+        for key_row, state in groups.values():
+            yield from self.reducer.finish(group_key, key_row, state)
+
+    @staticmethod
+    def _spill(groups: dict[TKey, TGroup],
+               partitions: list[spill.SpillFile[tuple[TKey, ops.TRow, tp.Any]]]) -> None:
+        chunks: list[list[tuple[TKey, ops.TRow, tp.Any]]] = [[] for _ in partitions]
+        for key, (key_row, state) in groups.items():
+            chunks[hash(key) % len(partitions)].append((key, key_row, state))
+        for partition, chunk in zip(partitions, chunks):
+            partition.write_all(chunk)
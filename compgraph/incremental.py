@@ -0,0 +1,150 @@
+import hashlib
+import os
+import pickle
+import typing as tp
+from operator import itemgetter
+
+from . import cache as result_cache
+from . import columnar
+from . import external_sort
+from . import hash_join
+from . import hash_reduce
+from . import operations as ops
+from . import parallel
+from . import spill
+
+if tp.TYPE_CHECKING:
+    from .graph import Graph
+
+# Bytes at the beginning and at the end of processed part of file checked to detect rewritten file
+CHECKED_BYTES: int = 64 * spill.KiB
+
+# Operations which output for concatenation of inputs is concatenation of outputs for every input
+ROW_WISE_OPERATIONS: tuple[type, ...] = (ops.Map, parallel.ParallelMap, columnar.BatchMap, ops.Combine,
+                                         external_sort.ExternalSort)
+# Joiners which output for concatenation of left inputs is concatenation of outputs (with the same right input)
+ROW_WISE_JOINERS: tuple[type, ...] = (ops.InnerJoiner, ops.LeftJoiner)
+
+_SUFFIX = '.state'
+
+
+def mergeable_reducer(op: ops.Operation) -> ops.MergeableReducer | None:
+    """Reducer of reduce operation if its states may be kept between runs"""
+    if isinstance(op, (ops.Reduce, hash_reduce.HashReduce, parallel.PartitionedReduce)) and \
+            isinstance(op.reducer, ops.MergeableReducer):
+        return op.reducer
+    return None
+
+
+def appended_chain(node: 'Graph', consumers: dict[int, int]) -> list['Graph'] | None:
+    """Nodes between reduce node and append-only file it reads, if rows appended to the file may be reduced alone
+    :param node: reduce node
+    :param consumers: number of consumers of nodes
+    :return: nodes from the one read by reduce to the reader of file; None if some node is read by other nodes
+        too, is not row-wise or does not end with append-only reader
+    """
+    chain: list['Graph'] = []
+    current = node._prev_node
+    while current is not None:
+        if consumers.get(id(current), 0) != 1:
+            return None
+        op = current._op
+        if current._prev_node is None:
+            chain.append(current)
+            return chain if getattr(op, 'append_only', False) else None
+        if current._join_graph is not None:
+            if not isinstance(op, (ops.Join, hash_join.HashJoin)) or not isinstance(op.joiner, ROW_WISE_JOINERS):
+                return None
+        elif not isinstance(op, ROW_WISE_OPERATIONS):
+            return None
+        chain.append(current)
+        current = current._prev_node
+    return None
+
+
+def _digest(filename: str, end: int) -> str:
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as file:
+        digest.update(file.read(min(end, CHECKED_BYTES)))
+        file.seek(max(end - CHECKED_BYTES, 0))
+        digest.update(file.read(end - file.tell()))
+    return digest.hexdigest()
+
+
+class IncrementalState:
+    """
+    Directory of states of incremental reduces: position in append-only file up to which rows were reduced
+    and states of groups of mergeable reducer. State is dropped if the processed part of file was rewritten.
+    """
+
+    def __init__(self, state_dir: str) -> None:
+        """
+        :param state_dir: directory to keep states in, created if missing
+        """
+        self.state_dir = state_dir
+        os.makedirs(state_dir, exist_ok=True)
+        self.files = result_cache.FileHashes(os.path.join(state_dir, 'files.json'))
+
+    def load(self, key: str, filename: str) -> tuple[int, dict[hash_reduce.TKey, hash_reduce.TGroup]]:
+        """
+        :param key: fingerprint of reduce node
+        :param filename: append-only file it reads
+        :return: position to continue reading file at and states of groups (0 and no groups to start over)
+        """
+        try:
+            with open(self._path(key), 'rb') as file:
+                state = pickle.load(file)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return 0, {}
+        if state['filename'] != os.path.abspath(filename) or os.path.getsize(filename) < state['end'] \
+                or _digest(filename, state['end']) != state['digest']:
+            return 0, {}
+        return state['end'], state['groups']
+
+    def save(self, key: str, filename: str, end: int, groups: dict[hash_reduce.TKey, hash_reduce.TGroup]) -> None:
+        """
+        :param key: fingerprint of reduce node
+        :param filename: append-only file it reads
+        :param end: position up to which file is reduced
+        :param groups: states of groups
+        """
+        state = {'filename': os.path.abspath(filename), 'end': end, 'digest': _digest(filename, end),
+                 'groups': groups}
+        with open(self._path(key) + '.tmp', 'wb') as file:
+            pickle.dump(state, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(self._path(key) + '.tmp', self._path(key))
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.state_dir, key + _SUFFIX)
+
+
+def fold(reducer: ops.MergeableReducer, keys: tp.Sequence[str], rows: ops.TRowsIterable,
+         groups: dict[hash_reduce.TKey, hash_reduce.TGroup]) -> None:
+    """Fold rows into states of groups in place
+    :param reducer: reducer to fold with
+    :param keys: keys for grouping
+    :param rows: rows to fold
+    :param groups: states of groups by values of keys
+    """
+    for row in rows:
+        key = tuple(row[k] for k in keys)
+        group = groups.get(key)
+        if group is not None:
+            group[1] = reducer.update(group[1], row)
+        else:
+            groups[key] = [{k: row[k] for k in keys}, reducer.start(row)]
+
+
+def finish(reducer: ops.MergeableReducer, keys: tp.Sequence[str], groups: dict[hash_reduce.TKey, hash_reduce.TGroup],
+           ordered: bool) -> ops.TRowsGenerator:
+    """Rows of reducer for states of groups
+    :param reducer: reducer to finish with
+    :param keys: keys for grouping
+    :param groups: states of groups by values of keys
+    :param ordered: output groups in order of keys rather than of their first appearance
+    """
+    items: tp.Iterable[tuple[hash_reduce.TKey, hash_reduce.TGroup]] = groups.items()
+    if ordered:
+        items = sorted(items, key=itemgetter(0))
+    for _, (key_row, state) in items:
+        yield from reducer.finish(tuple(keys), key_row, state)
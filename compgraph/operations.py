@@ -1,22 +1,86 @@
+import functools
 import heapq
 import re
+import sys
 import typing as tp
 from abc import abstractmethod, ABC
 from copy import deepcopy
+from array import array
 from datetime import datetime
 from itertools import groupby, chain
-from math import radians, sin, cos, sqrt, asin
+
+from . import spill
+from . import timestamps
+from . import vectorized
 
 TRow = dict[str, tp.Any]
 TRowsIterable = tp.Iterable[TRow]
 TRowsGenerator = tp.Generator[TRow, None, None]
 
 
+class Ordering:
+    """
+    Known arrangement of rows of stream: rows are sorted by columns of order (lexicographically, the first column
+    is the most significant), rows with equal values of columns of grouping are adjacent.
+    Empty order and no grouping mean nothing is known.
+    """
+
+    def __init__(self, order: tp.Sequence[str] = (), grouping: tp.Collection[str] | None = None) -> None:
+        """
+        :param order: columns rows are sorted by
+        :param grouping: columns rows are grouped by (None if unknown)
+        """
+        self.order: tuple[str, ...] = tuple(order)
+        self.grouping: frozenset[str] | None = frozenset(grouping) if grouping is not None else None
+
+    @property
+    def known(self) -> bool:
+        return bool(self.order) or self.grouping is not None
+
+    def sorted_by(self, keys: tp.Sequence[str]) -> bool:
+        """Rows are sorted by keys, i.e. keys are prefix of order"""
+        return self.order[:len(keys)] == tuple(keys)
+
+    def grouped_by(self, keys: tp.Sequence[str]) -> bool:
+        """Rows with equal values of keys are adjacent (in any order of groups)"""
+        return not keys or frozenset(keys) == self.grouping or frozenset(self.order[:len(keys)]) == frozenset(keys)
+
+    def restricted(self, keeps: tp.Callable[[tp.Collection[str]], bool]) -> 'Ordering':
+        """Ordering after values of some columns may change
+        :param keeps: whether values of all columns passed stay the same
+        """
+        order = self.order
+        while order and not keeps(order):
+            order = order[:-1]
+        return Ordering(order, self.grouping if self.grouping is not None and keeps(self.grouping) else None)
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, Ordering) and (self.order, self.grouping) == (other.order, other.grouping)
+
+    def __repr__(self) -> str:
+        grouping = sorted(self.grouping) if self.grouping is not None else None
+        return f'Ordering(order={list(self.order)}, grouping={grouping})'
+
+
 class Operation(ABC):
     @abstractmethod
     def __call__(self, rows: TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:
         pass
 
+    def fuse(self, op: 'Operation') -> tp.Optional['Operation']:
+        """
+        :param op: operation reading output of this one
+        :return: single operation doing work of both in one pass, None if they can not be fused
+        """
+        return None
+
+    def ordering(self, *inputs: Ordering) -> Ordering:
+        """
+        :param inputs: orderings of inputs (none for reading operations)
+        :return: ordering of output, nothing is known by default
+        """
+        return Ordering()
+
 
 class Read(Operation):
     def __init__(self, filename: str, parser: tp.Callable[[str], TRow]) -> None:
@@ -44,6 +108,10 @@ class ReadIterFactory(Operation):
 class Mapper(ABC):
     """Base class for mappers"""
 
+    # Mapper may change rows it gets in place: Map copies rows shared with caller of run or with other branches
+    # ahead of such mapper; mappers which do not are marked by False
+    in_place: bool = True
+
     @abstractmethod
     def __call__(self, row: TRow) -> TRowsGenerator:
         """
@@ -51,14 +119,146 @@ class Mapper(ABC):
         """
         pass
 
+    def keeps(self, columns: tp.Collection[str]) -> bool:
+        """Whether resulting rows have the same values of columns as row they are made of,
+        so Map keeps order by them; unknown (False) by default
+        :param columns: names of columns
+        """
+        return False
+
+
+class RowMapper(Mapper):
+    """
+    Base class for mappers giving at most one row for row.
+    Map calls apply directly, so no generator is created per row (unless subclass overrides __call__).
+    """
+
+    @abstractmethod
+    def apply(self, row: TRow) -> TRow | None:
+        """
+        :param row: one table row
+        :return: resulting row, None to drop the row
+        """
+        pass
+
+    def __call__(self, row: TRow) -> TRowsGenerator:
+        result = self.apply(row)
+        if result is not None:
+            yield result
+
+
+class ChunkMapper(Mapper):
+    """
+    Base class for mappers giving at most one row for row which process chunk of rows at once,
+    e.g. to compute over arrays. Map passes rows to them in chunks of MAP_CHUNK_ROWS rows
+    (unless subclass overrides __call__).
+    """
+
+    @abstractmethod
+    def apply_chunk(self, rows: list[TRow]) -> list[TRow]:
+        """
+        :param rows: chunk of table rows
+        :return: resulting rows in the same order, some of them may be dropped
+        """
+        pass
+
+    def __call__(self, row: TRow) -> TRowsGenerator:
+        yield from self.apply_chunk([row])
+
+
+MAP_CHUNK_ROWS: int = 1024
+
+TApply = tp.Callable[[TRow], tp.Optional[TRow]]
+
+
+def _map_stage(rows: TRowsIterable, applies: tp.Sequence[TApply], mapper: Mapper | None) -> TRowsGenerator:
+    """Pass every row through applies of row mappers in turn, then through mapper if any"""
+    if len(applies) == 1 and mapper is None:
+        apply = applies[0]
+        for row in rows:
+            mapped = apply(row)
+            if mapped is not None:
+                yield mapped
+        return
+    if isinstance(mapper, ChunkMapper) and type(mapper).__call__ is ChunkMapper.__call__:
+        yield from _chunk_stage(rows, applies, mapper)
+        return
+    for row in rows:
+        for apply in applies:
+            result = apply(row)
+            if result is None:
+                break
+            row = result
+        else:
+            if mapper is None:
+                yield row
+            else:
+                yield from mapper(row)
+
+
+def _chunk_stage(rows: TRowsIterable, applies: tp.Sequence[TApply], mapper: ChunkMapper) -> TRowsGenerator:
+    chunk: list[TRow] = []
+    for row in rows:
+        for apply in applies:
+            result = apply(row)
+            if result is None:
+                break
+            row = result
+        else:
+            chunk.append(row)
+            if len(chunk) >= MAP_CHUNK_ROWS:
+                yield from mapper.apply_chunk(chunk)
+                chunk = []
+    if chunk:
+        yield from mapper.apply_chunk(chunk)
+
 
 class Map(Operation):
-    def __init__(self, mapper: Mapper) -> None:
+    """
+    Apply chain of mappers in one pass.
+    Chain is compiled into stages: row mappers run in a plain loop over apply, and every other mapper
+    closes a stage, so there is one generator per such mapper rather than one per mapper and row.
+    Chunk mappers get rows in chunks of MAP_CHUNK_ROWS.
+    """
+
+    def __init__(self, mapper: Mapper, *mappers: Mapper, shared_input: bool = False) -> None:
+        """
+        :param mapper: mapper to apply
+        :param mappers: mappers to apply to its output in the same pass
+        :param shared_input: input rows are shared with caller of run or with other branches, so they are
+            copied ahead of the first mapper changing rows in place
+        """
         self.mapper = mapper
+        self.mappers = [mapper, *mappers]
+        self.shared_input = shared_input
+        self._stages: list[tuple[list[TApply], Mapper | None]] = []
+        applies: list[TApply] = []
+        wrap = shared_input
+        for item in self.mappers:
+            if wrap and item.in_place:
+                applies.append(dict.copy)
+                wrap = False
+            # Subclass overriding __call__ does more than apply, so it is called as any other mapper
+            if isinstance(item, RowMapper) and type(item).__call__ is RowMapper.__call__:
+                applies.append(item.apply)
+            else:
+                self._stages.append((applies, item))
+                applies = []
+        if applies:
+            self._stages.append((applies, None))
+
+    def fuse(self, op: Operation) -> Operation | None:
+        if not isinstance(op, Map):
+            return None
+        return Map(*self.mappers, *op.mappers, shared_input=self.shared_input)
+
+    def ordering(self, *inputs: Ordering) -> Ordering:
+        return inputs[0].restricted(lambda columns: all(mapper.keeps(columns) for mapper in self.mappers))
 
     def __call__(self, rows: TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:
-        for row in rows:
-            yield from self.mapper(row)
+        for applies, mapper in self._stages:
+            rows = _map_stage(rows, applies, mapper)
+        yield from rows
 
 
 class Reducer(ABC):
@@ -77,17 +277,173 @@ class Reduce(Operation):
         self.reducer = reducer
         self.keys = keys
 
+    def ordering(self, *inputs: Ordering) -> Ordering:
+        # Groups go in order of input and rows of group carry its keys; order of input is trusted if unknown
+        if not inputs[0].known:
+            return Ordering()
+        order = inputs[0].order
+        while order and not set(order) <= set(self.keys):
+            order = order[:-1]
+        return Ordering(order, self.keys)
+
     def __call__(self, rows: TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:
         for _, group_rows in groupby(rows, key=lambda r: [r[k] for k in self.keys]):
             yield from self.reducer(tuple(self.keys), group_rows)
 
 
+class MergeableReducer(Reducer):
+    """
+    Base class for reducers which fold group into a state.
+    Rows may be folded in any order and states of parts of group may be merged, so such reducers
+    do not need sorted input (hash aggregation) and may pre-aggregate rows (combiners).
+    """
+
+    # State may grow with rows of group, so its size is estimated again after every update
+    growing: bool = False
+
+    def state_size(self, state: tp.Any) -> int:
+        """
+        :param state: state of group
+        :return: approximate number of bytes state takes
+        """
+        return sys.getsizeof(state)
+
+    @abstractmethod
+    def start(self, row: TRow) -> tp.Any:
+        """
+        :param row: first row of group
+        :return: state of group
+        """
+        pass
+
+    @abstractmethod
+    def update(self, state: tp.Any, row: TRow) -> tp.Any:
+        """
+        :param state: state of group
+        :param row: next row of group
+        :return: new state of group (may be the same object changed in place)
+        """
+        pass
+
+    @abstractmethod
+    def merge(self, state: tp.Any, other: tp.Any) -> tp.Any:
+        """
+        :param state: state of earlier rows of group
+        :param other: state of later rows of group
+        :return: state of all rows (may be the first object changed in place)
+        """
+        pass
+
+    @abstractmethod
+    def finish(self, group_key: tuple[str, ...], key_row: TRow, state: tp.Any) -> TRowsGenerator:
+        """
+        :param group_key: keys of grouping
+        :param key_row: values of group keys
+        :param state: state of group
+        """
+        pass
+
+    def __call__(self, group_key: tuple[str, ...], rows: TRowsIterable) -> TRowsGenerator:
+        rows = iter(rows)
+        first_row: TRow = next(rows)
+        state = self.start(first_row)
+        for row in rows:
+            state = self.update(state, row)
+        yield from self.finish(group_key, {key: first_row[key] for key in group_key}, state)
+
+
+PARTIAL_COLUMN: str = '__partial__'
+COMBINE_GROUPS: int = 100000
+
+
+class Combine(Operation):
+    """
+    Partial aggregation (combiner) with mergeable reducer ahead of shuffle.
+    Rows are pre-aggregated in hash table of bounded size, which is flushed when full.
+    Every partial row carries group keys and state of part of the group in PARTIAL_COLUMN,
+    partial rows are reduced with MergePartials.
+    """
+
+    def __init__(self, reducer: MergeableReducer, keys: tp.Sequence[str], max_groups: int = COMBINE_GROUPS) -> None:
+        """
+        :param reducer: reducer to pre-aggregate with
+        :param keys: keys for grouping
+        :param max_groups: number of groups hash table holds before flush
+        """
+        self.reducer = reducer
+        self.keys = keys
+        self.max_groups = max_groups
+
+    def __call__(self, rows: TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:
+        group_key = tuple(self.keys)
+        groups: dict[tuple[tp.Any, ...], list[tp.Any]] = {}
+        for row in rows:
+            key = tuple(row[k] for k in group_key)
+            group = groups.get(key)
+            if group is not None:
+                group[1] = self.reducer.update(group[1], row)
+                continue
+            if len(groups) >= self.max_groups:
+                yield from self._flush(groups)
+                groups = {}
+            groups[key] = [{k: row[k] for k in group_key}, self.reducer.start(row)]
+        yield from self._flush(groups)
+
+    @staticmethod
+    def _flush(groups: dict[tuple[tp.Any, ...], list[tp.Any]]) -> TRowsGenerator:
+        for key_row, state in groups.values():
+            key_row[PARTIAL_COLUMN] = state
+            yield key_row
+
+
+class MergePartials(MergeableReducer):
+    """Reduce partial rows made by Combine with the same reducer"""
+
+    def __init__(self, reducer: MergeableReducer) -> None:
+        """
+        :param reducer: reducer used by Combine
+        """
+        self.reducer = reducer
+        self.growing = reducer.growing
+
+    def state_size(self, state: tp.Any) -> int:
+        return self.reducer.state_size(state)
+
+    def start(self, row: TRow) -> tp.Any:
+        return row[PARTIAL_COLUMN]
+
+    def update(self, state: tp.Any, row: TRow) -> tp.Any:
+        return self.reducer.merge(state, row[PARTIAL_COLUMN])
+
+    def merge(self, state: tp.Any, other: tp.Any) -> tp.Any:
+        return self.reducer.merge(state, other)
+
+    def finish(self, group_key: tuple[str, ...], key_row: TRow, state: tp.Any) -> TRowsGenerator:
+        yield from self.reducer.finish(group_key, key_row, state)
+
+
 class Joiner(ABC):
-    """Base class for joiners"""
+    """
+    Base class for joiners.
+    Rows of one key are joined pairwise: the right group is buffered in memory and the left one streams through it.
+    Groups of skewed keys are joined in bounded memory: if the right group does not fit into memory_limit while
+    the left one does, the left group is buffered instead (pairs then go in order of the right group),
+    and if neither fits, the right group is spilled to disk and read once per block of left rows which fits
+    (pairs then go block by block in order of chunks of the right group).
+    """
 
-    def __init__(self, suffix_a: str = '_1', suffix_b: str = '_2') -> None:
+    def __init__(self, suffix_a: str = '_1', suffix_b: str = '_2', memory_limit: int = spill.DEFAULT_MEMORY_LIMIT,
+                 tmp_dir: str | None = None) -> None:
+        """
+        :param suffix_a: suffix of left table columns which are in both tables (except keys)
+        :param suffix_b: suffix of right table columns which are in both tables (except keys)
+        :param memory_limit: approximate number of bytes rows of one key kept in memory may take
+        :param tmp_dir: directory for spilled groups (system default if None)
+        """
         self._a_suffix = suffix_a
         self._b_suffix = suffix_b
+        self.memory_limit = memory_limit
+        self.tmp_dir = tmp_dir
 
     @abstractmethod
     def __call__(self, keys: tp.Sequence[str], rows_a: TRowsIterable,
@@ -100,25 +456,134 @@ class Joiner(ABC):
         pass
 
     def general_join(self, keys: tp.Sequence[str], rows_a: TRowsIterable, rows_b: TRowsIterable) -> TRowsGenerator:
-        checked: bool = False
-        rows_b_list: list[TRow] = list(rows_b)
-        common_keys: set[tp.Any] = set()
-        for row_a in rows_a:
-            for row_b in rows_b_list:
-                merged: TRow = {}
-                for key, value in chain(row_a.items(), row_b.items()):
-                    common_keys = set(row_a.keys()) & set(row_b.keys()) - set(keys) if not checked else common_keys
-                    checked = True
-
-                    if key in common_keys:
-                        if key in row_a.keys() and key + self._a_suffix not in merged.keys():
-                            merged[key + self._a_suffix] = value
-                        elif key in row_b.keys():
-                            merged[key + self._b_suffix] = value
-                    else:
-                        merged[key] = value
-
-                yield merged
+        output = join_output(tuple(keys), self._a_suffix, self._b_suffix)
+        # Either group may take half of memory limit, so both of them fit when the right one is too large
+        rows_a, rows_b = iter(rows_a), iter(rows_b)
+        buffer_b, b_fits = spill.read_bounded(rows_b, self.memory_limit // 2)
+        if b_fits:
+            yield from output.join(rows_a, buffer_b, left=True)
+            return
+
+        buffer_a, a_fits = spill.read_bounded(rows_a, self.memory_limit // 2)
+        if a_fits:
+            yield from output.join(chain(buffer_b, rows_b), buffer_a, left=False)
+            return
+
+        with spill.SpillFile[TRow](self.tmp_dir) as spilled_b:
+            spilled_b.write_all(chain(buffer_b, rows_b))
+            del buffer_b
+            block_a = buffer_a
+            while block_a:
+                for chunk_b in spilled_b.read_chunks():
+                    yield from output.join(block_a, chunk_b, left=True)
+                block_a, _ = spill.read_bounded(rows_a, self.memory_limit // 2)
+
+
+@functools.lru_cache(maxsize=1024)
+def join_layout(keys: tuple[str, ...], suffix_a: str, suffix_b: str, columns_a: tuple[str, ...],
+                columns_b: tuple[str, ...]) -> tuple[str, ...] | None:
+    """Names of columns of joined row: columns which are in both rows (except keys) get suffixes
+    :param keys: join keys
+    :param suffix_a: suffix of left row columns which are in both rows
+    :param suffix_b: suffix of right row columns which are in both rows
+    :param columns_a: columns of left row
+    :param columns_b: columns of right row
+    :return: names for columns of left row followed by columns of right row, the later of equal names wins;
+        None if no column is renamed, so joined row is right row laid over left one
+    """
+    common = set(columns_a) & set(columns_b) - set(keys)
+    if not common:
+        return None
+    names: list[str] = []
+    for column in columns_a:
+        if column not in common:
+            names.append(column)
+        elif column + suffix_a not in names:
+            names.append(column + suffix_a)
+        else:
+            names.append(column + suffix_b)
+    names.extend(column + suffix_b if column in common else column for column in columns_b)
+    return tuple(names)
+
+
+class JoinOutput:
+    """
+    Builder of joined rows.
+    Layout of joined row is worked out once per pair of row schemas (see join_layout). Rows of the buffered side
+    are renamed by it once per schema of streamed rows and every streamed row once, so every joined row is made
+    by one merge of two dicts.
+    """
+
+    def __init__(self, keys: tp.Sequence[str], suffix_a: str, suffix_b: str) -> None:
+        """
+        :param keys: join keys
+        :param suffix_a: suffix of left row columns which are in both rows
+        :param suffix_b: suffix of right row columns which are in both rows
+        """
+        self._keys = tuple(keys)
+        self._suffix_a = suffix_a
+        self._suffix_b = suffix_b
+
+    def layout(self, schema_a: tuple[str, ...], schema_b: tuple[str, ...]) -> tuple[str, ...] | None:
+        """Names of columns of joined row for columns of left and right rows (see join_layout)"""
+        return join_layout(self._keys, self._suffix_a, self._suffix_b, schema_a, schema_b)
+
+    def join(self, rows: TRowsIterable, others: list[TRow], left: bool) -> TRowsGenerator:
+        """Join every one of rows of one table with every one of rows of the other one
+        :param rows: rows to join
+        :param others: rows of the other table
+        :param left: rows are of the left table
+        """
+        schemas = [tuple(other) for other in others]
+        last_schema: tuple[str, ...] | None = None
+        names: list[tuple[str, ...] | None] = []
+        prepared: list[tuple[int, TRow]] = []
+        for row in rows:
+            schema = tuple(row)
+            if schema != last_schema:
+                last_schema = schema
+                names, prepared = self._prepare(schema, others, schemas, left)
+            # Row is renamed once for every distinct layout, then every joined row is one merge of two dicts
+            renamed = [row if row_names is None else dict(zip(row_names, row.values())) for row_names in names]
+            if left:
+                for index, other in prepared:
+                    yield {**renamed[index], **other}
+            else:
+                for index, other in prepared:
+                    yield {**other, **renamed[index]}
+
+    def _prepare(self, schema: tuple[str, ...], others: list[TRow], schemas: list[tuple[str, ...]],
+                 left: bool) -> tuple[list[tuple[str, ...] | None], list[tuple[int, TRow]]]:
+        """Rows of the other table renamed for joining with rows of schema
+        :return: distinct names for columns of rows of schema (None if they are not renamed) and every one
+            of others renamed, with index of names rows of schema get for joining with it
+        """
+        names: list[tuple[str, ...] | None] = []
+        indices: dict[tuple[str, ...] | None, int] = {}
+        layouts: dict[tuple[str, ...], tuple[int, tuple[str, ...] | None]] = {}
+        prepared: list[tuple[int, TRow]] = []
+        for other, other_schema in zip(others, schemas):
+            if other_schema not in layouts:
+                layout = self.layout(schema, other_schema) if left else self.layout(other_schema, schema)
+                row_names = other_names = None
+                if layout is not None:
+                    row_names = layout[:len(schema)] if left else layout[len(other_schema):]
+                    other_names = layout[len(schema):] if left else layout[:len(other_schema)]
+                row_names = None if row_names == schema else row_names
+                other_names = None if other_names == other_schema else other_names
+                if row_names not in indices:
+                    indices[row_names] = len(names)
+                    names.append(row_names)
+                layouts[other_schema] = (indices[row_names], other_names)
+            index, other_names = layouts[other_schema]
+            prepared.append((index, other if other_names is None else dict(zip(other_names, other.values()))))
+        return names, prepared
+
+
+@functools.lru_cache(maxsize=64)
+def join_output(keys: tuple[str, ...], suffix_a: str, suffix_b: str) -> JoinOutput:
+    """Builder of joined rows shared by all groups joined with the same keys and suffixes"""
+    return JoinOutput(keys, suffix_a, suffix_b)
 
 
 class Join(Operation):
@@ -126,6 +591,11 @@ class Join(Operation):
         self.keys = keys
         self.joiner = joiner
 
+    def ordering(self, *inputs: Ordering) -> Ordering:
+        if not self.keys:
+            return Ordering()
+        return Ordering(self.keys, self.keys)
+
     def __call__(self, rows: TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> TRowsGenerator:
         rows_a = rows
         rows_b = args[0]
@@ -161,23 +631,51 @@ class Join(Operation):
             key_b, value_b = next(group_b, _none)
 
 
-class DummyMapper(Mapper):
+class DummyMapper(RowMapper):
     """Yield exactly the row passed"""
 
-    def __call__(self, row: TRow) -> TRowsGenerator:
-        yield row
+    in_place = False
+
+    def keeps(self, columns: tp.Collection[str]) -> bool:
+        return True
 
+    def apply(self, row: TRow) -> TRow | None:
+        return row
 
-class FirstReducer(Reducer):
+
+class FirstReducer(MergeableReducer):
     """Yield only first row from passed ones"""
 
+    def state_size(self, state: TRow) -> int:
+        return spill.estimate_size(state)
+
+    def start(self, row: TRow) -> TRow:
+        return row
+
+    def update(self, state: TRow, row: TRow) -> TRow:
+        return state
+
+    def merge(self, state: TRow, other: TRow) -> TRow:
+        return state
+
+    def finish(self, group_key: tuple[str, ...], key_row: TRow, state: TRow) -> TRowsGenerator:
+        yield state
+
     def __call__(self, group_key: tuple[str, ...], rows: TRowsIterable) -> TRowsGenerator:
         for row in rows:
             yield row
             break
 
 
-class FilterPunctuation(Mapper):
+_PUNCTUATION: re.Pattern[str] = re.compile(r'([^\w\s]|_)+')
+# The same punctuation for ASCII text as str.translate table
+_ASCII_PUNCTUATION: dict[int, None] = {code: None for code in range(128) if _PUNCTUATION.fullmatch(chr(code))}
+_WHITESPACE: str = r'\s+'
+# Immutable values rows may share
+_ATOMS: frozenset[type] = frozenset({str, int, float, bool, bytes, type(None)})
+
+
+class FilterPunctuation(RowMapper):
     """Left only non-punctuation symbols"""
 
     def __init__(self, column: str):
@@ -186,12 +684,15 @@ class FilterPunctuation(Mapper):
         """
         self.column = column
 
-    def __call__(self, row: TRow) -> TRowsGenerator:
-        row[self.column] = re.sub(r'([^\w\s]|_)+', '', row[self.column])
-        yield row
+    def keeps(self, columns: tp.Collection[str]) -> bool:
+        return self.column not in columns
+
+    def apply(self, row: TRow) -> TRow | None:
+        row[self.column] = _PUNCTUATION.sub('', row[self.column])
+        return row
 
 
-class LowerCase(Mapper):
+class LowerCase(RowMapper):
     """Replace column value with value in lower case"""
 
     def __init__(self, column: str):
@@ -204,14 +705,19 @@ class LowerCase(Mapper):
     def _lower_case(txt: str) -> str:
         return txt.lower()
 
-    def __call__(self, row: TRow) -> TRowsGenerator:
+    def keeps(self, columns: tp.Collection[str]) -> bool:
+        return self.column not in columns
+
+    def apply(self, row: TRow) -> TRow | None:
         row[self.column] = self._lower_case(row[self.column])
-        yield row
+        return row
 
 
 class Split(Mapper):
     """Split row on multiple rows by separator"""
 
+    in_place = False
+
     def __init__(self, column: str, separator: str = r'\s+') -> None:
         """
         :param column: name of column to split
@@ -219,22 +725,86 @@ class Split(Mapper):
         """
         self.column = column
         self.separator = separator
+        self._pattern = re.compile(separator)
+
+    def keeps(self, columns: tp.Collection[str]) -> bool:
+        return self.column not in columns
 
     def __call__(self, row: TRow) -> TRowsGenerator:
+        # Shallow copy of plain dict is made in C; nested values are copied too, so rows do not share them
+        copy_row = deepcopy if any(type(value) not in _ATOMS for value in row.values()) else dict.copy
         idx_start: int = 0
-        for ptr in re.finditer(self.separator, row[self.column]):
-            yield self._cut(row, idx_start, ptr.start())
+        for ptr in self._pattern.finditer(row[self.column]):
+            yield self._cut(row, copy_row, idx_start, ptr.start())
             idx_start = ptr.end()
 
-        yield self._cut(row, idx_start)
+        yield self._cut(row, copy_row, idx_start)
 
-    def _cut(self, row: TRow, start: int, end: int | None = None) -> TRow:
-        result: TRow = deepcopy(row)
+    def _cut(self, row: TRow, copy_row: tp.Callable[[TRow], TRow],
+             start: int, end: int | None = None) -> TRow:
+        result = copy_row(row)
         result[self.column] = row[self.column][start:] if end is None else row[self.column][start:end]
         return result
 
 
-class Product(Mapper):
+class Tokenize(Mapper):
+    """
+    Split text on lower case words without punctuation in one pass:
+    does the same as FilterPunctuation, LowerCase and Split one after another
+    """
+
+    in_place = False
+
+    def __init__(self, column: str, separator: str = _WHITESPACE,
+                 passthrough: tp.Sequence[str] | None = None) -> None:
+        """
+        :param column: name of column to split
+        :param separator: regular expression to separate by
+        :param passthrough: columns to keep in resulting rows besides column (all columns if None)
+        """
+        self.column = column
+        self.separator = separator
+        self.passthrough = passthrough
+        self._pattern = re.compile(separator)
+
+    def keeps(self, columns: tp.Collection[str]) -> bool:
+        return self.column not in columns and (self.passthrough is None or set(columns) <= set(self.passthrough))
+
+    def _clean(self, text: str) -> str:
+        if text.isascii():
+            return text.translate(_ASCII_PUNCTUATION).lower()
+        return _PUNCTUATION.sub('', text).lower()
+
+    def _tokens(self, text: str) -> list[str]:
+        if self.separator != _WHITESPACE:
+            starts: list[int] = [0]
+            ends: list[int] = []
+            for match in self._pattern.finditer(text):
+                ends.append(match.start())
+                starts.append(match.end())
+            ends.append(len(text))
+            return [text[start:end] for start, end in zip(starts, ends)]
+        tokens = text.split()
+        # Separators at the ends give empty tokens, as they do for re.split
+        if not text or text[0].isspace():
+            tokens.insert(0, '')
+        if text and text[-1].isspace():
+            tokens.append('')
+        return tokens
+
+    def __call__(self, row: TRow) -> TRowsGenerator:
+        tokens = self._tokens(self._clean(row[self.column]))
+        if self.passthrough is None:
+            template = row
+        else:
+            template = {column: row[column] for column in self.passthrough}
+        for token in tokens:
+            result = template.copy()
+            result[self.column] = token
+            yield result
+
+
+class Product(RowMapper):
     """Calculates product of multiple columns"""
 
     def __init__(self, columns: tp.Sequence[str], result_column: str = 'product') -> None:
@@ -245,72 +815,128 @@ class Product(Mapper):
         self.columns = columns
         self.result_column = result_column
 
-    def __call__(self, row: TRow) -> TRowsGenerator:
+    def keeps(self, columns: tp.Collection[str]) -> bool:
+        return self.result_column not in columns
+
+    def apply(self, row: TRow) -> TRow | None:
         calc_res: float = 1
         for column in self.columns:
             calc_res *= row[column]
         row[self.result_column] = calc_res
-        yield row
+        return row
 
 
-class Filter(Mapper):
+class Filter(RowMapper):
     """Remove records that don't satisfy some condition"""
 
+    in_place = False
+
     def __init__(self, condition: tp.Callable[[TRow], bool]) -> None:
         """
         :param condition: if condition is not true - remove record
         """
         self.condition = condition
 
-    def __call__(self, row: TRow) -> TRowsGenerator:
-        if self.condition(row):
-            yield row
+    def keeps(self, columns: tp.Collection[str]) -> bool:
+        return True
 
+    def apply(self, row: TRow) -> TRow | None:
+        return row if self.condition(row) else None
 
-class Project(Mapper):
+
+class Project(RowMapper):
     """Leave only mentioned columns"""
 
+    in_place = False
+
     def __init__(self, columns: tp.Sequence[str]) -> None:
         """
         :param columns: names of columns
         """
         self.columns = columns
 
-    def __call__(self, row: TRow) -> TRowsGenerator:
-        yield {column: row[column] for column in self.columns}
+    def keeps(self, columns: tp.Collection[str]) -> bool:
+        return set(columns) <= set(self.columns)
+
+    def apply(self, row: TRow) -> TRow | None:
+        return {column: row[column] for column in self.columns}
 
 
-class Calculate(Mapper):
+class Calculate(RowMapper):
     """Calculate some operation for row"""
 
     def __init__(self, operation: tp.Callable[[TRow], tp.Any], result: str) -> None:
         self.operation = operation
         self.result = result
 
-    def __call__(self, row: TRow) -> TRowsGenerator:
+    def keeps(self, columns: tp.Collection[str]) -> bool:
+        return self.result not in columns
+
+    def apply(self, row: TRow) -> TRow | None:
         row[self.result] = self.operation(row)
-        yield row
+        return row
 
 
-class CalculateTime(Mapper):
+class ParseTimestamps(RowMapper):
+    """Replace timestamps given as strings with seconds since 1970-01-01 (float), so they are parsed once"""
+
+    def __init__(self, columns: tp.Sequence[str], dt_format: str) -> None:
+        """
+        :param columns: names of timestamp columns
+        :param dt_format: format of timestamps in strptime notation
+        """
+        self.columns = columns
+        self.dt_format = dt_format
+        self._parse = timestamps.compile_parser(dt_format)
+
+    def keeps(self, columns: tp.Collection[str]) -> bool:
+        return not set(columns) & set(self.columns)
+
+    def apply(self, row: TRow) -> TRow | None:
+        for column in self.columns:
+            row[column] = timestamps.to_epoch(self._parse(row[column]))
+        return row
+
+
+class CalculateTime(RowMapper):
     """Calculate time by week, hour for enter/leave time"""
 
     def __init__(self, enter_time: str, dt_format: str, weekday_result: str, hour_result: str) -> None:
+        """
+        :param enter_time: name of timestamp column: string in dt_format or seconds since 1970-01-01
+            (see ParseTimestamps)
+        :param dt_format: format of timestamps in strptime notation
+        :param weekday_result: column name to save weekday in
+        :param hour_result: column name to save hour in
+        """
         self.enter_time = enter_time
         self.dt_format = dt_format
         self.weekday_result = weekday_result
         self.hour_result = hour_result
         self.weekdays: list[str] = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+        self._parse = timestamps.compile_parser(dt_format)
 
-    def __call__(self, row: TRow) -> TRowsGenerator:
-        dt: datetime = datetime.strptime(row[self.enter_time], self.dt_format)
-        row[self.weekday_result] = self.weekdays[dt.weekday()]
-        row[self.hour_result] = dt.hour
-        yield row
+    def keeps(self, columns: tp.Collection[str]) -> bool:
+        return not {self.weekday_result, self.hour_result} & set(columns)
 
+    def apply(self, row: TRow) -> TRow | None:
+        value = row[self.enter_time]
+        if isinstance(value, str):
+            dt: datetime = self._parse(value)
+            row[self.weekday_result] = self.weekdays[dt.weekday()]
+            row[self.hour_result] = dt.hour
+        else:
+            row[self.weekday_result] = self.weekdays[timestamps.weekday(value)]
+            row[self.hour_result] = timestamps.hour(value)
+        return row
 
-class CalculateLength(Mapper):
-    """Calculate length of route with using haversine distance"""
+
+class CalculateLength(ChunkMapper):
+    """
+    Calculate length of route with using haversine distance.
+    Coordinates of chunk of rows are collected into arrays and distances are computed at once
+    (vectorized with NumPy if it is installed).
+    """
 
     def __init__(self, start_point: str, end_point: str, result_column: str) -> None:
         self.start_point = start_point
@@ -318,52 +944,66 @@ class CalculateLength(Mapper):
         self.result_column = result_column
         self._r: int = 6373
 
-    def __call__(self, row: TRow) -> TRowsGenerator:
-        if self.result_column not in row:
-            row[self.result_column] = self._calc_len(map(radians,
-                                                         row[self.start_point] + row[self.end_point]))
-            yield row
-        else:
-            yield row
-
-    def _calc_len(self, args: tp.Iterable[float]) -> float:
-        lon_start, lat_start, lon_end, lat_end = args
-        return 2 * self._r * \
-            asin(
-                sqrt(
-                    sin((lat_end - lat_start) / 2) ** 2 +
-                    cos(lat_start) * cos(lat_end) * sin((lon_end - lon_start) / 2) ** 2))
-
-
-class CalculateSpeed(Reducer):
+    def keeps(self, columns: tp.Collection[str]) -> bool:
+        return self.result_column not in columns
+
+    def apply_chunk(self, rows: list[TRow]) -> list[TRow]:
+        result_column = self.result_column
+        pending = [row for row in rows if result_column not in row]
+        if not pending:
+            return rows
+        starts = [row[self.start_point] for row in pending]
+        ends = [row[self.end_point] for row in pending]
+        lengths = vectorized.haversine(array('d', [start[0] for start in starts]),
+                                       array('d', [start[1] for start in starts]),
+                                       array('d', [end[0] for end in ends]),
+                                       array('d', [end[1] for end in ends]), self._r)
+        for row, length in zip(pending, lengths):
+            row[result_column] = length
+        return rows
+
+
+class CalculateSpeed(MergeableReducer):
     """Calculate average speed for route"""
 
     def __init__(self, length_column: str, enter_column: str, leave_column: str, dt_format: str,
                  result_column: str) -> None:
+        """
+        :param length_column: name of length column
+        :param enter_column: name of enter timestamp column: string in dt_format or seconds since 1970-01-01
+            (see ParseTimestamps)
+        :param leave_column: name of leave timestamp column, the same type as enter_column
+        :param dt_format: format of timestamps in strptime notation
+        :param result_column: column name to save speed in
+        """
         self.length_column = length_column
         self.enter_column = enter_column
         self.leave_column = leave_column
         self.dt_format = dt_format
         self.result_column = result_column
-        self.length_total: float = 0.0
-        self.time_total: float = 0.0
-
-    def __call__(self, group_key: tp.Tuple[str, ...], rows: TRowsIterable) -> TRowsGenerator:
-        first_row: TRow = next(iter(rows))
-        group_dict: TRow = {key: first_row[key] for key in group_key}
-        self.length_total = 0.0
-        self.time_total = 0.0
-        self._calc_speed(first_row)
-        for row in rows:
-            self._calc_speed(row)
-        group_dict[self.result_column] = self.length_total / self.time_total
-        yield group_dict
+        self._parse = timestamps.compile_parser(dt_format)
 
-    def _calc_speed(self, row: TRow) -> None:
-        td = datetime.strptime(row[self.leave_column], self.dt_format) - \
-             datetime.strptime(row[self.enter_column], self.dt_format)
-        self.time_total += (td.seconds + td.microseconds * 10 ** (-6)) / 3600
-        self.length_total += row[self.length_column]
+    def start(self, row: TRow) -> tuple[float, float]:
+        return row[self.length_column], self._calc_time(row)
+
+    def update(self, state: tuple[float, float], row: TRow) -> tuple[float, float]:
+        return state[0] + row[self.length_column], state[1] + self._calc_time(row)
+
+    def merge(self, state: tuple[float, float], other: tuple[float, float]) -> tuple[float, float]:
+        return state[0] + other[0], state[1] + other[1]
+
+    def finish(self, group_key: tuple[str, ...], key_row: TRow, state: tuple[float, float]) -> TRowsGenerator:
+        length_total, time_total = state
+        key_row[self.result_column] = length_total / time_total
+        yield key_row
+
+    def _calc_time(self, row: TRow) -> float:
+        enter, leave = row[self.enter_column], row[self.leave_column]
+        if isinstance(enter, str):
+            td = self._parse(leave) - self._parse(enter)
+        else:
+            td = timestamps.duration(enter, leave)
+        return (td.seconds + td.microseconds * 10 ** (-6)) / 3600
 
 
 class TopN(Reducer):
@@ -381,16 +1021,11 @@ class TopN(Reducer):
         yield from heapq.nlargest(self.n, rows, key=lambda r: r[self.column_max])
 
 
-def _calc_stats(row: TRow, key: str | None, word_stats: dict[str, int | float], step: int | float = 1) -> tp.Any:
-    default_column: str = "ROWS_COUNT"
-    item: tp.Any = row[key] if isinstance(key, str) else default_column
-    word_stats[item] = word_stats.get(item, 0) + step
-    return item
-
-
-class TermFrequency(Reducer):
+class TermFrequency(MergeableReducer):
     """Calculate frequency of values in column"""
 
+    growing = True
+
     def __init__(self, words_column: str, result_column: str = 'tf') -> None:
         """
         :param words_column: name for column with words
@@ -399,23 +1034,38 @@ class TermFrequency(Reducer):
         self.words_column = words_column
         self.result_column = result_column
 
-    def __call__(self, group_key: tuple[str, ...], rows: TRowsIterable) -> TRowsGenerator:
-        word_stats: dict[str, int | float] = {}
-        first_row: TRow = next(iter(rows))
-        _calc_stats(first_row, self.words_column, word_stats)
-        total_words: int = 1
-
-        group_dict: TRow = {key: first_row[key] for key in group_key}
-
-        for row in rows:
-            total_words += 1
-            _calc_stats(row, self.words_column, word_stats)
-
+    def state_size(self, state: tuple[dict[tp.Any, int], int]) -> int:
+        word_stats, _ = state
+        # Words are alike, one of them stands for all
+        word_size = sys.getsizeof(next(iter(word_stats))) + sys.getsizeof(1) if word_stats else 0
+        return sys.getsizeof(state) + sys.getsizeof(word_stats) + len(word_stats) * word_size
+
+    def start(self, row: TRow) -> tuple[dict[tp.Any, int], int]:
+        return {row[self.words_column]: 1}, 1
+
+    def update(self, state: tuple[dict[tp.Any, int], int], row: TRow) -> tuple[dict[tp.Any, int], int]:
+        word_stats, total_words = state
+        word = row[self.words_column]
+        word_stats[word] = word_stats.get(word, 0) + 1
+        return word_stats, total_words + 1
+
+    def merge(self, state: tuple[dict[tp.Any, int], int],
+              other: tuple[dict[tp.Any, int], int]) -> tuple[dict[tp.Any, int], int]:
+        word_stats, total_words = state
+        for word, count in other[0].items():
+            word_stats[word] = word_stats.get(word, 0) + count
+        return word_stats, total_words + other[1]
+
+    def finish(self, group_key: tuple[str, ...], key_row: TRow,
+               state: tuple[dict[tp.Any, int], int]) -> TRowsGenerator:
+        word_stats, total_words = state
         for word, value in word_stats.items():
-            yield {self.words_column: word, self.result_column: (value / total_words)} | group_dict
+            result: TRow = {self.words_column: word, self.result_column: (value / total_words)}
+            result.update(key_row)
+            yield result
 
 
-class Count(Reducer):
+class Count(MergeableReducer):
     """
     Count records by key
     Example for group_key=('a',) and column='d'
@@ -431,23 +1081,21 @@ class Count(Reducer):
         """
         self.column = column
 
-    def __call__(self, group_key: tuple[str, ...], rows: TRowsIterable) -> TRowsGenerator:
-        key: str | None = group_key[0] if len(group_key) > 0 else None
+    def start(self, row: TRow) -> int:
+        return 1
 
-        word_stats: dict[str, int | float] = {}
-        first_row: TRow = next(iter(rows))
-        _calc_stats(first_row, key, word_stats)
+    def update(self, state: int, row: TRow) -> int:
+        return state + 1
 
-        group_dict: TRow = {key: first_row[key] for key in group_key}
-        for row in rows:
-            _calc_stats(row, key, word_stats)
+    def merge(self, state: int, other: int) -> int:
+        return state + other
 
-        for _, value in word_stats.items():
-            group_dict[self.column] = value
-            yield group_dict
+    def finish(self, group_key: tuple[str, ...], key_row: TRow, state: int) -> TRowsGenerator:
+        key_row[self.column] = state
+        yield key_row
 
 
-class Sum(Reducer):
+class Sum(MergeableReducer):
     """
     Sum values aggregated by key
     Example for key=('a',) and column='b'
@@ -463,21 +1111,18 @@ class Sum(Reducer):
         """
         self.column = column
 
-    def __call__(self, group_key: tuple[str, ...], rows: TRowsIterable) -> TRowsGenerator:
-        key: str | None = group_key[0] if len(group_key) > 0 else None
-
-        word_stats: dict[str, int | float] = {}
-        first_row: TRow = next(iter(rows))
-        _calc_stats(first_row, key, word_stats, first_row[self.column])
+    def start(self, row: TRow) -> tp.Any:
+        return row[self.column]
 
-        group_dict: TRow = {key: first_row[key] for key in group_key}
+    def update(self, state: tp.Any, row: TRow) -> tp.Any:
+        return state + row[self.column]
 
-        for row in rows:
-            _calc_stats(row, key, word_stats, row[self.column])
+    def merge(self, state: tp.Any, other: tp.Any) -> tp.Any:
+        return state + other
 
-        for _, value in word_stats.items():
-            group_dict[self.column] = value
-            yield group_dict
+    def finish(self, group_key: tuple[str, ...], key_row: TRow, state: tp.Any) -> TRowsGenerator:
+        key_row[self.column] = state
+        yield key_row
 
 
 class InnerJoiner(Joiner):
@@ -491,13 +1136,17 @@ class OuterJoiner(Joiner):
     """Join with outer strategy"""
 
     def __call__(self, keys: tp.Sequence[str], rows_a: TRowsIterable, rows_b: TRowsIterable) -> TRowsGenerator:
-        list_b = list(rows_b)
-        if isinstance(rows_a, list):
-            yield from list_b
-        elif not list_b:
-            yield from rows_a
+        rows_a, rows_b = iter(rows_a), iter(rows_b)
+        first_a, first_b = next(rows_a, None), next(rows_b, None)
+        if first_b is None:
+            if first_a is not None:
+                yield first_a
+                yield from rows_a
+        elif first_a is None:
+            yield first_b
+            yield from rows_b
         else:
-            yield from self.general_join(keys, rows_a, list_b)
+            yield from self.general_join(keys, chain([first_a], rows_a), chain([first_b], rows_b))
 
 
 class LeftJoiner(Joiner):
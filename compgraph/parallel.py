@@ -0,0 +1,287 @@
+import heapq
+import multiprocessing
+import queue
+import typing as tp
+from collections import deque
+from multiprocessing import connection
+from operator import itemgetter
+
+from . import external_sort
+from . import hash_reduce
+from . import operations as ops
+from . import readers
+from . import spill
+from . import transport
+
+CHUNK_ROWS: int = 1024
+
+# Mappers of worker process, set by pool initializer. Workers are forked, so mappers are inherited
+# rather than pickled and may hold lambdas.
+_worker_mappers: list[ops.Mapper] = []
+
+
+def apply_mappers(mappers: tp.Sequence[ops.Mapper], rows: ops.TRowsIterable) -> ops.TRowsIterable:
+    """Chain mappers over rows in one pass"""
+    return ops.Map(*mappers)(rows)
+
+
+def chunks(rows: ops.TRowsIterable, chunk_rows: int) -> tp.Generator[list[ops.TRow], None, None]:
+    """Split rows into lists of chunk_rows rows"""
+    chunk: list[ops.TRow] = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_rows:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _init_worker(mappers: list[ops.Mapper]) -> None:
+    global _worker_mappers
+    _worker_mappers = mappers
+
+
+def _map_chunk(rows: list[ops.TRow]) -> list[ops.TRow]:
+    return list(apply_mappers(_worker_mappers, rows))
+
+
+class ParallelMap(ops.Operation):
+    """
+    Map rows in pool of worker processes.
+    Rows are sent to workers in chunks, every chunk goes through the whole chain of mappers in one task,
+    so row is pickled once per direction however many mappers there are.
+    Number of chunks in flight is bounded, so input is not materialized.
+    """
+
+    def __init__(self, mappers: tp.Sequence[ops.Mapper], workers: int, ordered: bool = True,
+                 chunk_rows: int = CHUNK_ROWS) -> None:
+        """
+        :param mappers: chain of mappers to apply
+        :param workers: number of worker processes
+        :param ordered: keep order of input rows; unordered output yields chunks as soon as they are ready
+        :param chunk_rows: number of rows in one task
+        """
+        self.mappers = list(mappers)
+        self.workers = workers
+        self.ordered = ordered
+        self.chunk_rows = chunk_rows
+
+    def fuse(self, op: ops.Operation) -> ops.Operation | None:
+        if not isinstance(op, ParallelMap) or \
+                (op.workers, op.ordered, op.chunk_rows) != (self.workers, self.ordered, self.chunk_rows):
+            return None
+        return ParallelMap(self.mappers + op.mappers, self.workers, self.ordered, self.chunk_rows)
+
+    def ordering(self, *inputs: ops.Ordering) -> ops.Ordering:
+        if not self.ordered:
+            return ops.Ordering()
+        return ops.Map(*self.mappers).ordering(*inputs)
+
+    def __call__(self, rows: ops.TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> ops.TRowsGenerator:
+        context = multiprocessing.get_context('fork')
+        pool = context.Pool(self.workers, initializer=_init_worker, initargs=(self.mappers,))
+        try:
+            if self.ordered:
+                yield from self._ordered(pool, rows)
+            else:
+                yield from self._unordered(pool, rows)
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def _ordered(self, pool: tp.Any, rows: ops.TRowsIterable) -> ops.TRowsGenerator:
+        pending: deque[tp.Any] = deque()
+        for chunk in chunks(rows, self.chunk_rows):
+            pending.append(pool.apply_async(_map_chunk, (chunk,)))
+            if len(pending) >= 2 * self.workers:
+                yield from pending.popleft().get()
+        while pending:
+            yield from pending.popleft().get()
+
+    def _unordered(self, pool: tp.Any, rows: ops.TRowsIterable) -> ops.TRowsGenerator:
+        done: queue.SimpleQueue[tp.Any] = queue.SimpleQueue()
+        in_flight: int = 0
+
+        def take() -> list[ops.TRow]:
+            result = done.get()
+            if isinstance(result, BaseException):
+                raise result
+            return result
+
+        for chunk in chunks(rows, self.chunk_rows):
+            pool.apply_async(_map_chunk, (chunk,), callback=done.put, error_callback=done.put)
+            in_flight += 1
+            if in_flight >= 2 * self.workers:
+                in_flight -= 1
+                yield from take()
+        for _ in range(in_flight):
+            yield from take()
+
+
+def _reduce_partition(endpoint: connection.Connection, reducer: ops.Reducer, keys: tp.Sequence[str], mode: str,
+                      ordered: bool, memory_limit: int, tmp_dir: str | None) -> None:
+    rows = transport.recv_rows(endpoint)
+    result: ops.TRowsIterable
+    if mode == 'sort':
+        result = ops.Reduce(reducer, keys)(external_sort.sort_rows(rows, keys, memory_limit, tmp_dir))
+    else:
+        assert isinstance(reducer, ops.MergeableReducer)
+        result = hash_reduce.HashReduce(reducer, keys, memory_limit, tmp_dir)(rows)
+        if ordered:
+            result = external_sort.sort_rows(result, keys, memory_limit, tmp_dir)
+    transport.send_rows(endpoint, result)
+
+
+class PartitionedReduce(ops.Operation):
+    """
+    Reduce in worker processes: rows are hash-partitioned on keys between workers (shuffle),
+    every worker sorts (mode 'sort') or hash-aggregates (mode 'hash') its partition and reduces it.
+    Input does not need to be sorted. Outputs of workers are merged either as they come or in order of keys.
+    """
+
+    def __init__(self, reducer: ops.Reducer, keys: tp.Sequence[str], workers: int, mode: str = 'sort',
+                 ordered: bool = False, memory_limit: int = spill.DEFAULT_MEMORY_LIMIT,
+                 tmp_dir: str | None = None, batch_rows: int = transport.BATCH_ROWS) -> None:
+        """
+        :param reducer: reducer to use (ops.MergeableReducer for mode 'hash')
+        :param keys: keys for grouping
+        :param workers: number of worker processes
+        :param mode: 'sort' or 'hash', how workers group their partitions
+        :param ordered: merge outputs of workers in order of keys
+        :param memory_limit: approximate number of bytes every worker keeps in memory
+        :param tmp_dir: directory for temporary files of workers (system default if None)
+        :param batch_rows: number of rows sent to worker in one pickled frame
+        """
+        self.reducer = reducer
+        self.keys = keys
+        self.workers = workers
+        self.mode = mode
+        self.ordered = ordered
+        self.memory_limit = memory_limit
+        self.tmp_dir = tmp_dir
+        self.batch_rows = batch_rows
+
+    def ordering(self, *inputs: ops.Ordering) -> ops.Ordering:
+        # Unordered output interleaves batches of workers, so rows of group may be apart
+        if not self.ordered:
+            return ops.Ordering()
+        return ops.Ordering(self.keys, self.keys)
+
+    def __call__(self, rows: ops.TRowsIterable, *args: tp.Any, **kwargs: tp.Any) -> ops.TRowsGenerator:
+        context = multiprocessing.get_context('fork')
+        endpoints: list[connection.Connection] = []
+        processes = []
+        for _ in range(self.workers):
+            local_endpoint, remote_endpoint = context.Pipe()
+            process = context.Process(target=_reduce_partition,
+                                      args=(remote_endpoint, self.reducer, self.keys, self.mode, self.ordered,
+                                            self.memory_limit, self.tmp_dir))
+            process.start()
+            # Worker holds the only remote end, so its crash shows up as EOFError rather than hang
+            remote_endpoint.close()
+            endpoints.append(local_endpoint)
+            processes.append(process)
+        try:
+            self._shuffle(rows, endpoints)
+            if self.ordered:
+                yield from heapq.merge(*(transport.recv_rows(endpoint) for endpoint in endpoints),
+                                       key=itemgetter(*self.keys))
+            else:
+                yield from transport.recv_rows_unordered(endpoints)
+            for process in processes:
+                process.join()
+        finally:
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+
+    def _shuffle(self, rows: ops.TRowsIterable, endpoints: list[connection.Connection]) -> None:
+        batches: list[list[ops.TRow]] = [[] for _ in endpoints]
+        for row in rows:
+            index = hash(tuple(row[key] for key in self.keys)) % len(endpoints)
+            batches[index].append(row)
+            if len(batches[index]) >= self.batch_rows:
+                transport.send_batch(endpoints[index], batches[index])
+                batches[index] = []
+        for endpoint, batch in zip(endpoints, batches):
+            if batch:
+                transport.send_batch(endpoint, batch)
+            transport.send_end(endpoint)
+
+
+TLineParser = tp.Callable[[bytes], ops.TRow]
+
+
+def _read_range(endpoint: connection.Connection, filename: str, start: int, end: int, parser: TLineParser,
+                mappers: list[ops.Mapper], block_size: int, batch_rows: int, keep_ends: bool) -> None:
+    with open(filename, 'rb') as file:
+        file.seek(start)
+        rows: ops.TRowsIterable = (parser(line) for lines in readers.read_lines(file, block_size, end, keep_ends)
+                                   for line in lines)
+        if mappers:
+            rows = ops.Map(*mappers)(rows)
+        transport.send_rows(endpoint, rows, batch_rows)
+
+
+class ParallelRead(ops.Operation):
+    """
+    Read file of lines in worker processes: file is split into byte ranges aligned to line boundaries,
+    every worker reads and parses its own range. Rows of ranges come interleaved, order of lines is not kept.
+    Parallel maps reading output of this operation are fused into it, so their mappers run in reading workers
+    and rows are pickled once.
+    """
+
+    def __init__(self, filename: str, parser: TLineParser, workers: int, mappers: tp.Sequence[ops.Mapper] = (),
+                 block_size: int = readers.BLOCK_SIZE, batch_rows: int = transport.BATCH_ROWS,
+                 append_only: bool = False, start: int = 0, end: int | None = None, keep_ends: bool = False) -> None:
+        """
+        :param filename: filename to read from
+        :param parser: parser from line (bytes without line break unless keep_ends) to row
+        :param workers: number of worker processes
+        :param mappers: chain of mappers to apply to rows in workers
+        :param block_size: number of bytes read at once
+        :param batch_rows: number of rows sent from worker in one pickled frame
+        :param append_only: file only grows by appends (see readers.ReadJsonLines)
+        :param start: position to start reading at, must be beginning of line
+        :param end: position to stop reading at (end of file if None), must be beginning of line or end of file
+        :param keep_ends: parser gets lines as ops.Read gives them: with line breaks, blank lines included
+        """
+        self.filename = filename
+        self.parser = parser
+        self.workers = workers
+        self.mappers = list(mappers)
+        self.block_size = block_size
+        self.batch_rows = batch_rows
+        self.append_only = append_only
+        self.start = start
+        self.end = end
+        self.keep_ends = keep_ends
+
+    def fuse(self, op: ops.Operation) -> ops.Operation | None:
+        if not isinstance(op, ParallelMap):
+            return None
+        return ParallelRead(self.filename, self.parser, self.workers, self.mappers + op.mappers, self.block_size,
+                            self.batch_rows, self.append_only, self.start, self.end, self.keep_ends)
+
+    def __call__(self, *args: tp.Any, **kwargs: tp.Any) -> ops.TRowsGenerator:
+        context = multiprocessing.get_context('fork')
+        endpoints: list[connection.Connection] = []
+        processes = []
+        for start, end in readers.byte_ranges(self.filename, self.workers, self.start, self.end):
+            local_endpoint, remote_endpoint = context.Pipe(duplex=False)
+            process = context.Process(target=_read_range,
+                                      args=(remote_endpoint, self.filename, start, end, self.parser, self.mappers,
+                                            self.block_size, self.batch_rows, self.keep_ends))
+            process.start()
+            remote_endpoint.close()
+            endpoints.append(local_endpoint)
+            processes.append(process)
+        try:
+            yield from transport.recv_rows_unordered(endpoints)
+            for process in processes:
+                process.join()
+        finally:
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
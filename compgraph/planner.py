@@ -0,0 +1,260 @@
+import bisect
+import copy
+import sys
+import typing as tp
+
+from . import cache as result_cache
+from . import external_sort
+from . import incremental
+from . import operations as ops
+from . import readers
+from . import spill
+
+if tp.TYPE_CHECKING:
+    from .graph import Graph
+
+FANOUT_BUFFER_ROWS: int = 10000
+
+_DONE: int = sys.maxsize
+
+
+def inputs(node: 'Graph') -> list['Graph']:
+    """Nodes which output is read by node"""
+    return [graph for graph in (node._prev_node, node._join_graph) if graph is not None]
+
+
+def count_consumers(root: 'Graph') -> dict[int, int]:
+    """Count for every node reachable from root how many times its output is read
+    :param root: graph to inspect
+    :return: mapping from id of node to number of its consumers
+    """
+    consumers: dict[int, int] = {}
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        for graph in inputs(node):
+            if id(graph) not in consumers:
+                consumers[id(graph)] = 0
+                stack.append(graph)
+            consumers[id(graph)] += 1
+    return consumers
+
+
+class Fanout:
+    """
+    Shares one row stream between several consumers.
+    Rows not yet read by the slowest consumer are kept in memory buffer of bounded size, overflow is spilled to
+    disk, so consumers may drift apart arbitrarily far without materializing the stream in memory.
+    Consumers get the same rows, maps changing rows in place copy them first (see Execution),
+    so consumers do not affect each other.
+    """
+
+    def __init__(self, rows: ops.TRowsIterable, consumers: int, buffer_rows: int = FANOUT_BUFFER_ROWS,
+                 tmp_dir: str | None = None) -> None:
+        """
+        :param rows: stream to share
+        :param consumers: number of readers
+        :param buffer_rows: number of rows kept in memory before spilling
+        :param tmp_dir: directory for spill file (system default if None)
+        """
+        self._source = iter(rows)
+        self._positions: list[int] = [0] * consumers
+        self._readers: int = 0
+        self._buffer_rows = buffer_rows
+        self._tmp_dir = tmp_dir
+        self._buffer: list[ops.TRow] = []
+        self._buffer_start: int = 0
+        self._spill: spill.SpillFile[ops.TRow] | None = None
+        self._chunk_starts: list[int] = []
+        self._chunk_offsets: list[int] = []
+
+    def reader(self) -> ops.TRowsGenerator:
+        """Create generator for the next consumer"""
+        assert self._readers < len(self._positions), 'more readers than declared consumers'
+        index = self._readers
+        self._readers += 1
+        return self._read(index)
+
+    def _read(self, index: int) -> ops.TRowsGenerator:
+        position: int = 0
+        chunk: list[ops.TRow] = []
+        chunk_start: int = 0
+        try:
+            while True:
+                if position == self._buffer_start + len(self._buffer) and not self._pull():
+                    break
+                if position >= self._buffer_start:
+                    row = self._buffer[position - self._buffer_start]
+                else:
+                    if not chunk_start <= position < chunk_start + len(chunk):
+                        chunk, chunk_start = self._load_chunk(position)
+                    row = chunk[position - chunk_start]
+                position += 1
+                self._positions[index] = position
+                yield row
+        finally:
+            self._positions[index] = _DONE
+            if self._spill is not None and min(self._positions) == _DONE:
+                self._spill.close()
+                self._spill = None
+
+    def _pull(self) -> bool:
+        row = next(self._source, None)
+        if row is None:
+            return False
+        if len(self._buffer) >= self._buffer_rows:
+            self._shrink()
+        self._buffer.append(row)
+        return True
+
+    def _shrink(self) -> None:
+        """Drop rows all consumers have read, spill the rest"""
+        read_by_all = min(min(self._positions) - self._buffer_start, len(self._buffer))
+        if read_by_all > 0:
+            del self._buffer[:read_by_all]
+            self._buffer_start += read_by_all
+        if len(self._buffer) < self._buffer_rows:
+            return
+        if self._spill is None:
+            self._spill = spill.SpillFile(self._tmp_dir)
+        for start in range(0, len(self._buffer), spill.CHUNK_ROWS):
+            self._chunk_starts.append(self._buffer_start + start)
+            self._chunk_offsets.append(self._spill.write(self._buffer[start:start + spill.CHUNK_ROWS]))
+        self._buffer_start += len(self._buffer)
+        self._buffer = []
+
+    def _load_chunk(self, position: int) -> tuple[list[ops.TRow], int]:
+        assert self._spill is not None
+        chunk_index = bisect.bisect_right(self._chunk_starts, position) - 1
+        rows, _ = self._spill.read_chunk(self._chunk_offsets[chunk_index])
+        return rows, self._chunk_starts[chunk_index]
+
+
+class Execution:
+    """
+    Single run of graph.
+    Every node is evaluated exactly once, even if its output feeds several branches:
+    such output is shared between consumers through Fanout. Sorts of rows known to be sorted already are skipped.
+    With result cache, output of root and of nodes marked by Graph.cache is stored, and stored output is read
+    instead of evaluating node and everything it depends on, so the longest cached prefix of plan is reused.
+    With incremental state, reduces with mergeable reducer reading append-only file through row-wise operations
+    fold only rows appended since the previous run into stored states of groups.
+    Maps reading rows shared with caller of run or with other branches make shallow copies of them
+    ahead of the first mapper changing rows in place; other rows are mapped as they are.
+    """
+
+    def __init__(self, root: 'Graph', sources: dict[str, tp.Any], cache: result_cache.ResultCache | None = None,
+                 state: incremental.IncrementalState | None = None) -> None:
+        """
+        :param root: graph to run
+        :param sources: data sources passed to run
+        :param cache: result cache (None to evaluate everything)
+        :param state: states of incremental reduces (None to reduce whole input)
+        """
+        self._root = root
+        self._sources = sources
+        self._cache = cache
+        self._state = state
+        self._shadows: list['Graph'] = []
+        self._consumers = count_consumers(root)
+        self._fanouts: dict[int, Fanout] = {}
+        self._fingerprints: dict[int, str | None] = {}
+
+    def run(self) -> ops.TRowsIterable:
+        return self._rows(self._root)
+
+    def _rows(self, node: 'Graph') -> ops.TRowsIterable:
+        consumers = self._consumers.get(id(node), 0)
+        if consumers <= 1:
+            return self._output(node)
+        if id(node) not in self._fanouts:
+            self._fanouts[id(node)] = Fanout(self._output(node), consumers)
+        return self._fanouts[id(node)].reader()
+
+    def _output(self, node: 'Graph') -> ops.TRowsIterable:
+        if self._cache is None or not (node is self._root or self._is_cache_point(node)):
+            return self._compute(node)
+        key = result_cache.fingerprint(node, self._cache.files, self._fingerprints)
+        if key is None:
+            return self._compute(node)
+        rows = self._cache.get(key)
+        if rows is None:
+            return self._cache.store(key, self._compute(node))
+        return rows
+
+    def _compute(self, node: 'Graph') -> ops.TRowsIterable:
+        if self._state is not None:
+            reducer = incremental.mergeable_reducer(node._op)
+            chain = incremental.appended_chain(node, self._consumers) if reducer is not None else None
+            # Graphs reading data sources passed to run are not fingerprinted, so their states can not be kept
+            key = result_cache.fingerprint(node, self._state.files, appended=False) if chain is not None else None
+            if reducer is not None and chain is not None and key is not None:
+                return self._incremental(node, reducer, chain, key)
+        return self._evaluate(node)
+
+    def _incremental(self, node: 'Graph', reducer: ops.MergeableReducer, chain: list['Graph'],
+                     key: str) -> ops.TRowsGenerator:
+        """Fold rows appended to file since the previous run into stored states: chain of nodes from reduce to
+        reader of file is evaluated once more with reader limited to the appended lines"""
+        assert self._state is not None
+        reader = copy.copy(chain[-1]._op)
+        filename = reader.filename  # type: ignore[attr-defined]
+        start, groups = self._state.load(key, filename)
+        end = readers.complete_lines_end(filename)
+        reader.start, reader.end = start, end  # type: ignore[attr-defined]
+
+        prev_node = copy.copy(chain[-1])
+        prev_node._op = reader
+        for original in [*reversed(chain[:-1]), None]:
+            prev_node._cached = False
+            self._consumers[id(prev_node)] = 1
+            self._shadows.append(prev_node)
+            if original is not None:
+                shadow = copy.copy(original)
+                shadow._prev_node = prev_node
+                prev_node = shadow
+
+        keys = node._op.keys  # type: ignore[attr-defined]
+        incremental.fold(reducer, keys, self._rows(prev_node), groups)
+        self._state.save(key, filename, end, groups)
+        ordered = isinstance(node._op, ops.Reduce) or getattr(node._op, 'ordered', False)
+        yield from incremental.finish(reducer, keys, groups, ordered)
+
+    def _is_cache_point(self, node: 'Graph') -> bool:
+        return self._cache is not None and node._cached
+
+    def _evaluate(self, node: 'Graph') -> ops.TRowsIterable:
+        if isinstance(node._op, external_sort.ExternalSort) and node._prev_node is not None \
+                and node._prev_node._ordering.sorted_by(node._op.keys):
+            return self._rows(node._prev_node)
+        if node._join_graph is not None and node._prev_node is not None:
+            return node._op(self._rows(node._prev_node), self._rows(node._join_graph))
+        op, prev_node = self._fuse(node._op, node._prev_node)
+        if prev_node is None:
+            return op(**self._sources)
+        if isinstance(op, ops.Map) and not op.shared_input and self._shares_rows(prev_node):
+            op = ops.Map(*op.mappers, shared_input=True)
+        return op(self._rows(prev_node))
+
+    def _shares_rows(self, node: 'Graph') -> bool:
+        """Output of node may hold rows shared with caller of run (data sources) or with other branches"""
+        while True:
+            if self._consumers.get(id(node), 0) > 1:
+                return True
+            if node._prev_node is None:
+                return isinstance(node._op, ops.ReadIterFactory)
+            if node._join_graph is not None and self._shares_rows(node._join_graph):
+                # Outer joins pass rows without match through
+                return True
+            # Other operations may pass rows of their input through
+            node = node._prev_node
+
+    def _fuse(self, op: ops.Operation, prev_node: tp.Optional['Graph']) -> tuple[ops.Operation, tp.Optional['Graph']]:
+        """Fuse op with operations of preceding nodes which are read by nobody else"""
+        while prev_node is not None and prev_node._join_graph is None and self._consumers[id(prev_node)] == 1 \
+                and not self._is_cache_point(prev_node):
+            fused = prev_node._op.fuse(op)
+            if fused is None:
+                break
+            op, prev_node = fused, prev_node._prev_node
+        return op, prev_node
@@ -0,0 +1,164 @@
+import json
+import os
+import time
+import typing as tp
+
+from . import operations as ops
+from . import spill
+
+BLOCK_SIZE: int = spill.MiB
+
+TLoads = tp.Callable[[bytes], tp.Any]
+
+
+def _with_fallback(fast_loads: TLoads, error: type[Exception]) -> TLoads:
+    """Parser which passes lines the fast parser rejects (NaN, Infinity, integers out of 64 bits) to json"""
+    def loads(line: bytes) -> tp.Any:
+        try:
+            return fast_loads(line)
+        except error:
+            return json.loads(line)
+
+    return loads
+
+
+def _json_loads() -> TLoads:
+    """The fastest JSON parser available: orjson, ujson, reused json.JSONDecoder"""
+    try:
+        import orjson
+        return _with_fallback(orjson.loads, orjson.JSONDecodeError)
+    except ImportError:
+        pass
+    try:
+        import ujson  # type: ignore[import-not-found, import-untyped, unused-ignore]
+        return _with_fallback(ujson.loads, ValueError)
+    except ImportError:
+        pass
+    decode = json.JSONDecoder().decode
+
+    def loads(line: bytes) -> tp.Any:
+        return decode(line.decode())
+
+    return loads
+
+
+loads: TLoads = _json_loads()
+
+
+class ReadStats:
+    """Throughput of reader, updated as rows are read; time spent by consumers of rows is not counted"""
+
+    def __init__(self) -> None:
+        self.bytes: int = 0
+        self.rows: int = 0
+        self.seconds: float = 0.0
+
+    @property
+    def bytes_per_second(self) -> float:
+        return self.bytes / self.seconds if self.seconds else 0.0
+
+    def __str__(self) -> str:
+        return f'{self.rows} rows, {self.bytes / spill.MiB:.1f} MiB in {self.seconds:.2f} s ' \
+               f'({self.bytes_per_second / spill.MiB:.1f} MiB/s)'
+
+
+def read_lines(file: tp.BinaryIO, block_size: int = BLOCK_SIZE, end: int | None = None,
+               keep_ends: bool = False) -> tp.Generator[list[bytes], None, None]:
+    """Read file by large blocks and split them on lines; line broken by block boundary is carried over
+    :param file: file opened in binary mode, positioned at the beginning of line
+    :param block_size: number of bytes read at once
+    :param end: position to stop reading at (end of file if None), must be beginning of line or end of file
+    :param keep_ends: give lines as reading of file in text mode does: with line breaks ('\\r\\n' turned
+        into '\\n'), blank lines included
+    :return: lists of lines of every block, non-empty and without line breaks unless keep_ends
+    """
+    tail = b''
+    while block := file.read(block_size if end is None else min(block_size, end - file.tell())):
+        lines = block.split(b'\n')
+        lines[0] = tail + lines[0]
+        tail = lines.pop()
+        if keep_ends:
+            yield [line[:-1] + b'\n' if line.endswith(b'\r') else line + b'\n' for line in lines]
+        else:
+            yield [line for line in lines if line]
+    if tail:
+        yield [tail]
+
+
+def byte_ranges(filename: str, parts: int, start: int = 0, end: int | None = None) -> list[tuple[int, int]]:
+    """Split file into at most parts byte ranges of about the same size aligned to line boundaries
+    :param filename: file to split
+    :param parts: number of ranges
+    :param start: beginning of the part of file to split, must be beginning of line
+    :param end: end of the part of file to split (end of file if None), must be beginning of line or end of file
+    :return: non-empty (start, end) ranges covering the part of file
+    """
+    end = os.path.getsize(filename) if end is None else end
+    size = end - start
+    bounds = [start]
+    with open(filename, 'rb') as file:
+        for part in range(1, parts):
+            # Range starts right after the line break at or after the even split point
+            file.seek(max(start + size * part // parts - 1, bounds[-1]))
+            file.readline()
+            bounds.append(min(file.tell(), end))
+    bounds.append(end)
+    return [(start, end) for start, end in zip(bounds, bounds[1:]) if start < end]
+
+
+def complete_lines_end(filename: str, block_size: int = BLOCK_SIZE) -> int:
+    """Position right after the last line break of file, so line being appended is not read
+    :param filename: file to inspect
+    :param block_size: number of bytes read at once from the end of file
+    """
+    with open(filename, 'rb') as file:
+        end = file.seek(0, os.SEEK_END)
+        while end > 0:
+            start = max(end - block_size, 0)
+            file.seek(start)
+            position = file.read(end - start).rfind(b'\n')
+            if position >= 0:
+                return start + position + 1
+            end = start
+    return 0
+
+
+class ReadJsonLines(ops.Operation):
+    """
+    Read file with one JSON object per line.
+    File is read by large binary blocks which are split on lines at once, lines of block are decoded together
+    by the fastest JSON parser available (orjson or ujson if installed). Throughput is reported in stats.
+    """
+
+    def __init__(self, filename: str, block_size: int = BLOCK_SIZE, append_only: bool = False, start: int = 0,
+                 end: int | None = None) -> None:
+        """
+        :param filename: filename to read from
+        :param block_size: number of bytes read at once
+        :param append_only: file only grows by appends, so incremental runs read only lines appended since
+            the previous run (see Graph.run state_dir)
+        :param start: position to start reading at, must be beginning of line
+        :param end: position to stop reading at (end of file if None), must be beginning of line or end of file
+        """
+        self.filename = filename
+        self.block_size = block_size
+        self.append_only = append_only
+        self.start = start
+        self.end = end
+        self.stats = ReadStats()
+
+    def __call__(self, *args: tp.Any, **kwargs: tp.Any) -> ops.TRowsGenerator:
+        self.stats = stats = ReadStats()
+        with open(self.filename, 'rb') as file:
+            file.seek(self.start)
+            blocks = read_lines(file, self.block_size, self.end)
+            while True:
+                started = time.perf_counter()
+                lines = next(blocks, None)
+                if lines is None:
+                    break
+                rows = [loads(line) for line in lines]
+                stats.seconds += time.perf_counter() - started
+                stats.bytes = file.tell() - self.start
+                stats.rows += len(rows)
+                yield from rows
@@ -0,0 +1,313 @@
+import bz2
+import copy
+import csv
+import gzip
+import io
+import json
+import lzma
+import multiprocessing
+import os
+import time
+import typing as tp
+from abc import abstractmethod, ABC
+from multiprocessing import connection
+
+from . import operations as ops
+from . import parallel
+from . import spill
+from . import table
+from . import transport
+
+BUFFER_SIZE: int = spill.MiB
+BATCH_ROWS: int = 4096
+
+TDumps = tp.Callable[[tp.Any], bytes]
+
+# Compressions by name and by file suffix
+_OPENERS: dict[str, tp.Callable[[str], tp.BinaryIO]] = {
+    'gzip': lambda filename: tp.cast(tp.BinaryIO, gzip.open(filename, 'wb', compresslevel=6)),
+    'bz2': lambda filename: tp.cast(tp.BinaryIO, bz2.open(filename, 'wb')),
+    'xz': lambda filename: tp.cast(tp.BinaryIO, lzma.open(filename, 'wb')),
+}
+_SUFFIXES: dict[str, str] = {'.gz': 'gzip', '.bz2': 'bz2', '.xz': 'xz'}
+
+
+def _json_dumps() -> TDumps:
+    """The fastest JSON serializer available: orjson, ujson, reused json.JSONEncoder; all of them write compact UTF-8"""
+    try:
+        import orjson
+        return orjson.dumps
+    except ImportError:
+        pass
+    try:
+        import ujson  # type: ignore[import-not-found, import-untyped, unused-ignore]
+
+        def dumps_ujson(row: tp.Any) -> bytes:
+            return tp.cast(str, ujson.dumps(row, ensure_ascii=False)).encode()
+
+        return dumps_ujson
+    except ImportError:
+        pass
+    return _dumps_compact
+
+
+# Output of json.dumps: non-ASCII characters escaped, ', ' and ': ' separators, NaN and Infinity kept
+_ENCODER = json.JSONEncoder()
+_COMPACT_ENCODER = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+
+
+def _dumps_json(row: tp.Any) -> bytes:
+    return _ENCODER.encode(row).encode()
+
+
+def _dumps_compact(row: tp.Any) -> bytes:
+    return _COMPACT_ENCODER.encode(row).encode()
+
+
+dumps: TDumps = _json_dumps()
+
+
+class WriteStats:
+    """Counters of sink: rows and bytes written (compressed size for compressed files), files and time of writing"""
+
+    def __init__(self) -> None:
+        self.rows: int = 0
+        self.bytes: int = 0
+        self.seconds: float = 0.0
+        self.files: list[str] = []
+
+    def __iadd__(self, other: 'WriteStats') -> 'WriteStats':
+        self.rows += other.rows
+        self.bytes += other.bytes
+        self.seconds = max(self.seconds, other.seconds)
+        self.files += other.files
+        return self
+
+    def __str__(self) -> str:
+        return f'{self.rows} rows, {self.bytes / spill.MiB:.1f} MiB in {len(self.files)} files, {self.seconds:.2f} s'
+
+
+def open_output(filename: str, compression: str | None = None, buffer_size: int = BUFFER_SIZE) -> tp.BinaryIO:
+    """Open file for writing in binary mode
+    :param filename: filename to write to
+    :param compression: None, 'gzip', 'bz2' or 'xz'
+    :param buffer_size: size of write buffer of uncompressed file
+    """
+    if compression is None:
+        return open(filename, 'wb', buffering=buffer_size)
+    if compression not in _OPENERS:
+        raise ValueError(f'Unknown compression: {compression}')
+    return _OPENERS[compression](filename)
+
+
+def shard_filename(filename: str, index: int, shards: int) -> str:
+    """Name of shard of output file: out.jsonl.gz -> out-00001-of-00004.jsonl.gz"""
+    directory, name = os.path.split(filename)
+    stem, dot, suffix = name.partition('.')
+    return os.path.join(directory, f'{stem}-{index:05d}-of-{shards:05d}{dot}{suffix}')
+
+
+class Sink(ABC):
+    """Writer of rows into file"""
+
+    def __init__(self, filename: str) -> None:
+        """
+        :param filename: filename to write to
+        """
+        self.filename = filename
+
+    @abstractmethod
+    def __call__(self, rows: ops.TRowsIterable) -> WriteStats:
+        """Write all rows
+        :return: counters of written rows and bytes
+        """
+        pass
+
+    def shard(self, index: int, shards: int) -> 'Sink':
+        """The same sink writing shard index of shards"""
+        sink = copy.copy(self)
+        sink.filename = shard_filename(self.filename, index, shards)
+        return sink
+
+
+class FileSink(Sink):
+    """Sink of text format: rows are serialized by batches going into large buffered (optionally compressed) writes"""
+
+    def __init__(self, filename: str, compression: str | None = None, batch_rows: int = BATCH_ROWS,
+                 buffer_size: int = BUFFER_SIZE) -> None:
+        """
+        :param filename: filename to write to
+        :param compression: None, 'gzip', 'bz2' or 'xz'
+        :param batch_rows: number of rows serialized at once
+        :param buffer_size: size of write buffer of uncompressed file
+        """
+        super().__init__(filename)
+        if compression is not None and compression not in _OPENERS:
+            raise ValueError(f'Unknown compression: {compression}')
+        self.compression = compression
+        self.batch_rows = batch_rows
+        self.buffer_size = buffer_size
+
+    def __call__(self, rows: ops.TRowsIterable) -> WriteStats:
+        stats = WriteStats()
+        with open_output(self.filename, self.compression, self.buffer_size) as file:
+            batches = parallel.chunks(rows, self.batch_rows)
+            while True:
+                batch = next(batches, None)
+                if batch is None:
+                    break
+                started = time.perf_counter()
+                file.write(self.serialize(batch, first=not stats.rows))
+                stats.seconds += time.perf_counter() - started
+                stats.rows += len(batch)
+        stats.bytes = os.path.getsize(self.filename)
+        stats.files.append(self.filename)
+        return stats
+
+    @abstractmethod
+    def serialize(self, batch: list[ops.TRow], first: bool) -> bytes:
+        """Serialize batch of rows
+        :param batch: rows to serialize
+        :param first: batch is the first one of file
+        """
+        pass
+
+
+class JsonLinesSink(FileSink):
+    """
+    Write one JSON object per line, encoded as by json.dumps.
+    With fast=True rows are serialized by the fastest JSON serializer available (orjson, ujson) instead:
+    output is compact UTF-8, and orjson writes NaN and Infinity as null.
+    """
+
+    def __init__(self, filename: str, compression: str | None = None, batch_rows: int = BATCH_ROWS,
+                 buffer_size: int = BUFFER_SIZE, fast: bool = False) -> None:
+        """
+        :param filename: filename to write to
+        :param compression: None, 'gzip', 'bz2' or 'xz'
+        :param batch_rows: number of rows serialized at once
+        :param buffer_size: size of write buffer of uncompressed file
+        :param fast: serialize by the fastest serializer available, output differs from json.dumps
+        """
+        super().__init__(filename, compression, batch_rows, buffer_size)
+        self.fast = fast
+
+    def serialize(self, batch: list[ops.TRow], first: bool) -> bytes:
+        if not self.fast:
+            return b'\n'.join([_dumps_json(row) for row in batch]) + b'\n'
+        try:
+            return b'\n'.join([dumps(row) for row in batch]) + b'\n'
+        except TypeError:
+            # orjson rejects non-string keys and integers out of 64 bits, which json writes
+            return b'\n'.join([_dumps_compact(row) for row in batch]) + b'\n'
+
+
+class CsvSink(FileSink):
+    """Write rows as CSV with header, missing values are empty"""
+
+    def __init__(self, filename: str, columns: tp.Sequence[str] | None = None, compression: str | None = None,
+                 batch_rows: int = BATCH_ROWS, buffer_size: int = BUFFER_SIZE) -> None:
+        """
+        :param filename: filename to write to
+        :param columns: names of columns (columns of the first row if None)
+        :param compression: None, 'gzip', 'bz2' or 'xz'
+        :param batch_rows: number of rows serialized at once
+        :param buffer_size: size of write buffer of uncompressed file
+        """
+        super().__init__(filename, compression, batch_rows, buffer_size)
+        self.columns = list(columns) if columns is not None else None
+        self._columns = self.columns
+
+    def __call__(self, rows: ops.TRowsIterable) -> WriteStats:
+        self._columns = self.columns
+        return super().__call__(rows)
+
+    def serialize(self, batch: list[ops.TRow], first: bool) -> bytes:
+        if self._columns is None:
+            self._columns = list(batch[0])
+        text = io.StringIO()
+        writer = csv.writer(text)
+        if first:
+            writer.writerow(self._columns)
+        writer.writerows([[row.get(column) for column in self._columns] for row in batch])
+        return text.getvalue().encode()
+
+
+class TableSink(Sink):
+    """Write rows into columnar table file (see table.TableWriter)"""
+
+    def __init__(self, filename: str, columns: tp.Sequence[str] | None = None,
+                 chunk_rows: int = table.CHUNK_ROWS) -> None:
+        """
+        :param filename: filename to write to
+        :param columns: names of columns (columns of the first row if None)
+        :param chunk_rows: number of rows in chunk
+        """
+        super().__init__(filename)
+        self.columns = columns
+        self.chunk_rows = chunk_rows
+
+    def __call__(self, rows: ops.TRowsIterable) -> WriteStats:
+        stats = WriteStats()
+        started = time.perf_counter()
+        stats.rows = table.write_table(rows, self.filename, self.columns, self.chunk_rows)
+        stats.seconds = time.perf_counter() - started
+        stats.bytes = os.path.getsize(self.filename)
+        stats.files.append(self.filename)
+        return stats
+
+
+def sink_for(filename: str) -> Sink:
+    """Sink chosen by suffixes of filename: .csv, .table or JSON lines otherwise, optionally followed by .gz/.bz2/.xz"""
+    root, suffix = os.path.splitext(filename)
+    compression = _SUFFIXES.get(suffix)
+    if compression is not None:
+        root, suffix = os.path.splitext(root)
+    if suffix == '.csv':
+        return CsvSink(filename, compression=compression)
+    if suffix == '.table':
+        if compression is not None:
+            raise ValueError('Table files are not compressed')
+        return TableSink(filename)
+    return JsonLinesSink(filename, compression=compression)
+
+
+def _write_shard(endpoint: connection.Connection, sink: Sink) -> None:
+    stats = sink(transport.recv_rows(endpoint))
+    endpoint.send(stats)
+
+
+def write_sharded(rows: ops.TRowsIterable, sink: Sink, shards: int,
+                  batch_rows: int = transport.BATCH_ROWS) -> WriteStats:
+    """Write rows into shards of sink in worker processes, batches of rows go to workers round robin
+    :param rows: rows to write
+    :param sink: sink, which shard() gives sinks of workers
+    :param shards: number of shards (and worker processes)
+    :param batch_rows: number of rows sent to worker in one pickled frame
+    :return: counters summed over shards
+    """
+    context = multiprocessing.get_context('fork')
+    endpoints: list[connection.Connection] = []
+    processes = []
+    for index in range(shards):
+        local_endpoint, remote_endpoint = context.Pipe()
+        process = context.Process(target=_write_shard, args=(remote_endpoint, sink.shard(index, shards)))
+        process.start()
+        remote_endpoint.close()
+        endpoints.append(local_endpoint)
+        processes.append(process)
+    try:
+        for index, batch in enumerate(parallel.chunks(rows, batch_rows)):
+            transport.send_batch(endpoints[index % shards], batch)
+        for endpoint in endpoints:
+            transport.send_end(endpoint)
+        stats = WriteStats()
+        for endpoint in endpoints:
+            stats += endpoint.recv()
+        for process in processes:
+            process.join()
+        return stats
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
@@ -0,0 +1,124 @@
+import pickle
+import sys
+import tempfile
+import typing as tp
+
+if tp.TYPE_CHECKING:
+    from . import operations as ops
+
+KiB = 1024
+MiB = 1024 * KiB
+
+DEFAULT_MEMORY_LIMIT: int = 64 * MiB
+CHUNK_ROWS: int = 1024
+# Size of rows read up to memory limit is estimated by the first and then every n-th of them,
+# estimation costs more than reading
+SIZE_SAMPLE: int = 16
+
+T = tp.TypeVar('T')
+
+
+def estimate_size(row: 'ops.TRow') -> int:
+    """Rough estimation of memory held by row: the dict itself plus its values (not deep)"""
+    return sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row.values())
+
+
+def sampled_size(row: 'ops.TRow', count: int) -> int:
+    """Estimation of size of rows read so far added by the last of them: the first row and every SIZE_SAMPLE-th
+    one after it stand for SIZE_SAMPLE rows, the rest are not measured
+    :param row: the last read row
+    :param count: number of rows read, row included
+    """
+    return estimate_size(row) * SIZE_SAMPLE if (count - 1) % SIZE_SAMPLE == 0 else 0
+
+
+def read_bounded(rows: tp.Iterator['ops.TRow'], memory_limit: int) -> tuple[list['ops.TRow'], bool]:
+    """Read rows while they fit into memory limit
+    :param rows: rows to read
+    :param memory_limit: approximate number of bytes read rows may take
+    :return: read rows and whether rows are over (the rest stays in iterator otherwise)
+    """
+    buffer: list['ops.TRow'] = []
+    size: int = 0
+    for row in rows:
+        buffer.append(row)
+        size += sampled_size(row, len(buffer))
+        if size >= memory_limit:
+            return buffer, False
+    return buffer, True
+
+
+class SpillFile(tp.Generic[T]):
+    """
+    Anonymous temporary file holding rows (or any other picklable records) as a sequence of pickled chunks.
+    Every chunk is addressed by its offset, so several readers may walk the same file independently.
+    """
+
+    def __init__(self, tmp_dir: str | None = None) -> None:
+        """
+        :param tmp_dir: directory to create file in (system default if None)
+        """
+        self._file = tempfile.TemporaryFile(dir=tmp_dir)
+        self._end: int = 0
+
+    def write(self, rows: tp.Sequence[T]) -> int:
+        """Append chunk of rows to the end of file
+        :param rows: rows to store
+        :return: offset of the written chunk
+        """
+        offset = self._end
+        self._file.seek(offset)
+        pickle.dump(rows, self._file, protocol=pickle.HIGHEST_PROTOCOL)
+        self._end = self._file.tell()
+        return offset
+
+    def write_all(self, rows: tp.Iterable[T], chunk_rows: int = CHUNK_ROWS) -> None:
+        """Append rows to the end of file splitting them into chunks
+        :param rows: rows to store
+        :param chunk_rows: number of rows in one chunk
+        """
+        chunk: list[T] = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= chunk_rows:
+                self.write(chunk)
+                chunk = []
+        if chunk:
+            self.write(chunk)
+
+    def read_chunk(self, offset: int) -> tuple[list[T], int]:
+        """Read one chunk
+        :param offset: offset of the chunk
+        :return: rows of the chunk and offset of the next one
+        """
+        self._file.seek(offset)
+        rows = pickle.load(self._file)
+        return rows, self._file.tell()
+
+    def read_chunks(self, offset: int = 0) -> tp.Generator[list[T], None, None]:
+        """Read chunks starting from chunk at offset till the end of file
+        :param offset: offset of the first chunk to read
+        """
+        while offset < self._end:
+            rows, offset = self.read_chunk(offset)
+            yield rows
+
+    def read(self, offset: int = 0) -> tp.Generator[T, None, None]:
+        """Read rows starting from chunk at offset till the end of file
+        :param offset: offset of the first chunk to read
+        """
+        for rows in self.read_chunks(offset):
+            yield from rows
+
+    @property
+    def size(self) -> int:
+        return self._end
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self) -> 'SpillFile[T]':
+        return self
+
+    def __exit__(self, *args: tp.Any) -> None:
+        self.close()
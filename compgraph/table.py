@@ -0,0 +1,239 @@
+import json
+import math
+import pickle
+import struct
+import sys
+import typing as tp
+from array import array
+
+from . import operations as ops
+
+MAGIC: bytes = b'CGTABLE1'
+CHUNK_ROWS: int = 16384
+
+_LENGTH = struct.Struct('<Q')
+_INT_MIN, _INT_MAX = -2 ** 63, 2 ** 63 - 1
+
+# Column encodings: packed int64, packed float64, dictionary of strings and pickled list of anything else
+INT, FLOAT, DICTIONARY, PICKLE = 'int', 'float', 'dict', 'pickle'
+
+TBounds = tuple[tp.Any, tp.Any]  # inclusive (low, high), None for open bound
+
+
+def _encode(values: list[tp.Any]) -> tuple[str, bytes, tp.Any, tp.Any]:
+    """
+    :return: encoding, encoded column, minimum and maximum (None if column is not comparable)
+    """
+    types = set(map(type, values))
+    if types == {int} and _INT_MIN <= min(values) and max(values) <= _INT_MAX:
+        return INT, array('q', values).tobytes(), min(values), max(values)
+    if types == {float}:
+        if any(math.isnan(value) for value in values):
+            return FLOAT, array('d', values).tobytes(), None, None
+        return FLOAT, array('d', values).tobytes(), min(values), max(values)
+    if types == {str}:
+        positions: dict[str, int] = {}
+        indices = [positions.setdefault(value, len(positions)) for value in values]
+        typecode = 'B' if len(positions) <= 2 ** 8 else 'H' if len(positions) <= 2 ** 16 else 'I'
+        dictionary = json.dumps(list(positions)).encode()
+        return DICTIONARY, _LENGTH.pack(len(dictionary)) + dictionary + typecode.encode() + \
+            array(typecode, indices).tobytes(), min(values), max(values)
+    return PICKLE, pickle.dumps(values, protocol=5), None, None
+
+
+def _decode(encoding: str, data: bytes, swap: bool) -> list[tp.Any]:
+    if encoding == PICKLE:
+        return pickle.loads(data)
+    if encoding == DICTIONARY:
+        (length,) = _LENGTH.unpack_from(data)
+        dictionary = json.loads(data[_LENGTH.size:_LENGTH.size + length])
+        indices = array(data[_LENGTH.size + length:_LENGTH.size + length + 1].decode())
+        indices.frombytes(data[_LENGTH.size + length + 1:])
+        if swap:
+            indices.byteswap()
+        return [dictionary[index] for index in indices]
+    values = array('q' if encoding == INT else 'd')
+    values.frombytes(data)
+    if swap:
+        values.byteswap()
+    return values.tolist()
+
+
+class TableWriter:
+    """
+    Writer of columnar table file.
+    Layout: magic and schema header (names of columns), chunks of CHUNK_ROWS rows stored column after column
+    (every column of chunk is encoded on its own: packed numbers, dictionary of strings or pickle),
+    footer with offsets and min/max of every column of every chunk, its length and magic.
+    """
+
+    def __init__(self, filename: str, columns: tp.Sequence[str] | None = None, chunk_rows: int = CHUNK_ROWS) -> None:
+        """
+        :param filename: filename to write to
+        :param columns: names of columns (columns of the first row if None); missing columns are stored as None
+        :param chunk_rows: number of rows in chunk
+        """
+        self.filename = filename
+        self.columns = list(columns) if columns is not None else None
+        self.chunk_rows = chunk_rows
+        self.rows: int = 0
+        self._file: tp.BinaryIO | None = None
+        self._chunk: list[ops.TRow] = []
+        self._chunks: list[dict[str, tp.Any]] = []
+
+    def __enter__(self) -> 'TableWriter':
+        return self
+
+    def __exit__(self, *args: tp.Any) -> None:
+        self.close()
+
+    def write(self, rows: ops.TRowsIterable) -> None:
+        """
+        :param rows: rows to append to the table
+        """
+        for row in rows:
+            if self._file is None:
+                self._open(row)
+            self._chunk.append(row)
+            if len(self._chunk) >= self.chunk_rows:
+                self._flush()
+
+    def close(self) -> None:
+        """Write the rest of rows and footer"""
+        if self._file is None:
+            self._open({})
+        assert self._file is not None
+        if self._chunk:
+            self._flush()
+        footer = json.dumps({'rows': self.rows, 'chunks': self._chunks}).encode()
+        self._file.write(footer + _LENGTH.pack(len(footer)) + MAGIC)
+        self._file.close()
+
+    def _open(self, row: ops.TRow) -> None:
+        if self.columns is None:
+            self.columns = list(row)
+        header = json.dumps({'columns': self.columns, 'byteorder': sys.byteorder}).encode()
+        self._file = open(self.filename, 'wb')
+        self._file.write(MAGIC + _LENGTH.pack(len(header)) + header)
+
+    def _flush(self) -> None:
+        assert self._file is not None and self.columns is not None
+        known = set(self.columns)
+        for row in self._chunk:
+            if not known.issuperset(row):
+                raise ValueError(f'Columns {sorted(set(row) - known)} are not in table schema {self.columns}')
+        chunk: dict[str, tp.Any] = {'rows': len(self._chunk), 'columns': {}}
+        for column in self.columns:
+            encoding, data, low, high = _encode([row.get(column) for row in self._chunk])
+            chunk['columns'][column] = {'offset': self._file.tell(), 'size': len(data), 'encoding': encoding,
+                                        'min': low, 'max': high}
+            self._file.write(data)
+        self._chunks.append(chunk)
+        self.rows += len(self._chunk)
+        self._chunk = []
+
+
+def write_table(rows: ops.TRowsIterable, filename: str, columns: tp.Sequence[str] | None = None,
+                chunk_rows: int = CHUNK_ROWS) -> int:
+    """Write rows into columnar table file
+    :param rows: rows to write
+    :param filename: filename to write to
+    :param columns: names of columns (columns of the first row if None)
+    :param chunk_rows: number of rows in chunk
+    :return: number of written rows
+    """
+    with TableWriter(filename, columns, chunk_rows) as writer:
+        writer.write(rows)
+    return writer.rows
+
+
+class TableReader:
+    """Reader of columnar table file written by TableWriter"""
+
+    def __init__(self, filename: str) -> None:
+        """
+        :param filename: filename to read from
+        """
+        self.filename = filename
+        with open(filename, 'rb') as file:
+            if file.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f'{filename} is not a table file')
+            (length,) = _LENGTH.unpack(file.read(_LENGTH.size))
+            header = json.loads(file.read(length))
+            file.seek(-(_LENGTH.size + len(MAGIC)), 2)
+            (length,) = _LENGTH.unpack(file.read(_LENGTH.size))
+            if file.read() != MAGIC:
+                raise ValueError(f'{filename} is truncated')
+            file.seek(-(length + _LENGTH.size + len(MAGIC)), 2)
+            footer = json.loads(file.read(length))
+        self.columns: list[str] = header['columns']
+        self.rows: int = footer['rows']
+        self._swap = header['byteorder'] != sys.byteorder
+        self._chunks: list[dict[str, tp.Any]] = footer['chunks']
+
+    def read(self, columns: tp.Sequence[str] | None = None,
+             where: dict[str, TBounds] | None = None) -> ops.TRowsGenerator:
+        """
+        :param columns: columns to read (all if None); other columns are not read from disk
+        :param where: keep only rows which values of columns are within inclusive (low, high) bounds
+            (None for open bound, None values are out of any bound); chunks which min/max are out of bounds
+            are skipped without reading
+        """
+        columns = list(columns) if columns is not None else self.columns
+        where = where or {}
+        for column in [*columns, *where]:
+            if column not in self.columns:
+                raise KeyError(f'Column {column} is not in table schema {self.columns}')
+        with open(self.filename, 'rb') as file:
+            for chunk in self._chunks:
+                if not all(self._may_match(chunk['columns'][column], bounds) for column, bounds in where.items()):
+                    continue
+                values = {column: self._read_column(file, chunk['columns'][column])
+                          for column in dict.fromkeys([*columns, *where])}
+                selected: tp.Iterable[int] = range(chunk['rows'])
+                for column, bounds in where.items():
+                    column_values = values[column]
+                    selected = [index for index in selected if self._matches(column_values[index], bounds)]
+                for index in selected:
+                    yield {column: values[column][index] for column in columns}
+
+    @staticmethod
+    def _matches(value: tp.Any, bounds: TBounds) -> bool:
+        """Value is within bounds; None and values not comparable with bounds are out of any bound"""
+        low, high = bounds
+        try:
+            return (low is None or low <= value) and (high is None or value <= high)
+        except TypeError:
+            return False
+
+    @staticmethod
+    def _may_match(stats: dict[str, tp.Any], bounds: TBounds) -> bool:
+        low, high = bounds
+        if stats['min'] is None:
+            return True
+        try:
+            return (low is None or stats['max'] >= low) and (high is None or stats['min'] <= high)
+        except TypeError:
+            return True
+
+    def _read_column(self, file: tp.BinaryIO, stats: dict[str, tp.Any]) -> list[tp.Any]:
+        file.seek(stats['offset'])
+        return _decode(stats['encoding'], file.read(stats['size']), self._swap)
+
+
+class ReadTable(ops.Operation):
+    """Read rows of columnar table file, only requested columns and chunks matching bounds are read"""
+
+    def __init__(self, filename: str, columns: tp.Sequence[str] | None = None,
+                 where: dict[str, TBounds] | None = None) -> None:
+        """
+        :param filename: filename to read from
+        :param columns: columns to read (all if None)
+        :param where: keep only rows which values of columns are within inclusive (low, high) bounds
+        """
+        self.filename = filename
+        self.columns = columns
+        self.where = where
+
+    def __call__(self, *args: tp.Any, **kwargs: tp.Any) -> ops.TRowsGenerator:
+        yield from TableReader(self.filename).read(self.columns, self.where)
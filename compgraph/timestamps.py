@@ -0,0 +1,83 @@
+import re
+import typing as tp
+from datetime import datetime, timedelta
+
+EPOCH: datetime = datetime(1970, 1, 1)
+SECONDS_PER_DAY: int = 24 * 60 * 60
+# 1970-01-01 was Thursday
+EPOCH_WEEKDAY: int = 3
+
+# Fixed-width numeric directives of strptime and their widths
+_FIELDS: dict[str, int] = {'Y': 4, 'm': 2, 'd': 2, 'H': 2, 'M': 2, 'S': 2}
+
+TParser = tp.Callable[[str], datetime]
+
+
+def compile_parser(dt_format: str) -> TParser:
+    """Build parser of timestamps in dt_format, which gives the same result as datetime.strptime.
+    Formats of fixed-width numeric fields (%Y %m %d %H %M %S, optionally ending with %f) and literals,
+    e.g. '%Y%m%dT%H%M%S.%f', are compiled into a regular expression of fixed-width digit groups;
+    strings not matching it and any other formats go to strptime.
+    :param dt_format: format in strptime notation
+    """
+    def strptime(text: str) -> datetime:
+        return datetime.strptime(text, dt_format)
+
+    pattern: list[str] = []
+    order: list[str] = []
+    index = 0
+    while index < len(dt_format):
+        char = dt_format[index]
+        if char != '%':
+            pattern.append(re.escape(char))
+            index += 1
+            continue
+        directive = dt_format[index + 1:index + 2]
+        if directive in _FIELDS and directive not in order:
+            pattern.append(rf'(\d{{{_FIELDS[directive]}}})')
+        elif directive == 'f' and index + 2 == len(dt_format):
+            pattern.append(r'(\d{1,6})')
+        else:
+            return strptime
+        order.append(directive)
+        index += 2
+    if any(field not in order for field in 'Ymd'):
+        return strptime
+
+    regex = re.compile(''.join(pattern), re.ASCII)
+    positions = [order.index(field) if field in order else None for field in 'YmdHMSf']
+
+    def parse(text: str) -> datetime:
+        match = regex.fullmatch(text)
+        if match is None:
+            return strptime(text)
+        groups = match.groups()
+        year, month, day, hours, minutes, seconds, fraction = \
+            (groups[position] if position is not None else '0' for position in positions)
+        try:
+            return datetime(int(year), int(month), int(day), int(hours), int(minutes), int(seconds),
+                            int(fraction.ljust(6, '0')))
+        except ValueError:
+            return strptime(text)
+
+    return parse
+
+
+def to_epoch(dt: datetime) -> float:
+    """Seconds since 1970-01-01 of naive datetime"""
+    return (dt - EPOCH).total_seconds()
+
+
+def duration(start: float, end: float) -> timedelta:
+    """Duration between epoch timestamps, rounded to microseconds as difference of datetimes is"""
+    return timedelta(microseconds=round((end - start) * 10 ** 6))
+
+
+def weekday(epoch: float) -> int:
+    """Day of week of epoch timestamp, Monday is 0"""
+    return int(epoch // SECONDS_PER_DAY + EPOCH_WEEKDAY) % 7
+
+
+def hour(epoch: float) -> int:
+    """Hour of epoch timestamp"""
+    return int(epoch % SECONDS_PER_DAY // 3600)
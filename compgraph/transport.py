@@ -0,0 +1,89 @@
+import pickle
+import typing as tp
+
+from multiprocessing import connection
+
+from . import operations as ops
+
+BATCH_ROWS: int = 1024
+
+_END_OF_STREAM: bytes = b''
+
+
+def send_batch(endpoint: connection.Connection, rows: tp.Sequence[ops.TRow]) -> None:
+    """Send rows through connection as a single protocol 5 pickled frame
+    :param endpoint: connection to send into
+    :param rows: non-empty batch of rows
+    """
+    endpoint.send_bytes(pickle.dumps(rows, protocol=5))
+
+
+def send_end(endpoint: connection.Connection) -> None:
+    """Terminate stream of batches with an empty frame
+    :param endpoint: connection to send into
+    """
+    endpoint.send_bytes(_END_OF_STREAM)
+
+
+def send_rows(endpoint: connection.Connection, rows: ops.TRowsIterable, batch_rows: int = BATCH_ROWS) -> int:
+    """Send rows through connection in framed batches and terminate the stream
+    :param endpoint: connection to send into
+    :param rows: rows to send
+    :param batch_rows: number of rows in one frame
+    :return: number of sent rows
+    """
+    count: int = 0
+    batch: list[ops.TRow] = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_rows:
+            send_batch(endpoint, batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        send_batch(endpoint, batch)
+        count += len(batch)
+    send_end(endpoint)
+    return count
+
+
+def recv_batch(endpoint: connection.Connection) -> list[ops.TRow] | None:
+    """Receive one batch sent by send_batch
+    :param endpoint: connection to receive from
+    :return: rows of batch, None at the end of stream
+    """
+    frame = endpoint.recv_bytes()
+    if frame == _END_OF_STREAM:
+        return None
+    return pickle.loads(frame)
+
+
+def recv_batches(endpoint: connection.Connection) -> tp.Generator[list[ops.TRow], None, None]:
+    """Receive batches sent by send_rows till the end of stream
+    :param endpoint: connection to receive from
+    """
+    while (batch := recv_batch(endpoint)) is not None:
+        yield batch
+
+
+def recv_rows(endpoint: connection.Connection) -> ops.TRowsGenerator:
+    """Receive rows sent by send_rows till the end of stream
+    :param endpoint: connection to receive from
+    """
+    for batch in recv_batches(endpoint):
+        yield from batch
+
+
+def recv_rows_unordered(endpoints: tp.Sequence[connection.Connection]) -> ops.TRowsGenerator:
+    """Receive rows from several connections in the order their batches arrive
+    :param endpoints: connections to receive from, each one carries stream made by send_rows
+    """
+    active = list(endpoints)
+    while active:
+        for endpoint in connection.wait(active):
+            assert isinstance(endpoint, connection.Connection)
+            batch = recv_batch(endpoint)
+            if batch is None:
+                active.remove(endpoint)
+            else:
+                yield from batch
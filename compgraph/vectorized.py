@@ -0,0 +1,36 @@
+import math
+import typing as tp
+from array import array
+
+np: tp.Any
+try:
+    import numpy as np  # type: ignore[import-not-found, no-redef, unused-ignore]
+except ImportError:  # numpy is optional, without it kernels loop over arrays in python
+    np = None
+
+TArray = tp.Sequence[float]  # array('d') preferably, NumPy wraps it without copying
+
+
+def haversine(lon_start: TArray, lat_start: TArray, lon_end: TArray, lat_end: TArray,
+              radius: float) -> list[float]:
+    """Haversine distances between pairs of points given in degrees
+    :param lon_start: longitudes of start points
+    :param lat_start: latitudes of start points
+    :param lon_end: longitudes of end points
+    :param lat_end: latitudes of end points
+    :param radius: radius of sphere
+    """
+    if np is not None:
+        lon_a, lat_a, lon_b, lat_b = (
+            np.radians(np.frombuffer(values, dtype=float) if isinstance(values, array) else np.asarray(values, float))
+            for values in (lon_start, lat_start, lon_end, lat_end))
+        return (2 * radius * np.arcsin(np.sqrt(np.sin((lat_b - lat_a) / 2) ** 2 +
+                                               np.cos(lat_a) * np.cos(lat_b) *
+                                               np.sin((lon_b - lon_a) / 2) ** 2))).tolist()
+    sin, cos, asin, sqrt, radians = math.sin, math.cos, math.asin, math.sqrt, math.radians
+    result = []
+    for lon_a, lat_a, lon_b, lat_b in zip(lon_start, lat_start, lon_end, lat_end):
+        lon_a, lat_a, lon_b, lat_b = radians(lon_a), radians(lat_a), radians(lon_b), radians(lat_b)
+        result.append(2 * radius * asin(sqrt(sin((lat_b - lat_a) / 2) ** 2 +
+                                             cos(lat_a) * cos(lat_b) * sin((lon_b - lon_a) / 2) ** 2)))
+    return result
@@ -1,23 +1,20 @@
-import json
-
 import click
 from compgraph import algorithms
+from compgraph import sinks
 
 
 @click.command()
 @click.argument('input_filepath', type=str)
 @click.argument('output_filepath', type=str)
-def main(input_filepath: str, output_filepath: str) -> None:
+@click.option('--cache-dir', type=str, default=None, help='directory of result cache reused by later runs')
+def main(input_filepath: str, output_filepath: str, cache_dir: str | None) -> None:
     graph = algorithms.inverted_index_graph(input_stream_name=input_filepath,
                                             doc_column='doc_id',
                                             text_column='text',
                                             result_column='tf_idf',
                                             from_file=True)
 
-    result = graph.run()
-    with open(output_filepath, 'w') as out:
-        for row in result:
-            print(json.dumps(row), file=out)
+    graph.write_to(sinks.sink_for(output_filepath), cache_dir=cache_dir)
 
 
 if __name__ == '__main__':
@@ -1,7 +1,6 @@
-import json
-
 import click
 from compgraph import algorithms
+from compgraph import sinks
 
 
 @click.command()
@@ -14,10 +13,7 @@ def main(input_filepath: str, output_filepath: str) -> None:
                                  result_column='pmi',
                                  from_file=True)
 
-    result = graph.run()
-    with open(output_filepath, 'w') as out:
-        for row in result:
-            print(json.dumps(row), file=out)
+    graph.write_to(sinks.sink_for(output_filepath))
 
 
 if __name__ == '__main__':
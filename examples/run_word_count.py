@@ -1,22 +1,25 @@
-import json
-
 import click
 from compgraph import algorithms
+from compgraph import sinks
 
 
 @click.command()
 @click.argument('input_filepath', type=str)
 @click.argument('output_filepath', type=str)
-def main(input_filepath: str, output_filepath: str) -> None:
+@click.option('--cache-dir', type=str, default=None, help='directory of result cache reused by later runs')
+@click.option('--state-dir', type=str, default=None,
+              help='directory of state of incremental runs over append-only input')
+@click.option('--workers', type=int, default=1, help='number of worker processes reading and processing input')
+def main(input_filepath: str, output_filepath: str, cache_dir: str | None, state_dir: str | None,
+         workers: int) -> None:
     graph = algorithms.word_count_graph(input_stream_name=input_filepath,
                                         text_column='text',
                                         count_column='count',
-                                        from_file=True)
+                                        from_file=True,
+                                        workers=workers,
+                                        append_only=state_dir is not None)
 
-    result = graph.run()
-    with open(output_filepath, 'w') as out:
-        for row in result:
-            print(json.dumps(row), file=out)
+    graph.write_to(sinks.sink_for(output_filepath), cache_dir=cache_dir, state_dir=state_dir)
 
 
 if __name__ == '__main__':
@@ -1,14 +1,17 @@
-import json
-
 import click
 from compgraph import algorithms
+from compgraph import sinks
 
 
 @click.command()
 @click.argument('input_time_filepath', type=str)
 @click.argument('input_len_filepath', type=str)
 @click.argument('output_filepath', type=str)
-def main(input_time_filepath: str, input_len_filepath: str, output_filepath: str) -> None:
+@click.option('--state-dir', type=str, default=None,
+              help='directory of state of incremental runs over append-only input')
+@click.option('--workers', type=int, default=1, help='number of worker processes reading and processing input')
+def main(input_time_filepath: str, input_len_filepath: str, output_filepath: str, state_dir: str | None,
+         workers: int) -> None:
     graph = algorithms.yandex_maps_graph(input_stream_name_time=input_time_filepath,
                                          input_stream_name_length=input_len_filepath,
                                          enter_time_column='enter_time',
@@ -19,12 +22,11 @@ def main(input_time_filepath: str, input_len_filepath: str, output_filepath: str
                                          weekday_result_column='weekday',
                                          hour_result_column='hour',
                                          speed_result_column='speed',
-                                         from_file=True)
+                                         from_file=True,
+                                         workers=workers,
+                                         append_only=state_dir is not None)
 
-    result = graph.run()
-    with open(output_filepath, 'w') as out:
-        for row in result:
-            print(json.dumps(row), file=out)
+    graph.write_to(sinks.sink_for(output_filepath), state_dir=state_dir)
 
 
 if __name__ == '__main__':
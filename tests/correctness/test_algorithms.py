@@ -97,6 +97,62 @@ def test_tf_idf() -> None:
     assert sorted(result, key=itemgetter('doc_id', 'text')) == expected
 
 
+def test_word_count_parallel() -> None:
+    graph = algorithms.word_count_graph('docs', text_column='text', count_column='count', workers=2)
+
+    docs = [
+        {'doc_id': 1, 'text': 'hello, my little WORLD'},
+        {'doc_id': 2, 'text': 'Hello, my little little hell'}
+    ]
+
+    expected = [
+        {'count': 1, 'text': 'hell'},
+        {'count': 1, 'text': 'world'},
+        {'count': 2, 'text': 'hello'},
+        {'count': 2, 'text': 'my'},
+        {'count': 3, 'text': 'little'}
+    ]
+
+    result = graph.run(docs=lambda: iter(docs))
+
+    assert list(result) == expected
+
+
+def test_tf_idf_parallel() -> None:
+    graph = algorithms.inverted_index_graph('texts', doc_column='doc_id', text_column='text', result_column='tf_idf',
+                                            workers=2)
+
+    rows = [
+        {'doc_id': 1, 'text': 'hello, little world'},
+        {'doc_id': 2, 'text': 'little'},
+        {'doc_id': 3, 'text': 'little little little'},
+        {'doc_id': 4, 'text': 'little? hello little world'},
+        {'doc_id': 5, 'text': 'HELLO HELLO! WORLD...'},
+        {'doc_id': 6, 'text': 'world? world... world!!! WORLD!!! HELLO!!!'}
+    ]
+
+    expected = [
+        {'doc_id': 1, 'text': 'hello', 'tf_idf': approx(0.1351, 0.001)},
+        {'doc_id': 1, 'text': 'world', 'tf_idf': approx(0.1351, 0.001)},
+
+        {'doc_id': 2, 'text': 'little', 'tf_idf': approx(0.4054, 0.001)},
+
+        {'doc_id': 3, 'text': 'little', 'tf_idf': approx(0.4054, 0.001)},
+
+        {'doc_id': 4, 'text': 'hello', 'tf_idf': approx(0.1013, 0.001)},
+        {'doc_id': 4, 'text': 'little', 'tf_idf': approx(0.2027, 0.001)},
+
+        {'doc_id': 5, 'text': 'hello', 'tf_idf': approx(0.2703, 0.001)},
+        {'doc_id': 5, 'text': 'world', 'tf_idf': approx(0.1351, 0.001)},
+
+        {'doc_id': 6, 'text': 'world', 'tf_idf': approx(0.3243, 0.001)}
+    ]
+
+    result = graph.run(texts=lambda: iter(rows))
+
+    assert sorted(result, key=itemgetter('doc_id', 'text')) == expected
+
+
 def test_pmi() -> None:
     graph = algorithms.pmi_graph('texts', doc_column='doc_id', text_column='text', result_column='pmi')
 
@@ -88,6 +88,24 @@ def test_heavy_join(func_joiner: ops.Joiner, additional_memory: int, baseline_me
     run_and_track_memory(lambda: next(op), baseline_memory + additional_memory)
 
 
+def get_skewed_join_data(hot_rows: int) -> tp.Generator[dict[str, tp.Any], None, None]:
+    time.sleep(0.1)  # Some sleep for watchdog catch the memory change
+    for i in range(hot_rows):
+        yield {'key': 'hot', 'value': i}
+    yield {'key': 'rare', 'value': 0}
+
+
+@pytest.mark.parametrize('func_joiner, left_hot_rows', [
+    (ops.InnerJoiner(memory_limit=4 * MiB), 1),
+    (ops.OuterJoiner(memory_limit=4 * MiB), 1),
+    (ops.InnerJoiner(memory_limit=4 * MiB), 100000),
+    (ops.LeftJoiner(memory_limit=4 * MiB), 100000),
+])
+def test_skewed_join(func_joiner: ops.Joiner, left_hot_rows: int, baseline_memory: int) -> None:
+    op = ops.Join(func_joiner, ('key', ))(get_skewed_join_data(left_hot_rows), get_skewed_join_data(1000000))
+    run_and_track_memory(lambda: next(op), baseline_memory + 10 * MiB)
+
+
 def get_complexity_join_data() -> tp.Generator[dict[str, tp.Any], None, None]:
     for n in range(100500):
         yield {'key': n, 'value': n}
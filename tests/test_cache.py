@@ -0,0 +1,115 @@
+import json
+import multiprocessing
+import sys
+import typing as tp
+from pathlib import Path
+
+import pytest
+from compgraph import cache
+from compgraph import operations as ops
+from compgraph import readers
+from compgraph.graph import Graph
+
+
+def test_result_cache(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    path = tmp_path / 'rows.jsonl'
+    path.write_text(''.join(json.dumps({'doc_id': i, 'text': f'hello world {i % 3}'}) + '\n' for i in range(100)))
+    cache_dir = (tmp_path / 'cache').as_posix()
+    # Code of reader is fingerprinted, so it is patched before the first run; bound append keeps calls out of it
+    calls: list[int] = []
+    read = readers.ReadJsonLines.__call__
+    monkeypatch.setattr(readers.ReadJsonLines, '__call__',
+                        lambda self, *args, record=calls.append: record(1) or read(self, *args))
+
+    def build(keys: list[str]) -> Graph:
+        words = Graph.graph_from_jsonl(path.as_posix()).map(ops.Tokenize('text')).cache()
+        return words.sort(keys).reduce(ops.Count('count'), keys)
+
+    expected = list(build(['text']).run())
+    assert list(build(['text']).run(cache_dir=cache_dir)) == expected
+    assert len(cache.ResultCache(cache_dir)._index) == 2
+
+    # Unchanged file is not read again: the whole result, or the cached words for another tail, are reused
+    calls.clear()
+    assert list(build(['text']).run(cache_dir=cache_dir)) == expected
+    assert list(build(['doc_id', 'text']).run(cache_dir=cache_dir)) == list(build(['doc_id', 'text']).run())
+    assert len(calls) == 1
+
+    # Changed input is recomputed
+    with path.open('a') as file:
+        file.write(json.dumps({'doc_id': 100, 'text': 'bye'}) + '\n')
+    assert {'text': 'bye', 'count': 1} in list(build(['text']).run(cache_dir=cache_dir))
+    assert len(calls) == 2
+
+    # Sources of run are not fingerprinted, such graphs are not cached
+    rows = [{'text': 'a'}]
+    graph = Graph.graph_from_iter('rows').map(ops.Tokenize('text')).cache()
+    assert list(graph.run(cache_dir=cache_dir, rows=lambda: iter(rows))) == rows
+
+
+THRESHOLD = 2
+
+
+def _above_threshold(row: dict[str, tp.Any]) -> bool:
+    return bool(row['x'] > THRESHOLD)
+
+
+def test_fingerprint_covers_code(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    path = tmp_path / 'rows.jsonl'
+    path.write_text(json.dumps({'x': 1}) + '\n')
+    files = cache.FileHashes((tmp_path / 'files.json').as_posix())
+
+    def key(mapper: ops.Mapper) -> str | None:
+        return cache.fingerprint(Graph.graph_from_jsonl(path.as_posix()).map(mapper), files)
+
+    # Classes of the same name differ by code of their methods and of methods of their bases
+    classes = []
+    for factor in (2, 3):
+        namespace: dict[str, tp.Any] = {'__name__': 'mappers', 'ops': ops}
+        exec(f'class Base(ops.Mapper):\n    def scale(self, x):\n        return x * {factor}\n'
+             'class Scale(Base):\n    def __call__(self, row):\n        yield {"x": self.scale(row["x"])}\n', namespace)
+        classes.append(namespace['Scale'])
+    assert key(classes[0]()) == key(classes[0]())
+    assert key(classes[0]()) != key(classes[1]())
+
+    # Globals read by functions are part of fingerprint
+    before = key(ops.Filter(_above_threshold))
+    assert key(ops.Filter(_above_threshold)) == before
+    monkeypatch.setattr(sys.modules[__name__], 'THRESHOLD', 3)
+    assert key(ops.Filter(_above_threshold)) != before
+
+    # Methods of standard library objects are described by their class: state of default multiprocessing
+    # context, which is exposed as module level functions, is set up when first used
+    context = multiprocessing.context.DefaultContext(multiprocessing.get_context())
+
+    def keep(row: ops.TRow, pipe: tp.Callable[..., tp.Any] = context.Pipe) -> bool:
+        return True
+
+    before = key(ops.Filter(keep))
+    context.get_context()
+    assert key(ops.Filter(keep)) == before
+
+
+def test_result_cache_eviction(tmp_path: Path) -> None:
+    def rows(key: str) -> list[dict[str, tp.Any]]:
+        return [{'i': i, 'key': key} for i in range(100)]
+
+    entry = cache.ResultCache((tmp_path / 'measure').as_posix())
+    list(entry.store('a', rows('a')))
+    # Room for two entries
+    result_cache = cache.ResultCache((tmp_path / 'cache').as_posix(), max_bytes=entry.size * 5 // 2)
+    for key in 'abc':
+        assert list(result_cache.store(key, iter(rows(key)))) == rows(key)
+        assert result_cache.size <= result_cache.max_bytes
+        if key == 'b':
+            result_cache.get('a')
+    # Touched entry is kept, the least recently used one is evicted
+    assert result_cache.get('b') is None
+    assert list(result_cache.get('a') or []) == rows('a')
+    assert list(result_cache.get('c') or []) == rows('c')
+
+    # Entry is stored only when output is read till the end
+    stored = result_cache.store('e', ({'i': i} for i in range(10)))
+    next(stored)
+    stored.close()
+    assert result_cache.get('e') is None
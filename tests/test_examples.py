@@ -111,6 +111,24 @@ def test_multiple_call_pmi() -> None:
     assert list(result2) == expected2
 
 
+def test_yandex_maps_sorted_by_weekday_and_hour() -> None:
+    graph = algorithms.yandex_maps_graph('travel_time', 'edge_length')
+    lengths = [
+        {'start': [37.84870228730142, 55.73853974696249], 'end': [37.8490418381989, 55.73832445777953],
+         'edge_id': 1}
+    ]
+    times = [
+        {'leave_time': '20171020T112238.723000', 'enter_time': '20171020T112237.427000', 'edge_id': 1},
+        {'leave_time': '20171011T145553.040000', 'enter_time': '20171011T145551.957000', 'edge_id': 1},
+        {'leave_time': '20171020T090548.939000', 'enter_time': '20171020T090547.463000', 'edge_id': 1},
+        {'leave_time': '20171024T144101.879000', 'enter_time': '20171024T144059.102000', 'edge_id': 1}
+    ]
+
+    result = graph.run(travel_time=lambda: iter(times), edge_length=lambda: iter(lengths))
+
+    assert [(row['weekday'], row['hour']) for row in result] == [('Fri', 9), ('Fri', 11), ('Tue', 14), ('Wed', 14)]
+
+
 def test_multiple_call_yandex_maps() -> None:
     graph = algorithms.yandex_maps_graph(
         'travel_time', 'edge_length',
@@ -211,6 +229,22 @@ def test_word_count_from_file(word_count_input_file: Path, output_file: Path) ->
     assert list(output) == expected
 
 
+def test_word_count_from_file_parallel(word_count_input_file: Path, output_file: Path) -> None:
+    runner = CliRunner()
+    result = runner.invoke(run_word_count.main, [word_count_input_file.as_posix(), output_file.as_posix(),
+                                                 '--workers', '3'])
+    assert result.exit_code == 0
+
+    expected = [
+        {'count': 5, 'text': 'hi'},
+        {'count': 6, 'text': 'aboba'},
+        {'count': 6, 'text': 'baobab'}
+    ]
+
+    output = ops.Read(output_file.as_posix(), lambda line: json.loads(line))()
+    assert list(output) == expected
+
+
 @pytest.fixture(scope='session')
 def tf_idf_input_file(tmp_path_factory) -> Path:  # type: ignore
     input_path = tmp_path_factory.mktemp('data') / 'input.txt'
@@ -328,3 +362,22 @@ def test_yandex_maps_from_file(time_maps_input_file: Path, len_maps_input_file:
 
     output = ops.Read(output_file.as_posix(), lambda line: json.loads(line))()
     assert sorted(output, key=itemgetter('weekday', 'hour')) == expected
+
+
+def test_yandex_maps_from_file_parallel(time_maps_input_file: Path, len_maps_input_file: Path,
+                                        output_file: Path) -> None:
+    runner = CliRunner()
+    result = runner.invoke(run_yandex_maps_graph.main,
+                           [time_maps_input_file.as_posix(), len_maps_input_file.as_posix(), output_file.as_posix(),
+                            '--workers', '2'])
+    assert result.exit_code == 0
+
+    expected = [
+        {'weekday': 'Fri', 'hour': 8, 'speed': approx(62.2322, 0.001)},
+        {'weekday': 'Sat', 'hour': 13, 'speed': approx(100.9690, 0.001)},
+        {'weekday': 'Sun', 'hour': 13, 'speed': approx(21.8577, 0.001)},
+        {'weekday': 'Tue', 'hour': 6, 'speed': approx(105.3901, 0.001)}
+    ]
+
+    output = ops.Read(output_file.as_posix(), lambda line: json.loads(line))()
+    assert sorted(output, key=itemgetter('weekday', 'hour')) == expected
@@ -1,5 +1,19 @@
+import json
+import sys
+import typing as tp
+from copy import deepcopy
+from itertools import islice
+from pathlib import Path
+
+import pytest
+from compgraph import columnar
 from compgraph import external_sort
+from compgraph import hash_reduce
 from compgraph import operations as ops
+from compgraph import parallel
+from compgraph import planner
+from compgraph import readers
+from compgraph import spill
 from compgraph.graph import Graph
 
 
@@ -103,3 +117,463 @@ def test_join() -> None:
     assert graph_b_after._prev_node == graph_b_before
     assert graph_b_after._join_graph == graph_a_before
     assert list(graph_b_after.run(test_sort_a=lambda: iter(rows_a), test_sort_b=lambda: iter(rows_b))) == expected
+
+
+def test_sort_spills_to_disk(tmp_path: Path) -> None:
+    rows = [{'test_id': i, 'value': (i * 7919) % 1000} for i in range(1000)]
+    keys = ['value', 'test_id']
+    expected = sorted(rows, key=lambda r: (r['value'], r['test_id']))
+
+    graph = Graph.graph_from_iter('test_sort').sort(keys, memory_limit=4 * 1024, tmp_dir=tmp_path.as_posix())
+    assert isinstance(graph._op, external_sort.ExternalSort)
+    assert graph._op.memory_limit == 4 * 1024
+    assert list(graph.run(test_sort=lambda: iter(rows))) == expected
+
+
+def test_sort_rows_multi_pass_merge(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(external_sort, 'MERGE_FAN_IN', 3)
+    rows = [{'test_id': i, 'value': (i * 31) % 17} for i in range(200)]
+    expected = sorted(rows, key=lambda r: r['value'])
+
+    assert list(external_sort.sort_rows(iter(rows), ['value'], memory_limit=1)) == expected
+
+
+@pytest.mark.parametrize('batch_rows', [1, 3, 1024])
+def test_external_sort_batches(batch_rows: int) -> None:
+    rows = [{'test_id': i, 'value': (i * 13) % 10} for i in range(50)]
+    expected = sorted(rows, key=lambda r: r['value'])
+
+    assert list(external_sort.ExternalSort(['value'], batch_rows=batch_rows)(iter(rows))) == expected
+
+
+def test_external_sort_passes_sorted_rows(monkeypatch: pytest.MonkeyPatch) -> None:
+    rows = [{'test_id': i, 'value': i // 3} for i in range(50)]
+    sort = external_sort.ExternalSort(['value'])
+    monkeypatch.setattr(external_sort, 'Process', None)
+
+    assert list(sort(iter(rows))) == rows
+    assert sort.stats.passed_through and sort.stats.runs == 1 and sort.stats.rows == 50
+
+
+def test_external_sort_probe_is_bounded_by_memory_limit() -> None:
+    rows = [{'test_id': i, 'value': i} for i in range(300)]
+    sort = external_sort.ExternalSort(['value'], memory_limit=1024)
+
+    assert list(sort(iter(rows))) == rows
+    assert not sort.stats.passed_through and sort.stats.runs == 1
+
+
+@pytest.mark.parametrize('probe_bytes, runs', [(1, 1), (1, 3), (external_sort.PROBE_BYTES, 3)])
+def test_external_sort_detects_runs(probe_bytes: int, runs: int) -> None:
+    rows = [{'test_id': i, 'value': i % (300 // runs)} for i in range(300)]
+    expected = sorted(rows, key=lambda r: r['value'])
+    sort = external_sort.ExternalSort(['value'], memory_limit=1024, probe_bytes=probe_bytes)
+
+    assert list(sort(iter(rows))) == expected
+    assert not sort.stats.passed_through and sort.stats.runs == runs and sort.stats.rows == 300
+    # Natural runs are spilled without being split by memory limit
+    assert sort.stats.spilled == runs
+
+
+def test_shared_node_runs_once() -> None:
+    reads = []
+
+    def source() -> tp.Iterator[ops.TRow]:
+        reads.append(1)
+        return iter([{'test_id': i, 'text': 'a b'} for i in range(3)])
+
+    shared = Graph.graph_from_iter('texts').map(ops.Split('text')).sort(['text'])
+    counts = shared.reduce(ops.Count('count'), ['text'])
+    graph = shared.join(ops.InnerJoiner(), counts, ['text'])
+
+    result = list(graph.run(texts=source))
+    assert len(reads) == 1
+    assert len(result) == 6
+    assert all(row['count'] == 3 for row in result)
+
+
+@pytest.mark.parametrize('buffer_rows', [1, 7, 1000])
+def test_fanout_drifting_consumers(buffer_rows: int) -> None:
+    rows = [{'test_id': i} for i in range(100)]
+    fanout = planner.Fanout(iter(rows), consumers=3, buffer_rows=buffer_rows)
+    first, second, third = fanout.reader(), fanout.reader(), fanout.reader()
+
+    assert list(islice(first, 10)) == rows[:10]
+    assert list(second) == rows
+    assert list(first) == rows[10:]
+    assert list(third) == rows
+
+
+class _SetTestId(ops.Mapper):
+    def __call__(self, row: ops.TRow) -> ops.TRowsGenerator:
+        row['test_id'] = 2
+        yield row
+
+
+def test_fanout_branches_do_not_change_rows_of_each_other() -> None:
+    # Fanout shares rows between consumers, maps changing rows in place get copies of them
+    shared = Graph.graph_from_iter('rows').map(ops.DummyMapper())
+    graph = shared.map(_SetTestId()).join(ops.InnerJoiner(), shared, keys=[])
+    assert list(graph.run(rows=lambda: iter([{'test_id': 1}]))) == [{'test_id_1': 2, 'test_id_2': 1}]
+
+
+def test_join_unknown_strategy() -> None:
+    with pytest.raises(ValueError):
+        Graph.graph_from_iter('rows_a').join(ops.InnerJoiner(), Graph.graph_from_iter('rows_b'), ['key'],
+                                             strategy='nested')
+
+
+@pytest.mark.parametrize('reducer, keys', [
+    (ops.Count('count'), ['key']),
+    (ops.Count('count'), []),
+    (ops.Sum('value'), ['key']),
+    (ops.FirstReducer(), ['key']),
+    (ops.TermFrequency('word'), ['key']),
+    (ops.TermFrequency('word'), []),
+])
+@pytest.mark.parametrize('memory_limit', [1, 1024 * 1024])
+def test_hash_reduce(reducer: ops.Reducer, keys: list[str], memory_limit: int) -> None:
+    rows = [{'key': (i * 7) % 5, 'value': i, 'word': f'w{i % 3}'} for i in range(50)]
+    graph = Graph.graph_from_iter('rows')
+
+    sorted_reduce = graph.sort(keys or ['key']).reduce(reducer, keys)
+    hash_reduce = graph.reduce(reducer, keys, mode='hash', memory_limit=memory_limit)
+
+    def run(graph: Graph) -> list[ops.TRow]:
+        return sorted(graph.run(rows=lambda: iter(rows)), key=repr)
+
+    assert run(hash_reduce) == run(sorted_reduce)
+
+
+def test_hash_reduce_counts_growing_states(monkeypatch: pytest.MonkeyPatch) -> None:
+    spills: list[int] = []
+    spill_groups = hash_reduce.HashReduce._spill
+
+    def counted_spill(groups: dict[hash_reduce.TKey, hash_reduce.TGroup],
+                      partitions: list[spill.SpillFile[tuple[hash_reduce.TKey, ops.TRow, tp.Any]]]) -> None:
+        spills.append(1)
+        spill_groups(groups, partitions)
+
+    monkeypatch.setattr(hash_reduce.HashReduce, '_spill', staticmethod(counted_spill))
+    # Single group whose state grows with every new word
+    rows = [{'key': 0, 'word': f'w{i}'} for i in range(5000)]
+    graph = Graph.graph_from_iter('rows').reduce(ops.TermFrequency('word'), ['key'], mode='hash',
+                                                 memory_limit=64 * 1024)
+    result = list(graph.run(rows=lambda: iter(rows)))
+    assert len(spills) > 1
+    assert sorted(result, key=repr) == sorted(({'key': 0, 'word': f'w{i}', 'tf': 1 / 5000} for i in range(5000)),
+                                              key=repr)
+
+
+def test_hash_reduce_needs_mergeable_reducer() -> None:
+    with pytest.raises(TypeError):
+        Graph.graph_from_iter('rows').reduce(ops.TopN('value', 3), ['key'], mode='hash')
+
+
+def test_reduce_with_combiner() -> None:
+    rows = [{'doc_id': i, 'text': f'w{i % 4}'} for i in range(40)]
+    sorted_graph = Graph.graph_from_iter('rows').sort(['text'])
+
+    plain = sorted_graph.reduce(ops.Count('count'), ['text'])
+    combined = sorted_graph.reduce(ops.Count('count'), ['text'], combine=True)
+    assert isinstance(combined._op, ops.Reduce)
+    assert isinstance(combined._op.reducer, ops.MergePartials)
+
+    assert list(combined.run(rows=lambda: iter(rows))) == list(plain.run(rows=lambda: iter(rows)))
+
+
+def test_hash_reduce_with_combiner() -> None:
+    rows = [{'doc_id': i, 'text': f'w{i % 4}'} for i in range(40)]
+    graph = Graph.graph_from_iter('rows')
+
+    plain = graph.reduce(ops.Count('count'), ['text'], mode='hash')
+    # Input is not sorted, partial aggregates are hashed instead
+    combined = graph.reduce(ops.Count('count'), ['text'], mode='hash', combine=True)
+    assert isinstance(combined._op, hash_reduce.HashReduce)
+    assert isinstance(combined._op.reducer, ops.MergePartials)
+
+    assert list(combined.run(rows=lambda: iter(rows))) == list(plain.run(rows=lambda: iter(rows)))
+
+
+def test_combiner_needs_sort_by_reduce_keys() -> None:
+    with pytest.raises(ValueError):
+        Graph.graph_from_iter('rows').sort(['doc_id']).reduce(ops.Count('count'), ['text'], combine=True)
+    with pytest.raises(TypeError):
+        Graph.graph_from_iter('rows').sort(['text']).reduce(ops.TopN('text', 1), ['text'], combine=True)
+
+
+@pytest.mark.parametrize('ordered', [True, False])
+def test_parallel_map(ordered: bool) -> None:
+    rows = [{'test_id': i, 'text': f'Hello World {i}'} for i in range(5000)]
+    graph = Graph.graph_from_iter('rows') \
+        .map(ops.LowerCase('text'), workers=3, ordered=ordered) \
+        .map(ops.Split('text'), workers=3, ordered=ordered) \
+        .map(ops.Filter(lambda row: row['text'] != 'hello'), workers=3, ordered=ordered)
+    expected = [{'test_id': i, 'text': text} for i in range(5000) for text in ('world', str(i))]
+
+    result = list(graph.run(rows=lambda: iter(rows)))
+    if ordered:
+        assert result == expected
+    else:
+        assert sorted(result, key=repr) == sorted(expected, key=repr)
+
+
+def test_parallel_maps_are_fused() -> None:
+    first = Graph.graph_from_iter('rows').map(ops.LowerCase('text'), workers=2)
+    second = first.map(ops.Split('text'), workers=2)
+    assert isinstance(first._op, parallel.ParallelMap) and isinstance(second._op, parallel.ParallelMap)
+
+    fused = first._op.fuse(second._op)
+    assert isinstance(fused, parallel.ParallelMap)
+    assert fused.mappers == [first._op.mappers[0], second._op.mappers[0]]
+    assert first._op.fuse(parallel.ParallelMap([ops.DummyMapper()], workers=3)) is None
+
+
+def test_parallel_map_error() -> None:
+    graph = Graph.graph_from_iter('rows').map(ops.Calculate(lambda row: 1 / row['n'], 'inverse'), workers=2,
+                                              ordered=False)
+    with pytest.raises(ZeroDivisionError):
+        list(graph.run(rows=lambda: iter([{'n': 0}])))
+
+
+@pytest.mark.parametrize('reducer, mode, combine', [
+    (ops.Count('count'), 'sort', False),
+    (ops.Count('count'), 'hash', False),
+    (ops.Count('count'), 'hash', True),
+    (ops.TermFrequency('word'), 'sort', True),
+    (ops.TopN('value', 2), 'sort', False),
+])
+@pytest.mark.parametrize('ordered', [True, False])
+def test_partitioned_reduce(reducer: ops.Reducer, mode: str, combine: bool, ordered: bool) -> None:
+    rows = [{'key': (i * 7) % 23, 'value': i, 'word': f'w{i % 3}'} for i in range(3000)]
+    graph = Graph.graph_from_iter('rows')
+
+    sorted_reduce = graph.sort(['key']).reduce(reducer, ['key'])
+    partitioned = graph.reduce(reducer, ['key'], mode=mode, combine=combine, workers=3, ordered=ordered,
+                               memory_limit=1024)
+    assert isinstance(partitioned._op, parallel.PartitionedReduce)
+
+    expected = list(sorted_reduce.run(rows=lambda: iter(rows)))
+    result = list(partitioned.run(rows=lambda: iter(rows)))
+    if ordered:
+        assert [row['key'] for row in result] == [row['key'] for row in expected]
+    assert sorted(result, key=repr) == sorted(expected, key=repr)
+
+
+def test_maps_are_fused() -> None:
+    rows = [{'test_id': i, 'text': f'Hello, World {i}!'} for i in range(100)]
+    graph = Graph.graph_from_iter('rows') \
+        .map(ops.FilterPunctuation('text')) \
+        .map(ops.LowerCase('text')) \
+        .map(ops.Split('text')) \
+        .map(ops.Filter(lambda row: row['text'] != 'hello'))
+
+    fused, prev_node = planner.Execution(graph, {})._fuse(graph._op, graph._prev_node)
+    assert isinstance(fused, ops.Map)
+    assert len(fused.mappers) == 4
+    assert prev_node is not None and prev_node._prev_node is None
+
+    expected = [{'test_id': i, 'text': text} for i in range(100) for text in ('world', str(i))]
+    assert list(graph.run(rows=lambda: iter(rows))) == expected
+
+
+def test_batch_map() -> None:
+    rows = [{'id': i, 'a': i % 7, 'b': 0.5 * i, 'start': [37.84870228730142, 55.73853974696249],
+             'end': [37.8490418381989 + i / 1000, 55.73832445777953]} for i in range(100)]
+    row_graph = Graph.graph_from_iter('rows') \
+        .map(ops.Filter(lambda row: row['a'] != 3)) \
+        .map(ops.CalculateLength('start', 'end', 'length')) \
+        .map(ops.Product(['a', 'b'], 'product')) \
+        .map(ops.Calculate(lambda row: row['id'] % 2, 'parity')) \
+        .map(ops.Project(['id', 'length', 'product', 'parity']))
+    batch_graph = Graph.graph_from_iter('rows') \
+        .map_batch(columnar.BatchFilter(lambda batch: [a != 3 for a in batch['a']]), batch_rows=16) \
+        .map_batch(columnar.BatchCalculateLength('start', 'end', 'length'), batch_rows=16) \
+        .map_batch(columnar.BatchProduct(['a', 'b'], 'product'), batch_rows=16) \
+        .map_batch(ops.Calculate(lambda row: row['id'] % 2, 'parity'), batch_rows=16) \
+        .map_batch(columnar.BatchProject(['id', 'length', 'product', 'parity']), batch_rows=16)
+
+    fused, _ = planner.Execution(batch_graph, {})._fuse(batch_graph._op, batch_graph._prev_node)
+    assert isinstance(fused, columnar.BatchMap) and len(fused.mappers) == 5
+
+    expected = list(row_graph.run(rows=lambda: iter(deepcopy(rows))))
+    result = list(batch_graph.run(rows=lambda: iter(deepcopy(rows))))
+    assert result == [row | {'length': pytest.approx(row['length'])} for row in expected]
+
+
+def test_batch_product_keeps_integers() -> None:
+    pytest.importorskip('numpy')
+    rows = [{'a': i, 'b': i + 1, 'c': 0.5} for i in range(20)]
+    for columns in (['a', 'b'], ['a'], [], ['a', 'c']):
+        batch_graph = Graph.graph_from_iter('rows').map_batch(columnar.BatchProduct(columns), batch_rows=8)
+        row_graph = Graph.graph_from_iter('rows').map(ops.Product(columns))
+        result = list(batch_graph.run(rows=lambda: iter(deepcopy(rows))))
+        assert result == list(row_graph.run(rows=lambda: iter(deepcopy(rows))))
+        assert [type(row['product']) for row in result] == [float if 'c' in columns else int] * len(rows)
+
+
+@pytest.mark.parametrize('keys', [['key'], []])
+def test_batch_sum(keys: list[str]) -> None:
+    rows = [{'key': i % 5 if i % 3 else 'x', 'value': i} for i in range(100)]
+    graph = Graph.graph_from_iter('rows')
+    expected = graph.reduce(ops.Sum('value'), keys, mode='hash')
+    result = graph.map_batch(ops.DummyMapper(), batch_rows=16) \
+        .reduce_batch(columnar.BatchSum('value'), keys, batch_rows=16)
+
+    fused, prev_node = planner.Execution(result, {})._fuse(result._op, result._prev_node)
+    assert isinstance(fused, columnar.BatchReduce) and prev_node is not None and prev_node._prev_node is None
+    assert list(result.run(rows=lambda: iter(rows))) == list(expected.run(rows=lambda: iter(rows)))
+
+
+def test_input_rows_are_not_changed() -> None:
+    rows = [{'test_id': 1, 'text': 'Hello World'}]
+    source = Graph.graph_from_iter('rows')
+    lower = source.map(ops.LowerCase('text'))
+    graph = lower.join(ops.InnerJoiner(), source.map(ops.Calculate(lambda row: len(row['text']), 'length')),
+                       keys=['test_id'])
+
+    result = list(graph.run(rows=lambda: iter(rows)))
+    assert result == [{'test_id': 1, 'text_1': 'hello world', 'text_2': 'Hello World', 'length': 11}]
+    assert all(type(row) is dict for row in result)
+    assert rows == [{'test_id': 1, 'text': 'Hello World'}]
+
+    # Rows are not wrapped for mappers which do not change them
+    graph = Graph.graph_from_iter('rows').map(ops.Filter(lambda row: bool(json.dumps(row))))
+    assert list(graph.run(rows=lambda: iter(rows))) == rows
+    assert list(Graph.graph_from_iter('rows').map(ops.LowerCase('text')).run(rows=lambda: iter(rows))) == \
+        [{'test_id': 1, 'text': 'hello world'}]
+    assert rows == [{'test_id': 1, 'text': 'Hello World'}]
+
+    # Mappers changing rows in place get plain dicts
+    graph = Graph.graph_from_iter('rows').map(ops.Calculate(lambda row: isinstance(row, dict) and json.dumps(row), 'j'))
+    assert list(graph.run(rows=lambda: iter(rows))) == [rows[0] | {'j': json.dumps(rows[0])}]
+    assert rows == [{'test_id': 1, 'text': 'Hello World'}]
+
+
+@pytest.mark.parametrize('strategy', ['sort', 'hash'])
+def test_outer_join_passes_shared_rows_through(strategy: str) -> None:
+    rows = [{'test_id': 1, 't': 'AA'}]
+    shared = Graph.graph_from_iter('rows').sort(['test_id'])
+    empty = Graph.graph_from_iter('empty').sort(['test_id'])
+    lower = shared.join(ops.LeftJoiner(), empty, ['test_id'], strategy=strategy).map(ops.LowerCase('t'))
+    graph = lower.join(ops.InnerJoiner(), shared, ['test_id'], strategy=strategy)
+
+    assert list(graph.run(rows=lambda: iter(rows), empty=lambda: iter([]))) == \
+        [{'test_id': 1, 't_1': 'aa', 't_2': 'AA'}]
+    assert rows == [{'test_id': 1, 't': 'AA'}]
+
+
+@pytest.mark.parametrize('block_size', [7, 1024 * 1024])
+@pytest.mark.parametrize('trailing_newline', [True, False])
+def test_graph_from_jsonl(tmp_path: Path, block_size: int, trailing_newline: bool) -> None:
+    rows = [{'doc_id': i, 'text': f'Привет, мир {i}', 'nested': {'values': [i, i / 2]}} for i in range(100)]
+    text = '\n'.join(json.dumps(row) for row in rows) + ('\n' if trailing_newline else '')
+    path = tmp_path / 'rows.jsonl'
+    path.write_text(text, encoding='utf-8')
+
+    graph = Graph.graph_from_jsonl(path.as_posix(), block_size=block_size)
+    assert list(graph.run()) == rows
+    assert isinstance(graph._op, readers.ReadJsonLines)
+    assert graph._op.stats.rows == len(rows)
+    assert graph._op.stats.bytes == len(text.encode())
+
+
+def test_read_lines_without_fast_parser(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setitem(sys.modules, 'orjson', None)
+    monkeypatch.setitem(sys.modules, 'ujson', None)
+    loads = readers._json_loads()
+    assert loads('{"a": [1, 2.5, "ю"]}'.encode()) == {'a': [1, 2.5, 'ю']}
+
+
+def test_read_lines_json_only_values() -> None:
+    row = readers.loads(b'{"a": NaN, "b": -Infinity, "c": 18446744073709551616}')
+    assert row['a'] != row['a'] and row['b'] == float('-inf') and row['c'] == 2 ** 64
+    with pytest.raises(ValueError):
+        readers.loads(b'{"a": ')
+
+
+@pytest.mark.parametrize('lines', [0, 1, 2, 5, 1000])
+@pytest.mark.parametrize('parts', [1, 2, 7])
+def test_byte_ranges(tmp_path: Path, lines: int, parts: int) -> None:
+    path = tmp_path / 'lines.txt'
+    path.write_bytes(b''.join(b'x' * (i % 13) + b'\n' for i in range(lines)))
+    ranges = readers.byte_ranges(path.as_posix(), parts)
+
+    content = path.read_bytes()
+    assert b''.join(content[start:end] for start, end in ranges) == content
+    assert len(ranges) <= parts
+    for start, end in ranges:
+        assert start == 0 or content[start - 1:start] == b'\n'
+
+
+def test_parallel_read(tmp_path: Path) -> None:
+    rows = [{'doc_id': i, 'text': f'Hello World {i}'} for i in range(5000)]
+    path = tmp_path / 'rows.jsonl'
+    path.write_text(''.join(json.dumps(row) + '\n' for row in rows))
+
+    jsonl = Graph.graph_from_jsonl(path.as_posix(), block_size=1000, workers=3)
+    assert sorted(jsonl.run(), key=repr) == sorted(rows, key=repr)
+
+    graph = Graph.graph_from_file(path.as_posix(), json.loads, workers=3) \
+        .map(ops.LowerCase('text'), workers=3) \
+        .map(ops.Split('text'), workers=3)
+    fused, prev_node = planner.Execution(graph, {})._fuse(graph._op, graph._prev_node)
+    assert isinstance(fused, parallel.ParallelRead) and prev_node is None
+    assert len(fused.mappers) == 2
+
+    expected = [{'doc_id': i, 'text': text} for i in range(5000) for text in ('hello', 'world', str(i))]
+    assert sorted(graph.run(), key=repr) == sorted(expected, key=repr)
+
+
+def test_parallel_read_gives_lines_as_read(tmp_path: Path) -> None:
+    path = tmp_path / 'lines.txt'
+    path.write_bytes(b''.join(b'line %d\r\n' % i if i % 3 else b'\n' for i in range(300)) + b'last')
+
+    def lines(workers: int) -> list[ops.TRow]:
+        return sorted(Graph.graph_from_file(path.as_posix(), lambda line: {'line': line}, workers=workers).run(),
+                      key=repr)
+
+    assert lines(3) == lines(1)
+
+
+def test_sort_elision(monkeypatch: pytest.MonkeyPatch) -> None:
+    rows = [{'a': i // 10, 'b': i % 10, 'text': f'Hello {i}'} for i in reversed(range(100))]
+    sorted_rows = Graph.graph_from_iter('rows').sort(['a', 'b'])
+    graph = sorted_rows \
+        .map(ops.Filter(lambda row: row['b'] % 2 == 0)) \
+        .map(ops.LowerCase('text')) \
+        .sort(['a']) \
+        .reduce(ops.Count('count'), keys=['a']) \
+        .sort(['a'])
+    assert sorted_rows.ordering == ops.Ordering(['a', 'b'], ['a', 'b'])
+    assert graph.ordering == ops.Ordering(['a'], ['a'])
+    assert graph.map(ops.Calculate(lambda row: -row['a'], 'a')).ordering == ops.Ordering()
+
+    sorts: list[tp.Sequence[str]] = []
+    sort = external_sort.ExternalSort.__call__
+
+    def recorded_sort(self: external_sort.ExternalSort, rows: ops.TRowsIterable, *args: tp.Any,
+                      **kwargs: tp.Any) -> ops.TRowsGenerator:
+        sorts.append(self.keys)
+        return sort(self, rows, *args, **kwargs)
+
+    monkeypatch.setattr(external_sort.ExternalSort, '__call__', recorded_sort)
+    assert list(graph.run(rows=lambda: iter(rows))) == [{'a': a, 'count': 5} for a in range(10)]
+    assert sorts == [['a', 'b']]
+
+
+def test_order_is_checked_when_graph_is_built() -> None:
+    rows = Graph.graph_from_iter('rows')
+    by_b = rows.sort(['b'])
+    with pytest.raises(ValueError):
+        by_b.reduce(ops.Count('count'), keys=['a'])
+    with pytest.raises(ValueError):
+        by_b.join(ops.InnerJoiner(), rows.sort(['a']), keys=['a'])
+    with pytest.raises(ValueError):
+        rows.join(ops.InnerJoiner(), rows.sort(['a', 'b']), keys=['b', 'a'])
+
+    # Unknown order is trusted, rows of data sources may come sorted
+    rows.reduce(ops.Count('count'), keys=['a'])
+    rows.sort(['a', 'b']).reduce(ops.Count('count'), keys=['b', 'a'])
+    rows.reduce(ops.Count('count'), keys=['a'], mode='hash').reduce(ops.TopN('count', 1), keys=['a'])
+    rows.reduce(ops.Count('count'), keys=['a']).join(ops.InnerJoiner(), rows, keys=['a'])
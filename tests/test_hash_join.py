@@ -0,0 +1,82 @@
+import typing as tp
+
+import pytest
+from compgraph import operations as ops
+from compgraph.graph import Graph
+
+
+def _join_rows() -> tuple[list[ops.TRow], list[ops.TRow]]:
+    rows_a = [{'key': (i * 7) % 23, 'a': i} for i in range(60)]
+    rows_b = [{'key': (i * 5) % 31, 'b': i} for i in range(25)]
+    return rows_a, rows_b
+
+
+@pytest.mark.parametrize('joiner', [ops.InnerJoiner(), ops.LeftJoiner(), ops.RightJoiner(), ops.OuterJoiner()])
+@pytest.mark.parametrize('memory_limit', [1, 1024 * 1024])
+def test_hash_join(joiner: ops.Joiner, memory_limit: int) -> None:
+    rows_a, rows_b = _join_rows()
+    graph_a = Graph.graph_from_iter('rows_a')
+    graph_b = Graph.graph_from_iter('rows_b')
+
+    sorted_join = graph_a.sort(['key']).join(joiner, graph_b.sort(['key']), ['key'])
+    hash_join = graph_a.join(joiner, graph_b, ['key'], strategy='hash', memory_limit=memory_limit)
+
+    def run(graph: Graph) -> list[ops.TRow]:
+        return sorted(graph.run(rows_a=lambda: iter(rows_a), rows_b=lambda: iter(rows_b)), key=repr)
+
+    assert run(hash_join) == run(sorted_join)
+
+
+@pytest.mark.parametrize('keys', [['key'], []])
+@pytest.mark.parametrize('small', ['a', 'b', None])
+@pytest.mark.parametrize('joiner', [ops.InnerJoiner(), ops.LeftJoiner(), ops.RightJoiner(), ops.OuterJoiner()])
+def test_broadcast_join(joiner: ops.Joiner, small: str | None, keys: list[str]) -> None:
+    rows_a, rows_b = _join_rows()
+    rows_b = rows_b[:5]
+    graph_a = Graph.graph_from_iter('rows_a')
+    graph_b = Graph.graph_from_iter('rows_b')
+
+    sorted_join = graph_a.sort(keys or ['key']).join(joiner, graph_b.sort(keys or ['key']), keys)
+    broadcast_join = graph_a.join(joiner, graph_b, keys, strategy='broadcast', small=small)
+
+    def run(graph: Graph, rows_b: list[ops.TRow]) -> list[ops.TRow]:
+        return sorted(graph.run(rows_a=lambda: iter(rows_a), rows_b=lambda: iter(rows_b)), key=repr)
+
+    assert run(broadcast_join, rows_b) == run(sorted_join, rows_b)
+    assert run(broadcast_join, []) == run(sorted_join, [])
+
+
+def test_broadcast_join_streams_rows() -> None:
+    rows = [{'key': i % 7, 'value': i} for i in range(100)]
+    totals = [{'total': 100}]
+    graph = Graph.graph_from_iter('rows').sort(['key'])
+    joined = graph.join(ops.InnerJoiner(), Graph.graph_from_iter('totals'), [], strategy='broadcast', small='b')
+    by_key = graph.join(ops.LeftJoiner(), Graph.graph_from_iter('totals'), ['key'], strategy='broadcast', small='b')
+    assert by_key.ordering == ops.Ordering(['key'], ['key'])
+    assert joined.ordering == ops.Ordering()
+
+    result = list(joined.run(rows=lambda: iter(reversed(rows)), totals=lambda: iter(totals)))
+    assert result == [row | {'total': 100} for row in sorted(reversed(rows), key=lambda row: row['key'])]
+
+    with pytest.raises(ValueError):
+        graph.join(ops.InnerJoiner(), graph, [], strategy='broadcast', small='left')
+
+
+def test_broadcast_join_probes_rows_one_by_one() -> None:
+    calls: list[int] = []
+
+    class CountingJoiner(ops.LeftJoiner):
+        def __call__(self, keys: tp.Sequence[str], rows_a: ops.TRowsIterable,
+                     rows_b: ops.TRowsIterable) -> ops.TRowsGenerator:
+            rows_a = list(rows_a)
+            calls.append(len(rows_a))
+            yield from super().__call__(keys, iter(rows_a), rows_b)
+
+    rows = [{'key': i // 10, 'value': i} for i in range(30)]
+    names = [{'key': 0, 'name': 'zero'}, {'key': 2, 'name': 'two'}]
+    graph = Graph.graph_from_iter('rows').join(CountingJoiner(), Graph.graph_from_iter('names'), ['key'],
+                                               strategy='broadcast', small='b')
+
+    result = list(graph.run(rows=lambda: iter(rows), names=lambda: iter(names)))
+    assert result == [row | name for row in rows for name in names + [{}] if name.get('key', 1) == row['key']]
+    assert calls == [1] * len(rows)
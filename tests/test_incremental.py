@@ -0,0 +1,85 @@
+import json
+import typing as tp
+from pathlib import Path
+
+import pytest
+from compgraph import algorithms
+from compgraph import operations as ops
+from compgraph import readers
+from compgraph.graph import Graph
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_incremental_word_count(tmp_path: Path, monkeypatch: pytest.MonkeyPatch, workers: int) -> None:
+    path = tmp_path / 'docs.jsonl'
+    state_dir = (tmp_path / 'state').as_posix()
+    parsed: list[bytes] = []
+    loads = readers.loads
+    # Globals read by reader are fingerprinted; bound append keeps parsed lines out of fingerprint
+    monkeypatch.setattr(readers, 'loads', lambda line, record=parsed.append: record(line) or loads(line))
+
+    def count(append_only: bool, **kwargs: tp.Any) -> list[dict[str, tp.Any]]:
+        graph = algorithms.word_count_graph(path.as_posix(), from_file=True, workers=workers, append_only=append_only)
+        return list(graph.run(**kwargs))
+
+    path.write_text(''.join(json.dumps({'doc_id': i, 'text': f'hello world {i % 5}'}) + '\n' for i in range(50)))
+    assert count(True, state_dir=state_dir) == count(False)
+
+    # Only appended lines are read, line being written is left for the next run
+    with path.open('a') as file:
+        file.write(''.join(json.dumps({'doc_id': i, 'text': f'hello {i % 7}'}) + '\n' for i in range(50, 60)))
+        file.write('{"doc_id": 60, "text": "hel')
+    parsed.clear()
+    result = count(True, state_dir=state_dir)
+    assert len(parsed) == (10 if workers == 1 else 0)
+    with path.open('a') as file:
+        file.write('lo"}\n')
+    assert {'text': 'hello', 'count': 60} in result
+    assert count(True, state_dir=state_dir) == count(False)
+
+    # Rewritten file is counted from scratch
+    path.write_text(json.dumps({'doc_id': 1, 'text': 'bye'}) + '\n')
+    assert count(True, state_dir=state_dir) == [{'text': 'bye', 'count': 1}]
+
+
+def test_incremental_maps(tmp_path: Path) -> None:
+    times, lengths = tmp_path / 'times.jsonl', tmp_path / 'lengths.jsonl'
+    state_dir = (tmp_path / 'state').as_posix()
+    lengths.write_text(''.join(json.dumps({'edge_id': i, 'start': [37.5, 55.7 + i / 1000], 'end': [37.6, 55.7]}) + '\n'
+                               for i in range(5)))
+
+    def append_times(start: int, stop: int) -> None:
+        with times.open('a') as file:
+            for i in range(start, stop):
+                file.write(json.dumps({'edge_id': i % 5, 'enter_time': f'201710{10 + i % 7}T1{i % 10}0000.000000',
+                                       'leave_time': f'201710{10 + i % 7}T1{i % 10}0{i % 5 + 1}00.500000'}) + '\n')
+
+    def speeds(append_only: bool, **kwargs: tp.Any) -> list[dict[str, tp.Any]]:
+        graph = algorithms.yandex_maps_graph(times.as_posix(), lengths.as_posix(), from_file=True,
+                                             append_only=append_only)
+        return sorted(graph.run(**kwargs), key=lambda row: (row['weekday'], row['hour']))
+
+    append_times(0, 40)
+    assert speeds(True, state_dir=state_dir) == speeds(False)
+    append_times(40, 100)
+    result = speeds(True, state_dir=state_dir)
+    assert [row['speed'] for row in result] == pytest.approx([row['speed'] for row in speeds(False)])
+
+    # Lengths are read whole, their change makes run start over
+    lengths.write_text(lengths.read_text().replace('55.7]', '55.8]'))
+    result = speeds(True, state_dir=state_dir)
+    assert [row['speed'] for row in result] == pytest.approx([row['speed'] for row in speeds(False)])
+
+
+def test_incremental_join_with_run_source(tmp_path: Path) -> None:
+    path = tmp_path / 'log.jsonl'
+    path.write_text(''.join(json.dumps({'k': i % 3}) + '\n' for i in range(30)))
+    graph = Graph.graph_from_jsonl(path.as_posix(), append_only=True) \
+        .join(ops.InnerJoiner(), Graph.graph_from_iter('dim'), ['k'], strategy='hash') \
+        .reduce(ops.Count('c'), ['k'], mode='hash')
+    dim = [{'k': 0, 'name': 'zero'}, {'k': 1, 'name': 'one'}]
+
+    # Data sources passed to run are not fingerprinted, so the whole log is reduced every time
+    for _ in range(2):
+        result = graph.run(state_dir=(tmp_path / 'state').as_posix(), dim=lambda: iter(dim))
+        assert sorted(result, key=lambda row: row['k']) == [{'k': 0, 'c': 10}, {'k': 1, 'c': 10}]
@@ -2,9 +2,11 @@ import copy
 import dataclasses
 import math
 import typing as tp
+from datetime import datetime
 
 import pytest
 from compgraph import operations as ops
+from compgraph import timestamps
 from pytest import approx
 
 
@@ -228,3 +230,203 @@ def test_new_reducer(case: ReduceCase) -> None:
     result = ops.Reduce(case.reducer, case.reducer_keys)(iter(case.data))
     assert isinstance(result, tp.Iterator)
     assert sorted(result, key=key_func) == sorted(case.ground_truth, key=key_func)
+
+
+@pytest.mark.parametrize('reducer', [ops.Count('count'), ops.Sum('value'), ops.TermFrequency('word')])
+def test_combine_and_merge_partials(reducer: ops.MergeableReducer) -> None:
+    data = [{'key': i % 3, 'value': i, 'word': f'w{i % 5}'} for i in range(100)]
+    keys = ('key',)
+
+    partial = list(ops.Combine(reducer, keys, max_groups=3)(iter(data)))
+    assert len(partial) == 3
+    assert len(list(ops.Combine(reducer, keys, max_groups=2)(iter(data)))) == len(data)
+
+    key_func = _Key('key', 'word')
+    expected = ops.Reduce(reducer, keys)(sorted(data, key=lambda r: r['key']))
+    result = ops.Reduce(ops.MergePartials(reducer), keys)(sorted(partial, key=lambda r: r['key']))
+    assert sorted(result, key=key_func) == sorted(expected, key=key_func)
+
+
+def test_map_chain() -> None:
+    rows = [{'a': 1, 'b': 'x y'}, {'a': 2, 'b': 'z'}, {'a': 3, 'b': 'u v w'}]
+    mappers: list[ops.Mapper] = [
+        ops.Filter(lambda row: row['a'] != 2),
+        ops.Split('b', ' '),
+        ops.Calculate(lambda row: row['a'] * 10, 'c'),
+        ops.Project(['b', 'c']),
+    ]
+    expected = [{'b': 'x', 'c': 10}, {'b': 'y', 'c': 10}, {'b': 'u', 'c': 30}, {'b': 'v', 'c': 30},
+                {'b': 'w', 'c': 30}]
+
+    assert list(ops.Map(*mappers)(copy.deepcopy(rows))) == expected
+
+    rows_iter: ops.TRowsIterable = copy.deepcopy(rows)
+    for mapper in mappers:
+        rows_iter = ops.Map(mapper)(rows_iter)
+    assert list(rows_iter) == expected
+
+
+class _Doubled(ops.LowerCase):
+    def __call__(self, row: ops.TRow) -> ops.TRowsGenerator:
+        yield from super().__call__(row)
+        yield from super().__call__(row)
+
+
+class _Counted(ops.CalculateLength):
+    def __call__(self, row: ops.TRow) -> ops.TRowsGenerator:
+        for result in super().__call__(row):
+            yield {**result, 'counted': True}
+
+
+def test_map_calls_overridden_call() -> None:
+    rows = [{'text': 'A'}, {'text': 'B'}]
+    assert list(ops.Map(_Doubled('text'))(rows)) == [{'text': 'a'}] * 2 + [{'text': 'b'}] * 2
+    assert list(ops.Map(ops.Filter(lambda row: True), _Doubled('text'))(rows)) == \
+        [{'text': 'a'}] * 2 + [{'text': 'b'}] * 2
+
+    edges = [{'start': [37.5, 55.7], 'end': [37.6, 55.7]}]
+    assert [row['counted'] for row in ops.Map(_Counted('start', 'end', 'length'))(edges)] == [True]
+
+
+def test_split_keeps_input_row() -> None:
+    row = {'id': 1, 'text': 'a b c'}
+    tokens = list(ops.Split('text')(row))
+    assert tokens == [{'id': 1, 'text': 'a'}, {'id': 1, 'text': 'b'}, {'id': 1, 'text': 'c'}]
+    assert all(type(token) is dict for token in tokens)
+    assert row == {'id': 1, 'text': 'a b c'}
+
+    # Nested values are copied, so changing them in one row does not change the others
+    tokens = list(ops.Split('text')({'tags': ['x'], 'text': 'a b'}))
+    tokens[0]['tags'].append('y')
+    assert tokens[1]['tags'] == ['x']
+
+
+def test_map_wraps_shared_rows_only_for_in_place_mappers() -> None:
+    rows = [{'text': 'A'}]
+    assert list(ops.Map(ops.LowerCase('text'), shared_input=True)(rows)) == [{'text': 'a'}]
+    assert rows == [{'text': 'A'}]
+
+    # Rows are passed as they are to mappers which do not change them, and are not wrapped without sharing
+    filtered = ops.Map(ops.Filter(lambda row: True), shared_input=True)(rows)
+    assert all(result is row for result, row in zip(filtered, rows))
+    assert type(next(ops.Map(ops.LowerCase('text'))(rows))) is dict
+
+
+@pytest.mark.parametrize('separator', [r'\s+', r'[ ,]'])
+@pytest.mark.parametrize('text', [
+    'Hello, World!', '  leading and trailing  ', '', '   ', 'snake_case and CAPS', 'tabs\tand\nnewlines',
+    'Ünïcode — текст, «с» пунктуацией!', 'a,b, c', '\x00control\x1fchars\x1c',
+])
+def test_tokenize(text: str, separator: str) -> None:
+    row = {'doc_id': 1, 'text': text}
+    chain = ops.Map(ops.FilterPunctuation('text'), ops.LowerCase('text'), ops.Split('text', separator))
+
+    expected = list(chain([dict(row)]))
+    assert list(ops.Tokenize('text', separator)(row)) == expected
+    assert list(ops.Tokenize('text', separator, passthrough=['doc_id'])(row)) == expected
+    assert list(ops.Tokenize('text', separator, passthrough=[])(row)) == [{'text': r['text']} for r in expected]
+    assert row == {'doc_id': 1, 'text': text}
+
+
+@pytest.mark.parametrize('dt_format, text', [
+    ('%Y%m%dT%H%M%S.%f', '20171020T112238.723000'),
+    ('%Y%m%dT%H%M%S.%f', '20171020T112238.7'),
+    ('%Y%m%dT%H%M%S.%f', '20171020T112238.1234567'),
+    ('%Y%m%dT%H%M%S.%f', '2017102T112238.7'),
+    ('%Y%m%dT%H%M%S.%f', '20171320T112238.7'),
+    ('%Y%m%dT%H%M%S.%f', '20171020X112238.7'),
+    ('%Y%m%dT%H%M%S.%f', '2017+020T112238.7'),
+    ('%Y-%m-%d %H:%M:%S', '2017-10-20 11:22:38'),
+    ('%Y-%m-%d', '2017-10-20'),
+    ('%d %b %Y', '20 Oct 2017'),
+])
+def test_compiled_timestamp_parser(dt_format: str, text: str) -> None:
+    parse = timestamps.compile_parser(dt_format)
+    try:
+        expected = datetime.strptime(text, dt_format)
+    except ValueError:
+        with pytest.raises(ValueError):
+            parse(text)
+        return
+    assert parse(text) == expected
+
+
+def test_parsed_timestamps() -> None:
+    dt_format = '%Y%m%dT%H%M%S.%f'
+    rows = [
+        {'enter': '20171020T112238.723000', 'leave': '20171020T112237.427000', 'length': 0.1},
+        {'enter': '20171011T145553.040000', 'leave': '20171011T145551.957000', 'length': 0.2},
+        {'enter': '20171022T235959.500000', 'leave': '20171023T000001.100000', 'length': 0.3},
+        {'enter': '19691231T230000.000000', 'leave': '19700101T010000.250000', 'length': 0.4},
+    ]
+    time = ops.CalculateTime('enter', dt_format, 'weekday', 'hour')
+    speed = ops.CalculateSpeed('length', 'enter', 'leave', dt_format, 'speed')
+    parse = ops.ParseTimestamps(['enter', 'leave'], dt_format)
+
+    for row in rows:
+        parsed = parse.apply(dict(row))
+        assert parsed is not None and isinstance(parsed['enter'], float)
+        assert (time.apply(dict(parsed)) or {}) == \
+            (time.apply(dict(row)) or {}) | {'enter': parsed['enter'], 'leave': parsed['leave']}
+        assert list(speed((), [parsed])) == list(speed((), [row]))
+
+
+def test_calculate_length_in_chunks() -> None:
+    rows = [{'edge_id': i, 'start': [37.84870228730142 + i / 10000, 55.73853974696249],
+             'end': [37.8490418381989, 55.73832445777953 - i / 10000]} for i in range(2500)]
+    rows[7]['length'] = -1.0
+
+    def reference(row: ops.TRow) -> float:
+        if 'length' in row:
+            return row['length']
+        lon_start, lat_start, lon_end, lat_end = map(math.radians, row['start'] + row['end'])
+        return 2 * 6373 * math.asin(math.sqrt(math.sin((lat_end - lat_start) / 2) ** 2 + math.cos(lat_start) *
+                                              math.cos(lat_end) * math.sin((lon_end - lon_start) / 2) ** 2))
+
+    expected = [reference(row) for row in rows]
+    mapper = ops.CalculateLength('start', 'end', 'length')
+    result = list(ops.Map(ops.Filter(lambda row: row['edge_id'] != 3), mapper)(copy.deepcopy(rows)))
+    assert [row['length'] for row in result] == approx([length for i, length in enumerate(expected) if i != 3])
+    assert [row['length'] for row in mapper(copy.deepcopy(rows[0]))] == approx(expected[:1])
+
+
+@pytest.mark.parametrize('left_hot_rows, right_hot_rows', [(3, 60), (60, 3), (60, 60)])
+@pytest.mark.parametrize('joiner_class', [ops.InnerJoiner, ops.LeftJoiner, ops.RightJoiner, ops.OuterJoiner])
+def test_join_skewed_key(joiner_class: type[ops.Joiner], left_hot_rows: int, right_hot_rows: int) -> None:
+    rows_a = [{'key': 0, 'a': i} for i in range(left_hot_rows)] + [{'key': 1, 'a': -1}]
+    rows_b = [{'key': 0, 'b': i} for i in range(right_hot_rows)] + [{'key': 2, 'b': -1}]
+
+    def run(joiner: ops.Joiner) -> list[ops.TRow]:
+        return sorted(ops.Join(joiner, ['key'])(iter(rows_a), iter(rows_b)), key=repr)
+
+    # Half of 16 KiB holds a few rows of key, so the smaller group is buffered or the right one spilled
+    assert run(joiner_class(memory_limit=16 * 1024)) == run(joiner_class())
+
+
+def test_join_rows_of_different_schemas() -> None:
+    rows_a = [{'key': 1, 'value': 'a', 'score': 1}, {'key': 1, 'name': 'b'}]
+    rows_b = [{'key': 1, 'score': 2}, {'score': 3, 'value': 'c', 'key': 1}]
+    expected = [
+        {'key': 1, 'value': 'a', 'score_1': 1, 'score_2': 2},
+        {'key': 1, 'value_1': 'a', 'score_1': 1, 'score_2': 3, 'value_2': 'c'},
+        {'key': 1, 'name': 'b', 'score': 2},
+        {'key': 1, 'name': 'b', 'score': 3, 'value': 'c'},
+    ]
+    assert list(ops.Join(ops.InnerJoiner(), ['key'])(iter(rows_a), iter(rows_b))) == expected
+
+
+@pytest.mark.parametrize('left', [True, False])
+def test_join_output_renames_columns_per_schema(left: bool) -> None:
+    rows = [{'key': 1, 'a': 1, 'x': 2}, {'key': 1, 'a': 3, 'x': 4}, {'key': 1, 'y': 5}, {'key': 1, 'a': 6, 'x': 7}]
+    others = [{'key': 1, 'x': 8}, {'key': 1, 'a': 9, 'z': 10}, {'key': 1, 'z': 11}, {'key': 1, 'x': 12}]
+    output = ops.join_output(('key',), '_1', '_2')
+
+    def joined(row_a: ops.TRow, row_b: ops.TRow) -> ops.TRow:
+        layout = ops.join_layout(('key',), '_1', '_2', tuple(row_a), tuple(row_b))
+        if layout is None:
+            return {**row_a, **row_b}
+        return dict(zip(layout, (*row_a.values(), *row_b.values())))
+
+    expected = [joined(row, other) if left else joined(other, row) for row in rows for other in others]
+    assert list(output.join(iter(rows), others, left=left)) == expected
+    assert joined(rows[0], others[0]) == {'key': 1, 'a': 1, 'x_1': 2, 'x_2': 8}
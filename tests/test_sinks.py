@@ -0,0 +1,50 @@
+import csv
+import gzip
+import json
+import typing as tp
+from pathlib import Path
+
+import pytest
+from compgraph import sinks
+from compgraph.graph import Graph
+
+
+@pytest.mark.parametrize('filename', ['rows.jsonl', 'rows.jsonl.gz', 'rows.csv', 'rows.table'])
+@pytest.mark.parametrize('shards', [1, 3])
+def test_write_to(tmp_path: Path, filename: str, shards: int) -> None:
+    rows = [{'id': i, 'text': f'text {i}'} for i in range(10000)]
+    graph = Graph.graph_from_iter('rows')
+    stats = graph.write_to(sinks.sink_for((tmp_path / filename).as_posix()), shards=shards, rows=lambda: iter(rows))
+
+    assert stats.rows == len(rows) and len(stats.files) == shards
+    assert stats.bytes == sum(Path(file).stat().st_size for file in stats.files)
+    result: list[dict[str, tp.Any]] = []
+    for file in stats.files:
+        if filename.endswith('.table'):
+            result += Graph.graph_from_table(file).run()
+        elif filename.endswith('.csv'):
+            with open(file, newline='') as csv_file:
+                result += [{'id': int(row['id']), 'text': row['text']} for row in csv.DictReader(csv_file)]
+        else:
+            with (gzip.open(file) if filename.endswith('.gz') else open(file, 'rb')) as jsonl_file:
+                result += [json.loads(line) for line in jsonl_file]
+    assert sorted(result, key=lambda row: row['id']) == rows
+
+
+def test_write_to_json_encoding(tmp_path: Path) -> None:
+    path = (tmp_path / 'rows.jsonl').as_posix()
+    rows = [{'text': 'привет', 'value': float('nan')}, {'text': 'hi', 'value': 1.5}]
+    Graph.graph_from_iter('rows').write_to(sinks.JsonLinesSink(path), rows=lambda: iter(rows))
+    with open(path) as file:
+        assert file.read() == ''.join(json.dumps(row) + '\n' for row in rows)
+
+
+def test_write_to_json_fallback(tmp_path: Path) -> None:
+    path = (tmp_path / 'rows.jsonl').as_posix()
+    rows = [{'big': 2 ** 70}, {'big': 1}]
+    sink = sinks.JsonLinesSink(path, fast=True)
+    assert Graph.graph_from_iter('rows').write_to(sink, rows=lambda: iter(rows)).rows == 2
+    assert [json.loads(line) for line in open(path)] == rows
+
+    with pytest.raises(ValueError):
+        sinks.JsonLinesSink(path, compression='zip')
@@ -0,0 +1,29 @@
+import typing as tp
+
+import pytest
+from compgraph import operations as ops
+from compgraph import spill
+
+
+def test_read_bounded_measures_first_row() -> None:
+    rows = [{'text': 'x' * 1000} for _ in range(10)]
+    assert spill.read_bounded(iter(rows), 1000) == (rows[:1], False)
+    assert spill.read_bounded(iter(rows), 1024 * 1024) == (rows, True)
+
+
+def test_join_skewed_key_scans_spilled_group_per_block(monkeypatch: pytest.MonkeyPatch) -> None:
+    scans: list[int] = []
+    read_chunks = spill.SpillFile.read_chunks
+
+    def counted_read_chunks(self: spill.SpillFile[ops.TRow], offset: int = 0) -> tp.Iterator[list[ops.TRow]]:
+        scans.append(1)
+        return read_chunks(self, offset)
+
+    monkeypatch.setattr(spill.SpillFile, 'read_chunks', counted_read_chunks)
+    rows_a = [{'key': 0, 'a': i} for i in range(600)]
+    rows_b = [{'key': 0, 'b': i} for i in range(600)]
+
+    result = list(ops.Join(ops.InnerJoiner(memory_limit=16 * 1024), ['key'])(iter(rows_a), iter(rows_b)))
+    assert sorted((row['a'], row['b']) for row in result) == [(a, b) for a in range(600) for b in range(600)]
+    # Spilled right group is read once per block of left rows, not once per left row
+    assert 1 < len(scans) < len(rows_a) // 10
@@ -0,0 +1,56 @@
+import typing as tp
+from pathlib import Path
+
+import pytest
+from compgraph import table
+from compgraph.graph import Graph
+
+
+def test_table_round_trip(tmp_path: Path) -> None:
+    rows = [{'id': i, 'name': f'name{i % 7}', 'value': i / 4, 'tags': [i] if i % 3 else None} for i in range(1000)]
+    path = (tmp_path / 'rows.table').as_posix()
+    assert Graph.graph_from_iter('rows').write_table(path, chunk_rows=128, rows=lambda: iter(rows)) == 1000
+
+    reader = table.TableReader(path)
+    assert reader.columns == ['id', 'name', 'value', 'tags'] and reader.rows == 1000
+    assert [stats['encoding'] for stats in reader._chunks[0]['columns'].values()] == \
+        [table.INT, table.DICTIONARY, table.FLOAT, table.PICKLE]
+    assert list(Graph.graph_from_table(path).run()) == rows
+    assert list(Graph.graph_from_table(path, columns=['name']).run()) == [{'name': row['name']} for row in rows]
+
+    empty = (tmp_path / 'empty.table').as_posix()
+    assert table.write_table([], empty) == 0
+    assert list(Graph.graph_from_table(empty).run()) == []
+
+    with pytest.raises(ValueError):
+        table.write_table([{'a': 1}, {'b': 2}], (tmp_path / 'bad.table').as_posix())
+
+
+def test_table_where_skips_none(tmp_path: Path) -> None:
+    rows = [{'id': i, 'tags': i if i % 3 else None} for i in range(100)]
+    path = (tmp_path / 'rows.table').as_posix()
+    Graph.graph_from_iter('rows').write_table(path, chunk_rows=32, rows=lambda: iter(rows))
+
+    graph = Graph.graph_from_table(path, columns=['id'], where={'tags': (10, 20)})
+    assert list(graph.run()) == [{'id': i} for i in range(10, 21) if i % 3]
+    assert len(list(Graph.graph_from_table(path, where={'tags': (None, None)}).run())) == 100
+
+
+def test_table_skips_chunks(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    rows = [{'id': i, 'text': f'text {i}'} for i in range(1000)]
+    path = (tmp_path / 'rows.table').as_posix()
+    table.write_table(rows, path, chunk_rows=100)
+
+    decoded: list[str] = []
+    decode = table._decode
+
+    def recorded_decode(encoding: str, data: bytes, swap: bool) -> list[tp.Any]:
+        decoded.append(encoding)
+        return decode(encoding, data, swap)
+
+    monkeypatch.setattr(table, '_decode', recorded_decode)
+
+    graph = Graph.graph_from_table(path, columns=['text'], where={'id': (250, 349)})
+    assert list(graph.run()) == [{'text': f'text {i}'} for i in range(250, 350)]
+    # Two chunks of ids and texts are read, the rest of chunks are skipped by min/max index
+    assert sorted(decoded) == [table.DICTIONARY] * 2 + [table.INT] * 2